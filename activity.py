@@ -0,0 +1,219 @@
+"""
+Activity logging for File Drive
+record() adds an activity event to the current unit of work instead of
+committing it separately: events are written by an after_flush hook in the
+same transaction as the change they describe (outbox style), so an action
+costs one commit and an event exists only if its change was committed.
+
+Targets may be objects that have not been flushed yet; their ids are read
+after the flush. Actions listed in ACTIVITY_ASYNC_ACTIONS are instead
+queued once the transaction commits and inserted in batches by a
+background thread, taking the insert off the request path entirely.
+
+Once written and committed, each event is published on the team's
+``activity`` channel (see events.py) with its row id as the SSE event id,
+so a client that reconnects can ask for what it missed from the table.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask_login import current_user
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+import events
+import read_markers
+import versions
+from app import app, db
+from models import Activity
+
+BATCH_SIZE = 200
+BATCH_INTERVAL = 0.5  # seconds
+
+TARGET_TYPES = {
+    'File': 'file',
+    'Folder': 'folder',
+    'Message': 'message',
+    'Team': 'team',
+    'TeamMember': 'member',
+}
+
+
+def record(team_id, action, target=None, description=None, user_id=None, target_type=None):
+    """Log an activity with the pending changes of the current session
+
+    ``target`` is the model instance acted on (its id may not exist yet).
+    """
+    if user_id is None:
+        if not current_user.is_authenticated:
+            return
+        user_id = current_user.id
+    db.session.info.setdefault('pending_activities', []).append({
+        'team_id': team_id,
+        'user_id': user_id,
+        'action': action,
+        'target': target,
+        'target_type': target_type or (TARGET_TYPES.get(type(target).__name__) if target is not None else None),
+        'description': description,
+        'created_at': datetime.now(),
+    })
+
+
+def _rows(entries):
+    rows = []
+    for entry in entries:
+        row = dict(entry)
+        target = row.pop('target')
+        row['target_id'] = getattr(target, 'id', None)
+        rows.append(row)
+    return rows
+
+
+def activity_json(activity):
+    return {
+        'id': activity.id,
+        'team_id': activity.team_id,
+        'user_id': activity.user_id,
+        'action': activity.action,
+        'target_type': activity.target_type,
+        'target_id': activity.target_id,
+        'description': activity.description,
+        'created_at': activity.created_at.isoformat() if activity.created_at else None,
+    }
+
+
+def _insert(conn, rows):
+    """Insert activity rows, setting each row's id"""
+    table = Activity.__table__
+    result = conn.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+    for row, activity_id in zip(rows, result.scalars()):
+        row['id'] = activity_id
+    read_markers.activities_added(conn, rows)
+
+
+def publish(rows):
+    """Send committed activity rows to their teams' activity streams"""
+    for row in rows:
+        data = activity_json(SimpleNamespace(**row))
+        events.publish(events.team_channel(row['team_id'], 'activity'), 'activity', data, event_id=row['id'])
+
+
+def _write_pending(session):
+    entries = session.info.pop('pending_activities', None)
+    if not entries:
+        return
+    async_actions = app.config.get('ACTIVITY_ASYNC_ACTIONS', ())
+    deferred = [entry for entry in entries if entry['action'] in async_actions]
+    inline = [entry for entry in entries if entry['action'] not in async_actions]
+    if inline:
+        rows = _rows(inline)
+        _insert(session.connection(), rows)
+        versions.bump_in_session(session, 'team', {row['team_id'] for row in rows})
+        session.info.setdefault('written_activities', []).extend(rows)
+    if deferred:
+        session.info.setdefault('committed_activities', []).extend(_rows(deferred))
+
+
+@event.listens_for(Session, 'after_flush')
+def _write_flushed(session, flush_context):
+    _write_pending(session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_unflushed(session):
+    # Commit flushes first; events recorded with nothing to flush land here
+    session.flush()
+    _write_pending(session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed(session):
+    publish(session.info.pop('written_activities', ()))
+    rows = session.info.pop('committed_activities', None)
+    if rows:
+        buffer.put(rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('pending_activities', None)
+    session.info.pop('written_activities', None)
+    session.info.pop('committed_activities', None)
+
+
+class ActivityBuffer:
+    """Background batch writer for asynchronous activity events"""
+
+    def __init__(self, batch_size=BATCH_SIZE, interval=BATCH_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def put(self, rows):
+        self._ensure_thread()
+        for row in rows:
+            self._queue.put(row)
+
+    def _ensure_thread(self):
+        # Threads don't survive fork; start one per worker process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = threading.Thread(target=self._run, name='activity-buffer', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.interval))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            self._write(self._take_batch())
+
+    def _write(self, batch):
+        team_ids = {row['team_id'] for row in batch}
+        try:
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    _insert(conn, batch)
+                    versions.bump(conn, 'team', team_ids)
+                versions.forget('team', team_ids)
+                publish(batch)
+        except Exception as e:
+            logging.error(f"Dropped {len(batch)} activity events: {e}")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self):
+        """Write everything queued so far; used at exit and in tests"""
+        if self._pid != os.getpid():
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        self._queue.join()
+
+
+buffer = ActivityBuffer()
+atexit.register(buffer.flush)
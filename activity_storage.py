@@ -0,0 +1,187 @@
+"""
+Activity storage maintenance for File Drive
+The activity log only ever grows, so it is stored by month:
+
+- On Postgres ``activities`` is range-partitioned on created_at with one
+  partition per month (``activities_YYYYMM``) plus a default partition that
+  catches rows no monthly partition covers yet. Queries on the parent only
+  touch the partitions their created_at range needs.
+- SQLite has no partitions. ``activities`` holds the current and the
+  previous month, which is as far back as the dashboard feed reads there,
+  and rotate() moves each older month into its own ``activities_YYYYMM``
+  archive table.
+
+Either way, expiring a month is a DROP TABLE, however many rows it holds.
+Before rows can expire they are counted into ``activity_daily`` (team,
+action, day), which is kept for analytics. Run ``flask activity-maintain``
+daily; it creates upcoming partitions, rolls up, rotates and expires.
+"""
+import logging
+import re
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import app, db
+from models import Activity, ActivityDaily
+
+MONTHS_AHEAD = 2
+# Months before the current one that SQLite keeps in activities itself
+HOT_MONTHS = 1
+DEFAULT_PARTITION = 'activities_default'
+_PARTITION_RE = re.compile(r'^activities_(\d{4})(\d{2})$')
+
+activities = Activity.__table__
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'activities_{month:%Y%m}'
+
+
+def _bounds(month):
+    return datetime.combine(month, time()), datetime.combine(add_months(month, 1), time())
+
+
+def stored_months(conn):
+    """Months that have a partition (Postgres) or archive table (SQLite), oldest first"""
+    months = []
+    for name in db.inspect(conn).get_table_names():
+        match = _PARTITION_RE.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def archive_table(month):
+    """Table object for a SQLite archive month; same columns as activities, no foreign keys"""
+    table = Table(
+        partition_name(month), MetaData(),
+        *[Column(column.name, column.type, primary_key=column.primary_key) for column in activities.columns]
+    )
+    Index(f'ix_{table.name}_team_created', table.c.team_id, table.c.created_at)
+    return table
+
+
+def create_partition(conn, month):
+    """Postgres: create the partition of ``month`` if it does not exist"""
+    start, end = _bounds(month)
+    # Rows that landed in the default partition for this month must move
+    # out first, or Postgres refuses to create the partition
+    stray = conn.execute(
+        text(f'DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end RETURNING *'),
+        {'start': start, 'end': end}
+    ).mappings().all()
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF activities "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    if stray:
+        conn.execute(activities.insert(), [dict(row) for row in stray])
+
+
+def create_partitions(conn, today=None):
+    """Postgres: make sure this month and the next MONTHS_AHEAD have partitions"""
+    first = month_start(today or date.today())
+    for offset in range(MONTHS_AHEAD + 1):
+        create_partition(conn, add_months(first, offset))
+
+
+def _upsert_daily(dialect_name, start, end):
+    dialect_insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    day = func.date(activities.c.created_at)
+    counts = select(
+        day, activities.c.team_id, activities.c.action, func.count()
+    ).where(
+        activities.c.created_at >= start, activities.c.created_at < end
+    ).group_by(day, activities.c.team_id, activities.c.action)
+    stmt = dialect_insert(ActivityDaily.__table__).from_select(['day', 'team_id', 'action', 'count'], counts)
+    return stmt.on_conflict_do_update(
+        index_elements=['day', 'team_id', 'action'],
+        set_={'count': stmt.excluded['count']}
+    )
+
+
+def rollup(conn, today=None):
+    """Recount activity_daily from the last rolled-up day through today
+
+    The last day is recounted because it may have been partial. Returns
+    the first day counted, or None if there was nothing to count.
+    """
+    today = today or date.today()
+    start = conn.execute(select(func.max(ActivityDaily.day))).scalar()
+    if start is None:
+        oldest = conn.execute(select(func.min(activities.c.created_at))).scalar()
+        if oldest is None:
+            return None
+        start = oldest.date()
+    end = today + timedelta(days=1)
+    conn.execute(_upsert_daily(
+        conn.dialect.name, datetime.combine(start, time()), datetime.combine(end, time())
+    ))
+    return start
+
+
+def rotate(conn, today=None):
+    """SQLite: move rows from before the previous month into monthly archive tables"""
+    cutoff = datetime.combine(add_months(month_start(today or date.today()), -HOT_MONTHS), time())
+    rotated = []
+    while True:
+        oldest = conn.execute(
+            select(func.min(activities.c.created_at)).where(activities.c.created_at < cutoff)
+        ).scalar()
+        if oldest is None:
+            return rotated
+        month = month_start(oldest)
+        start, end = _bounds(month)
+        in_month = (activities.c.created_at >= start, activities.c.created_at < end)
+        archive = archive_table(month)
+        archive.create(conn, checkfirst=True)
+        conn.execute(archive.insert().from_select(
+            [column.name for column in activities.columns], select(activities).where(*in_month)
+        ))
+        conn.execute(delete(activities).where(*in_month))
+        rotated.append(archive.name)
+
+
+def expire(conn, keep_months, today=None):
+    """Drop every stored month older than the last ``keep_months``; returns dropped tables"""
+    cutoff = add_months(month_start(today or date.today()), -keep_months)
+    dropped = []
+    for month in stored_months(conn):
+        if month < cutoff:
+            conn.execute(text(f'DROP TABLE {partition_name(month)}'))
+            dropped.append(partition_name(month))
+    if conn.dialect.name == 'postgresql':
+        conn.execute(
+            text(f'DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff'),
+            {'cutoff': datetime.combine(cutoff, time())}
+        )
+    return dropped
+
+
+def maintain(engine=None, today=None, keep_months=None):
+    """Daily job: partitions ahead, rollups, rotation and retention in one transaction"""
+    engine = engine or db.engine
+    today = today or date.today()
+    if keep_months is None:
+        keep_months = app.config.get('ACTIVITY_RETENTION_MONTHS', 12)
+    with engine.begin() as conn:
+        if conn.dialect.name == 'postgresql':
+            create_partitions(conn, today)
+        rolled_from = rollup(conn, today)
+        rotated = rotate(conn, today) if conn.dialect.name == 'sqlite' else []
+        # 0 keeps every month
+        dropped = expire(conn, keep_months, today) if keep_months else []
+    logging.info(f"Activity maintenance: rolled up from {rolled_from}, rotated {rotated}, dropped {dropped}")
+    return {'rolled_up_from': rolled_from, 'rotated': rotated, 'dropped': dropped}
+
@@ -1,45 +1,67 @@
+"""
+Flask application for File Drive
+create_app() builds the app from config.load(); importing this module
+creates the one app every other module imports, with the database handle.
+Nothing here touches the database: the schema is managed by migrations
+(`flask --app main db-upgrade`), and heavy optional libraries are imported
+where they are used.
+"""
+import logging
+import os
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-import os
-from werkzeug.middleware.proxy_fix import ProxyFix
-import logging
 from sqlalchemy.orm import DeclarativeBase
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import config
+import sqlite_profile
+from replicas import RoutingSession
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
 
 class Base(DeclarativeBase):
     pass
 
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1) # needed for url_for to generate with https
-
-# Database configuration
-database_url = os.environ.get("DATABASE_URL")
-if not database_url:
-    # Use SQLite for local development if no DATABASE_URL is set
-    database_url = "sqlite:///app.db"
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    'pool_pre_ping': True,
-    "pool_recycle": 300,
-}
-
-# File upload configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-db = SQLAlchemy(app, model_class=Base)
-
-# Create tables
+
+def create_app():
+    """The Flask app, configured once from the environment"""
+    app = Flask(__name__)
+    app.config.update(config.load())
+    logging.basicConfig(level=app.config['LOG_LEVEL'])
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1) # needed for url_for to generate with https
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    return app
+
+
+app = create_app()
+db = SQLAlchemy(app, model_class=Base, session_options={'class_': RoutingSession})
+
 with app.app_context():
+    for engine in db.engines.values():
+        if engine.dialect.name == 'sqlite':
+            sqlite_profile.install(engine)
     import models  # noqa: F401
     import auth  # noqa: F401
-    db.create_all()
-    logging.info("Database tables created")
+
+# Schema changes are applied by the migration runner, not at import time
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    """Apply pending schema migrations"""
+    import migrations
+    applied = migrations.upgrade()
+    logging.info(f"Applied migrations: {', '.join(applied) or 'none'}")
+
+
+@app.cli.command('assets-build')
+def assets_build():
+    """Fingerprint and precompress static assets"""
+    import assets
+    manifest = assets.build(app.static_folder)
+    logging.info(f"Built {len(manifest['assets'])} assets, version {manifest['version']}")
+
+
+@app.cli.command('activity-maintain')
+def activity_maintain():
+    """Create activity partitions, roll up daily counts and drop expired months"""
+    import activity_storage
+    activity_storage.maintain()
@@ -0,0 +1,124 @@
+"""
+Fingerprinted static assets for File Drive
+``flask --app main assets-build`` copies every stylesheet and script under
+static/ to static/dist/ with a hash of its contents in the name
+(css/style.css -> dist/css/style.3f2a9c1d0b4e.css), next to .gz and .br
+variants, and writes dist/assets.json mapping one to the other.
+
+With a manifest present, url_for('static', filename='css/style.css') links
+the hashed copy, which is served precompressed and marked immutable: a
+browser that has it never asks again, and a changed file gets a new name.
+Without one (development) the originals are served as usual. The manifest
+version also names the service worker's cache (see static/sw.js).
+
+Old hashed files are kept, so pages cached before a deploy still load.
+"""
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+
+from flask import request, send_from_directory
+
+from app import app
+
+DIST = 'dist'
+MANIFEST = 'assets.json'
+PATTERNS = ('css/*.css', 'js/*.js')
+SERVICE_WORKER = 'sw.js'
+# Hashed files never change; a year is what browsers honour
+MAX_AGE = 365 * 24 * 3600
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _compress(data):
+    variants = {'.gz': gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli  # optional dependency, only needed for .br variants
+    except ImportError:
+        logging.warning('brotli is not installed; skipping .br variants')
+    else:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def build(static_folder):
+    """Write hashed copies, compressed variants and the manifest; return the manifest"""
+    assets = {}
+    for pattern in PATTERNS:
+        for path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+            name = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            stem, ext = os.path.splitext(name)
+            hashed = f'{DIST}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            target = os.path.join(static_folder, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            for suffix, content in [('', data)] + list(_compress(data).items()):
+                with open(target + suffix, 'wb') as f:
+                    f.write(content)
+            assets[name] = hashed
+
+    version = hashlib.sha256(json.dumps(assets, sort_keys=True).encode()).hexdigest()[:12]
+    manifest = {'version': version, 'assets': assets}
+    with open(os.path.join(static_folder, DIST, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load(static_folder):
+    """The built manifest, or an empty one when assets were not built"""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': 'dev', 'assets': {}}
+
+
+manifest = load(app.static_folder)
+
+
+@app.url_defaults
+def _link_hashed(endpoint, values):
+    if endpoint == 'static' and values.get('filename') in manifest['assets']:
+        values['filename'] = manifest['assets'][values['filename']]
+
+
+@app.context_processor
+def _asset_version():
+    return {'asset_version': manifest['version']}
+
+
+def serve_static(filename):
+    """Flask's static view, plus precompressed immutable responses for hashed files"""
+    if filename == SERVICE_WORKER:
+        # Controls the whole site from under /static/, and is checked for updates on every load
+        response = app.send_static_file(filename)
+        response.headers['Service-Worker-Allowed'] = '/'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    if not filename.startswith(DIST + '/') or filename == f'{DIST}/{MANIFEST}':
+        return app.send_static_file(filename)
+
+    suffix, encoding = '', None
+    for candidate, candidate_suffix in ENCODINGS:
+        if request.accept_encodings[candidate] and os.path.exists(
+                os.path.join(app.static_folder, filename + candidate_suffix)):
+            suffix, encoding = candidate_suffix, candidate
+            break
+    # Typed as the asset, not as the compressed file
+    response = send_from_directory(app.static_folder, filename + suffix, max_age=MAX_AGE,
+                                   mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+app.view_functions['static'] = serve_static
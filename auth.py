@@ -6,14 +6,14 @@ from werkzeug.local import LocalProxy
 
 from app import app, db
 from models import User
+import users
 
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(user_id)
+# Snapshots come from a process-local cache; see users.py
+login_manager.user_loader(users.load_user)
 
 def require_login(f):
     @wraps(f)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Gunicorn worker profile benchmark
+Starts gunicorn with gunicorn.conf.py once per profile (sync, gthread and,
+when installed, gevent) against a seeded SQLite database, and drives it with
+concurrent logged-in clients. Each workload runs for a fixed time:
+
+- listing: GET /api/files
+- download: GET /download/<id> of a 2 MB file
+- upload: POST /upload of a 256 KB file
+- mixed: listings while other clients download, the case where a sync
+  worker held by a transfer makes everyone else wait
+
+Reports requests per second and median / 95th percentile latency per kind
+of request, plus errors.
+
+Usage: python benchmarks/gunicorn_profiles.py [--clients 16] [--seconds 5] [--workers 2] [--threads 32]
+"""
+import argparse
+import importlib.util
+import os
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import requests  # noqa: E402
+
+PASSWORD = 'benchmark-password'
+DOWNLOAD_BYTES = 2 * 1024 * 1024
+UPLOAD_BYTES = 256 * 1024
+WORKLOADS = {
+    'listing': ['listing'],
+    'download': ['download'],
+    'upload': ['upload'],
+    'mixed': ['listing', 'download'],
+}
+
+
+def seed(workdir):
+    """A user in a team with 50 files to list; returns (username, team_id, file_id)"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    from app import app, db
+    import migrations
+    from models import User, Team, TeamMember, File
+
+    path = os.path.join(workdir, 'download.bin')
+    with open(path, 'wb') as f:
+        f.write(os.urandom(DOWNLOAD_BYTES))
+    with app.app_context():
+        migrations.upgrade()
+        user = User.create_user('bench', PASSWORD)
+        user.mode_preference = 'team'
+        team = Team(name='Bench', invite_code=secrets.token_urlsafe(8), created_by=user.id)
+        db.session.add_all([user, team])
+        db.session.flush()
+        db.session.add(TeamMember(team_id=team.id, user_id=user.id, role='admin'))
+        for i in range(50):
+            db.session.add(File(filename=f'f{i}', original_filename=f'file-{i:02}.pdf', file_path=path,
+                                file_size=DOWNLOAD_BYTES, file_type='document', mime_type='application/pdf',
+                                team_id=team.id, uploaded_by=user.id))
+        db.session.commit()
+        file_id = File.query.first().id
+        team_id = team.id
+        for engine in db.engines.values():
+            engine.dispose()
+    return 'bench', team_id, file_id
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(profile, workdir, args):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, PORT=str(port), PYTHONPATH=ROOT,
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_THREADS=str(args.threads))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--access-logfile', '/dev/null', '--bind', f'127.0.0.1:{port}'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base + '/login', timeout=1)
+            return server, base
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError(f'gunicorn ({profile}) did not start')
+
+
+def client(base, username, team_id, file_id, kinds, deadline, results, lock):
+    session = requests.Session()
+    session.post(base + '/login', data={'username': username, 'password': PASSWORD}, allow_redirects=False)
+    session.get(f'{base}/switch_team/{team_id}', allow_redirects=False)
+    payload = os.urandom(UPLOAD_BYTES)
+    n = 0
+    while time.monotonic() < deadline:
+        kind = kinds[n % len(kinds)]
+        n += 1
+        started = time.perf_counter()
+        try:
+            if kind == 'listing':
+                response = session.get(base + '/api/files')
+            elif kind == 'download':
+                response = session.get(f'{base}/download/{file_id}')
+            else:
+                name = f'upload-{threading.get_ident()}-{n}.pdf'
+                response = session.post(base + '/upload', files={'file': (name, payload, 'application/pdf')},
+                                        allow_redirects=False)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            results.setdefault(kind, []).append(elapsed)
+            if not ok:
+                results['errors'] = results.get('errors', 0) + 1
+
+
+def run(base, username, team_id, file_id, workload, args):
+    results, lock = {}, threading.Lock()
+    deadline = time.monotonic() + args.seconds
+    kinds = WORKLOADS[workload]
+    # In the mixed run half the clients list and half download
+    threads = [threading.Thread(target=client, args=(
+        base, username, team_id, file_id, [kinds[i % len(kinds)]], deadline, results, lock
+    )) for i in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def report(workload, results, seconds):
+    parts = []
+    for kind, latencies in sorted((k, v) for k, v in results.items() if k != 'errors'):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+        parts.append(f'{kind} {len(latencies) / seconds:.0f}/s '
+                     f'p50 {statistics.median(latencies) * 1000:.0f} ms p95 {p95 * 1000:.0f} ms')
+    parts.append(f"errors {results.get('errors', 0)}")
+    print(f'    {workload:>8}: ' + ', '.join(parts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args()
+
+    profiles = ['sync', 'gthread']
+    if importlib.util.find_spec('gevent'):
+        profiles.append('gevent')
+    else:
+        print('gevent is not installed; skipping the gevent profile')
+
+    with tempfile.TemporaryDirectory() as workdir:
+        username, team_id, file_id = seed(workdir)
+        print(f'{args.clients} clients, {args.workers} workers ({args.threads} threads for gthread), '
+              f'{args.seconds}s per workload')
+        for profile in profiles:
+            server, base = start(profile, workdir, args)
+            try:
+                print(f'{profile}:')
+                for workload in WORKLOADS:
+                    report(workload, run(base, username, team_id, file_id, workload, args), args.seconds)
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrency benchmark
+Runs several worker processes (like gunicorn workers), each with a few
+threads, doing a read-heavy mix of listing queries and read-then-write
+transactions against one SQLite file. Compares the driver defaults with
+sqlite_profile and reports throughput, latency and failed/lost writes.
+One more thread per worker acts like the upload view: it checks for a
+duplicate name, spends --upload-ms saving the file, then inserts the row.
+Reads and writes should not wait for that file I/O.
+
+Usage: python benchmarks/sqlite_concurrency.py [--workers 4] [--threads 4] [--seconds 5] [--upload-ms 200]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+import sqlite_profile  # noqa: E402
+
+WRITE_RATIO = 0.2
+ROWS = 5000
+
+
+def make_engine(path, profiled):
+    url = f'sqlite:///{path}'
+    if not profiled:
+        return create_engine(url, connect_args={'check_same_thread': False})
+    engine = create_engine(url, **sqlite_profile.engine_options(url))
+    sqlite_profile.install(engine)
+    return engine
+
+
+def setup(path, profiled):
+    # WAL is persistent, so the baseline database must not be created through the profile
+    engine = make_engine(path, profiled)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE items (id INTEGER PRIMARY KEY, team_id INTEGER, name TEXT, hits INTEGER)'))
+        conn.execute(text('CREATE INDEX ix_items_team ON items (team_id, name)'))
+        conn.execute(text('CREATE TABLE uploads (id INTEGER PRIMARY KEY, team_id INTEGER, name TEXT)'))
+        conn.execute(text('INSERT INTO items (team_id, name, hits) VALUES (:t, :n, 0)'),
+                     [{'t': i % 50, 'n': f'item-{i}'} for i in range(ROWS)])
+    engine.dispose()
+
+
+def worker(path, profiled, threads, seconds, upload_ms, results):
+    engine = make_engine(path, profiled)
+    app = Flask('bench')
+    stats = {'reads': 0, 'writes': 0, 'uploads': 0, 'errors': 0, 'latencies': []}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def run():
+        rng = random.Random()
+        while time.monotonic() < deadline:
+            write = rng.random() < WRITE_RATIO
+            started = time.perf_counter()
+            try:
+                with app.test_request_context(method='POST' if write else 'GET'), engine.begin() as conn:
+                    team = rng.randrange(50)
+                    rows = conn.execute(text(
+                        'SELECT id, hits FROM items WHERE team_id = :t ORDER BY name LIMIT 50'
+                    ), {'t': team}).all()
+                    if write:
+                        conn.execute(text('UPDATE items SET hits = hits + 1 WHERE id = :id'),
+                                     {'id': rows[0].id})
+                kind = 'writes' if write else 'reads'
+            except Exception:
+                kind = 'errors'
+            elapsed = time.perf_counter() - started
+            with lock:
+                stats[kind] += 1
+                stats['latencies'].append(elapsed)
+
+    def upload():
+        n = 0
+        while time.monotonic() < deadline:
+            n += 1
+            name = f'upload-{os.getpid()}-{n}'
+            try:
+                with app.test_request_context(method='POST'), engine.begin() as conn:
+                    conn.execute(text('SELECT 1 FROM uploads WHERE team_id = 0 AND name = :n'), {'n': name}).first()
+                    time.sleep(upload_ms / 1000)  # file.save() or the S3 call
+                    conn.execute(text('INSERT INTO uploads (team_id, name) VALUES (0, :n)'), {'n': name})
+                kind = 'uploads'
+            except Exception:
+                kind = 'errors'
+            with lock:
+                stats[kind] += 1
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    if upload_ms:
+        pool.append(threading.Thread(target=upload))
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(stats)
+
+
+def run(profiled, workers, threads, seconds, upload_ms):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    setup(path, profiled)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(path, profiled, threads, seconds, upload_ms, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    totals = {'reads': 0, 'writes': 0, 'uploads': 0, 'errors': 0, 'latencies': []}
+    for _ in processes:
+        stats = results.get()
+        for key in totals:
+            totals[key] += stats[key]
+    for process in processes:
+        process.join()
+
+    engine = make_engine(path, profiled=True)
+    with engine.connect() as conn:
+        applied = conn.execute(text('SELECT SUM(hits) FROM items')).scalar()
+    latencies = sorted(totals['latencies']) or [0]
+    return {
+        'ops/s': round((totals['reads'] + totals['writes']) / seconds),
+        'writes': totals['writes'],
+        'lost writes': totals['writes'] - applied,
+        'uploads': totals['uploads'],
+        'errors': totals['errors'],
+        'p50 ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99 ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--upload-ms', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{args.workers} workers x {args.threads} threads, {args.seconds}s, {int(WRITE_RATIO * 100)}% writes, '
+          f'{args.upload_ms} ms uploads')
+    for label, profiled in [('driver defaults', False), ('sqlite_profile', True)]:
+        result = run(profiled, args.workers, args.threads, args.seconds, args.upload_ms)
+        print(f'{label:>16}: ' + ', '.join(f'{key} {value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark
+Starts fresh interpreters that import the app (as a gunicorn worker does)
+with `python -X importtime`, and reports the median import time, the
+wall-clock time until a first request is served, and the slowest imports
+(top-level ones and what they import directly).
+For comparison it also runs with boto3 and Pillow imported up front, as
+the app did before they were made lazy.
+
+Usage: python benchmarks/startup.py [--runs 7] [--top 15]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = [
+    ('lazy (current)', ''),
+    ('boto3 + Pillow eager', 'import boto3, PIL.Image; '),
+]
+FIRST_REQUEST = "import main; main.app.test_client().get('/login')"
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run_once(preamble, env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', preamble + FIRST_REQUEST],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - started
+    # (cumulative microseconds, module, depth) of top-level imports and theirs
+    imports = [(int(cumulative), name, len(indent) // 2) for _, cumulative, indent, name
+               in LINE.findall(result.stderr) if len(indent) <= 3]
+    return wall, imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp}/bench.db', LOG_LEVEL='WARNING')
+        for label, preamble in SCENARIOS:
+            walls, totals, slowest = [], [], {}
+            for _ in range(args.runs):
+                wall, imports = run_once(preamble, env)
+                walls.append(wall)
+                totals.append(sum(cumulative for cumulative, _, depth in imports if depth == 0))
+                for cumulative, name, depth in imports:
+                    slowest.setdefault(('  ' * depth) + name, []).append(cumulative)
+            print(f'{label}: imports {statistics.median(totals) / 1000:.0f} ms, '
+                  f'first request served after {statistics.median(walls) * 1000:.0f} ms '
+                  f'(median of {args.runs})')
+            ranked = sorted(slowest.items(), key=lambda item: -statistics.median(item[1]))
+            for name, times in ranked[:args.top]:
+                print(f'    {statistics.median(times) / 1000:8.1f} ms  {name}')
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+In-process caches for File Drive
+A small thread-safe LRU with per-entry TTL and hit/miss counters. Every
+worker process has its own copy, so entries must be invalidated on the
+writes that change them; the TTL bounds how stale another worker can be.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# name -> TTLCache, for stats()
+_registry = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU mapping whose entries expire ``ttl`` seconds after being set"""
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        _registry[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key matches ``predicate``"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def stats():
+    """Counters of every cache in this process, by name"""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+def clear_all():
+    for cache in _registry.values():
+        cache.clear()
@@ -1,34 +1,77 @@
+"""
+Configuration for File Drive
+Every setting read from the environment, in one place. create_app() in
+app.py calls load() once and puts the result in app.config; other modules
+read app.config rather than os.environ. A .env file in the working
+directory is applied first when there is one.
+"""
 import os
-from dotenv import load_dotenv
-
-# Load environment variables from .env file if it exists
-load_dotenv()
-
-class Config:
-    """Application configuration"""
-    
-    # Database - Flask-SQLAlchemy expects SQLALCHEMY_DATABASE_URI
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///filedrive.db')
-    
-    # Session
-    SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
-    
-    # Replit OAuth
-    REPL_ID = os.environ.get('REPL_ID', 'demo-repl-id')
-    ISSUER_URL = os.environ.get('ISSUER_URL', 'https://replit.com/oidc')
-    
-    # AWS S3 (Optional)
-    AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
-    AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
-    AWS_S3_BUCKET_NAME = os.environ.get('AWS_S3_BUCKET_NAME')
-    
-    # File Upload
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
-    UPLOAD_FOLDER = 'uploads'
-    
-    # SQLAlchemy
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
+
+import sqlite_profile
+
+
+def _load_dotenv():
+    if os.path.exists('.env'):
+        from dotenv import load_dotenv  # only needed when there is a .env file
+        load_dotenv()
+
+
+def load():
+    """Settings for app.config, from the environment"""
+    _load_dotenv()
+    env = os.environ
+    config = {}
+
+    config["SECRET_KEY"] = env.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
+    config["LOG_LEVEL"] = env.get("LOG_LEVEL", "INFO").upper()
+
+    # Database: SQLite for local development if no DATABASE_URL is set
+    database_url = env.get("DATABASE_URL") or "sqlite:///app.db"
+    config["SQLALCHEMY_DATABASE_URI"] = database_url
+    config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = {
         'pool_pre_ping': True,
-        'pool_recycle': 300,
-    } 
\ No newline at end of file
+        "pool_recycle": 300,
+    }
+    if sqlite_profile.is_sqlite(database_url):
+        # WAL, busy_timeout and a pool per worker thread instead of network-style pinging
+        config["SQLALCHEMY_ENGINE_OPTIONS"] = sqlite_profile.engine_options(database_url)
+
+    # Read replicas: comma-separated URLs; GET requests read from them (see replicas.py)
+    replica_urls = [url.strip() for url in env.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    config["SQLALCHEMY_BINDS"] = {f"replica_{i}": url for i, url in enumerate(replica_urls, 1)}
+    config["REPLICA_READ_YOUR_WRITES"] = int(env.get("REPLICA_READ_YOUR_WRITES", 5))
+    config["REPLICA_PROBE_TIMEOUT"] = float(env.get("REPLICA_PROBE_TIMEOUT", 2))
+
+    # Activity actions logged after commit by a background batch writer instead
+    # of in the request's transaction, e.g. "send_message" (see activity.py)
+    config["ACTIVITY_ASYNC_ACTIONS"] = {
+        action.strip() for action in env.get("ACTIVITY_ASYNC_ACTIONS", "").split(",") if action.strip()
+    }
+    # Months of raw activity kept by `flask activity-maintain`; 0 keeps everything
+    config["ACTIVITY_RETENTION_MONTHS"] = int(env.get("ACTIVITY_RETENTION_MONTHS", 12))
+
+    # Real-time events: in-process unless a Redis URL is given (see events.py)
+    config["EVENT_BROKER_URL"] = env.get("EVENT_BROKER_URL")
+    # Seconds an SSE stream stays open before the browser reconnects
+    config["SSE_MAX_DURATION"] = int(env.get("SSE_MAX_DURATION", 300))
+    # Open SSE streams per worker before new ones get a 503 (0 = no limit;
+    # gunicorn.conf.py sets it below the gthread thread count)
+    config["SSE_MAX_STREAMS"] = int(env.get("SSE_MAX_STREAMS") or 0)
+
+    # Presence and typing state: in-process unless a Redis URL is given (see presence.py)
+    config["PRESENCE_STORE_URL"] = env.get("PRESENCE_STORE_URL")
+    # Seconds a heartbeat / typing ping keeps a user shown as online / typing
+    config["PRESENCE_TTL"] = int(env.get("PRESENCE_TTL", 45))
+    config["TYPING_TTL"] = int(env.get("TYPING_TTL", 6))
+
+    # Bytes of recently opened files the service worker keeps for offline use (see static/sw.js)
+    config["OFFLINE_CACHE_BYTES"] = int(env.get("OFFLINE_CACHE_BYTES", 50 * 1024 * 1024))
+
+    # Part of every page ETag, so a deploy does not revalidate old markup (see http_cache.py)
+    config["RELEASE_ID"] = env.get("RELEASE_ID")
+
+    # File upload configuration
+    config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    config['UPLOAD_FOLDER'] = 'uploads'
+    return config
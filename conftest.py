@@ -0,0 +1,77 @@
+"""
+Shared pytest setup: run the app against an in-memory SQLite database
+instead of the development database in instance/.
+"""
+import os
+import secrets
+from contextlib import contextmanager
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.setdefault('SESSION_SECRET', 'test-secret')
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db
+import cache
+import migrations
+import routes  # noqa: F401
+from models import User, Team, TeamMember
+
+with app.app_context():
+    migrations.upgrade()
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+    with app.app_context():
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            if table is not migrations.schema_migrations:
+                db.session.execute(table.delete())
+        db.session.commit()
+    cache.clear_all()
+
+
+def login(client, user):
+    """Log ``user`` in on the test client's session"""
+    with client.session_transaction() as sess:
+        sess['_user_id'] = user.id
+        sess['_fresh'] = True
+
+
+def team_with_admin(name='Test Team'):
+    """A new user and a new team with that user as its admin; returns (user, team)"""
+    user = User.create_user(f'user_{secrets.token_hex(4)}', 'password123')
+    team = Team(name=name, invite_code=secrets.token_urlsafe(8), created_by=user.id)
+    db.session.add_all([user, team])
+    db.session.flush()
+    db.session.add(TeamMember(team_id=team.id, user_id=user.id, role='admin'))
+    db.session.commit()
+    return user, team
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block runs more than ``limit`` SQL statements
+
+    Yields the list of statements seen so far.
+    """
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert len(statements) <= limit, (
+        f'{len(statements)} queries, expected at most {limit}:\n' + '\n'.join(statements)
+    )
@@ -0,0 +1,261 @@
+"""
+Real-time events for File Drive
+Publish/subscribe on named channels (e.g. ``team:3:chat``) and the
+Server-Sent Events framing the browser's EventSource reads.
+
+The default broker is in-process: subscribers of this worker see events
+published by this worker. With several workers set EVENT_BROKER_URL to a
+Redis (or Redis-compatible) server: events are published there and one
+listener thread per worker hands them to the local subscribers. Redis
+pub/sub is fire-and-forget; clients reload state from the database when
+they reconnect.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import Response
+
+from app import app
+
+CHANNEL_PREFIX = 'filedrive:'
+# Events a slow client may fall behind by before its stream is dropped
+SUBSCRIBER_BUFFER = 256
+KEEPALIVE = 15  # seconds
+
+
+class Subscription:
+    """Events of one channel for one client, in publish order"""
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """Next event, or None if nothing arrived within ``timeout``"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process broker: delivers to subscribers of this worker only"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+    def publish(self, channel, event):
+        self.deliver(channel, event)
+
+    def deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                # The client stopped reading; end its stream and let it reconnect
+                subscription.overflowed = True
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """Fans events out to every worker through Redis pub/sub"""
+
+    def __init__(self, url):
+        super().__init__()
+        import redis  # optional dependency, only needed with EVENT_BROKER_URL
+        self._redis = redis.Redis.from_url(url)
+        self._listener_pid = None
+
+    def subscribe(self, channel):
+        self._ensure_listener()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        self._redis.publish(CHANNEL_PREFIX + channel, json.dumps(event))
+
+    def _ensure_listener(self):
+        # Threads don't survive fork; start one per worker process
+        if self._listener_pid != os.getpid():
+            with self._lock:
+                if self._listener_pid != os.getpid():
+                    threading.Thread(target=self._listen, name='event-listener', daemon=True).start()
+                    self._listener_pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(CHANNEL_PREFIX + '*')
+                for message in pubsub.listen():
+                    channel = message['channel'].decode()[len(CHANNEL_PREFIX):]
+                    self.deliver(channel, json.loads(message['data']))
+            except Exception as e:
+                logging.warning(f"Event broker connection lost, reconnecting: {e}")
+                time.sleep(1)
+
+
+def create_broker(url=None):
+    if not url:
+        return LocalBroker()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBroker(url)
+    raise ValueError(f'Unsupported EVENT_BROKER_URL: {url}')
+
+
+broker = create_broker(app.config.get('EVENT_BROKER_URL'))
+
+
+def team_channel(team_id, kind):
+    return f'team:{team_id}:{kind}'
+
+
+def publish(channel, event_type, data, event_id=None):
+    """Send an event to every subscriber of ``channel``"""
+    broker.publish(channel, {'id': event_id, 'type': event_type, 'data': data})
+
+
+def format_sse(event):
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event['data'])}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(subscription, max_duration=None, backlog=(), last_id=None):
+    """SSE body for a subscription: events as they come, comments as keepalives
+
+    ``backlog`` is sent first: events a resuming client missed, read after
+    subscribing so none fall in between. A live event with the id of one
+    already sent is skipped.
+
+    Numeric ids are assigned when a row is inserted but become visible at
+    commit, so they can arrive out of order. An event with an id at or
+    below the newest one sent (or ``last_id``, the client's cursor) is
+    still delivered, but without an ``id:`` line, so the browser's
+    Last-Event-ID never moves backwards.
+
+    Ends after ``max_duration`` seconds so a browser's EventSource
+    reconnects and a worker is never held by one client for good.
+    """
+    max_duration = max_duration or app.config.get('SSE_MAX_DURATION', 300)
+    deadline = time.monotonic() + max_duration
+    sent = set()
+
+    def frame(event):
+        nonlocal last_id
+        event_id = event.get('id')
+        if isinstance(event_id, int):
+            if event_id in sent:
+                return None
+            sent.add(event_id)
+            if last_id is not None and event_id <= last_id:
+                return format_sse(dict(event, id=None))
+            last_id = event_id
+        return format_sse(event)
+
+    try:
+        yield f'retry: {app.config.get("SSE_RETRY_MS", 2000)}\n\n'
+        for event in backlog:
+            chunk = frame(event)
+            if chunk:
+                yield chunk
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = subscription.get(timeout=min(KEEPALIVE, remaining))
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            chunk = frame(event)
+            if chunk:
+                yield chunk
+    finally:
+        subscription.close()
+
+
+class StreamSlots:
+    """Open SSE streams in this worker, at most SSE_MAX_STREAMS (0: no limit)
+
+    A gthread worker serves each stream from one of its threads for up to
+    SSE_MAX_DURATION seconds; the cap keeps the rest free for page loads,
+    uploads and health checks however many tabs are open.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self):
+        limit = app.config.get('SSE_MAX_STREAMS', 0)
+        with self._lock:
+            if limit and self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = StreamSlots()
+
+
+def sse_busy_response():
+    """503 for a stream over the cap; the pages' EventSource handlers retry after Retry-After"""
+    retry_ms = app.config.get('SSE_BUSY_RETRY_MS', 10000)
+    response = Response(f'retry: {retry_ms}\n\n', status=503, mimetype='text/event-stream')
+    response.headers['Retry-After'] = str(max(retry_ms // 1000, 1))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def sse_response(subscription, backlog=(), last_id=None):
+    """Streaming text/event-stream response; unsubscribes when the client goes away
+
+    Answers 503 instead when this worker already has SSE_MAX_STREAMS open.
+    """
+    if not stream_slots.acquire():
+        subscription.close()
+        logging.info(f"SSE stream refused: {stream_slots.open} already open in this worker")
+        return sse_busy_response()
+    response = Response(stream(subscription, backlog=backlog, last_id=last_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(subscription.close)
+    response.call_on_close(stream_slots.release)
+    return response
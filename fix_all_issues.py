@@ -11,6 +11,7 @@ def fix_database():
     """Fix database schema issues"""
     try:
         from app import app, db
+        import migrations
         
         with app.app_context():
             # Remove existing database file
@@ -20,7 +21,7 @@ def fix_database():
                 print(f"✓ Removed existing database: {db_path}")
             
             # Create new database with current schema
-            db.create_all()
+            migrations.upgrade()
             print("✓ Created new database with current schema")
             
     except Exception as e:
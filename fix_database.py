@@ -1,6 +1,7 @@
 import os
 import sqlite3
 from app import app, db
+import migrations
 from models import User, Team, TeamMember, File, Folder, Message, Activity, FileVersion
 
 def fix_database():
@@ -15,7 +16,7 @@ def fix_database():
     # Create the database with new schema
     with app.app_context():
         print("Creating new database with updated schema...")
-        db.create_all()
+        migrations.upgrade()
         print("Database created successfully!")
         
         # Test creating a user with empty email
@@ -0,0 +1,107 @@
+"""
+Gunicorn configuration for File Drive
+gunicorn reads this file from the working directory (or with -c). Choose a
+worker profile with GUNICORN_PROFILE:
+
+- gthread (default): processes with a pool of threads each. A slow
+  upload, download or open SSE stream holds one thread, not a whole worker.
+  Every open dashboard or chat tab keeps an SSE stream (and so a thread)
+  for up to SSE_MAX_DURATION seconds, so there are 32 threads by default,
+  and a worker serves at most SSE_MAX_STREAMS streams (default: three
+  quarters of its threads) and answers 503 beyond that, keeping threads
+  free for everything else. Startup fails if the cap leaves none.
+- sync: one request per process at a time. Only for short requests; each
+  transfer or SSE stream pins a worker until it ends.
+- gevent: many greenlets per process; the one to use when many tabs stay
+  open. Needs the gevent package, and psycogreen for a Postgres database.
+
+Live events (chat, activity, presence) go through an in-process broker
+unless EVENT_BROKER_URL names a Redis server (see events.py), and then only
+reach tabs connected to the worker that published them. Without a broker
+the gthread and gevent profiles therefore run a single worker, and startup
+logs a warning if WEB_CONCURRENCY asks for more.
+
+With a broker, worker counts come from the CPU count. WEB_CONCURRENCY
+(workers) and GUNICORN_THREADS (threads per gthread worker, which also sizes
+the SQLite connection pool, see sqlite_profile.py) override the defaults.
+Compare the profiles on your own hardware with
+benchmarks/gunicorn_profiles.py.
+"""
+import multiprocessing
+import os
+
+PROFILES = ('gthread', 'sync', 'gevent')
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread')
+if profile not in PROFILES:
+    raise RuntimeError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not {profile!r}")
+
+cpus = multiprocessing.cpu_count()
+# Without it, events stay in the worker that published them
+shared_events = bool(os.environ.get('EVENT_BROKER_URL'))
+
+wsgi_app = 'main:app'
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = profile
+
+if profile == 'sync':
+    default_workers = 2 * cpus + 1
+elif profile == 'gthread':
+    default_workers = cpus + 1 if shared_events else 1
+    threads = int(os.environ.get('GUNICORN_THREADS') or 32)
+    # Read by sqlite_profile.engine_options when the app is loaded below
+    os.environ['GUNICORN_THREADS'] = str(threads)
+    # Streams beyond this get a 503 (see events.sse_response), so open tabs
+    # cannot take the threads page loads and health checks need
+    sse_streams = int(os.environ.get('SSE_MAX_STREAMS') or threads - max(threads // 4, 2))
+    if not 0 < sse_streams < threads:
+        raise RuntimeError(f'SSE_MAX_STREAMS must leave gthread workers a thread for other requests: '
+                           f'{sse_streams} streams with GUNICORN_THREADS={threads}')
+    os.environ['SSE_MAX_STREAMS'] = str(sse_streams)
+else:
+    default_workers = cpus if shared_events else 1
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 1000)
+workers = int(os.environ.get('WEB_CONCURRENCY') or default_workers)
+
+# Import the app once in the master and fork it: workers start in
+# milliseconds and share memory. gevent has to patch the standard library
+# before the app is imported, so it loads the app in each worker instead.
+preload_app = profile != 'gevent'
+
+# Seconds a worker may go silent before it is killed and replaced. Sync
+# workers are silent for the whole of a request, so allow for long transfers.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or (300 if profile == 'sync' else 60))
+# On restart or deploy, running uploads and downloads get this long to finish
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT') or 60)
+keepalive = 5
+
+# Recycle workers now and then to bound slow leaks; the jitter keeps them
+# from all restarting at the same moment
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 2000)
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+# Addresses whose X-Forwarded-* headers gunicorn trusts: the platform's
+# proxy. Only the local one by default; ProxyFix in app.py handles one hop.
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1,::1')
+
+
+def on_starting(server):
+    if workers > 1 and not shared_events:
+        server.log.warning(
+            '%d workers but no EVENT_BROKER_URL: chat, activity and presence events only reach '
+            'tabs connected to the worker that published them. Set EVENT_BROKER_URL or WEB_CONCURRENCY=1.',
+            workers,
+        )
+    if profile == 'sync':
+        server.log.warning('sync workers: every open chat or dashboard tab pins a worker for up to '
+                           'SSE_MAX_DURATION seconds')
+
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the worker
+    if preload_app:
+        from app import app, db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
@@ -0,0 +1,87 @@
+"""
+Conditional GET for File Drive pages and JSON APIs
+A view decorated with conditional() names the change counters its response
+is built from (see versions.py) before it runs. Their versions, the URL and
+the user's own state make up a weak ETag; a request whose If-None-Match
+still matches is answered 304 without running the view, so an unchanged
+page costs one counter lookup. The counters are read from the database,
+not versions.cached(): another worker's change would otherwise go unseen
+for a few seconds, long enough for the page a user is redirected to after
+an upload to come back 304 without it.
+
+Responses are per user: they are sent with Cache-Control: private and vary
+on the session cookie. Pages rendered with a flash message and non-200
+responses (redirects, 403s) get no ETag.
+"""
+import glob
+import hashlib
+import os
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+import assets
+import users
+import versions
+from app import app
+
+
+def _release():
+    """RELEASE_ID, or the newest template's mtime when it is not set
+
+    Pages link hashed asset names, so the asset version is part of it too.
+    """
+    release = app.config.get('RELEASE_ID')
+    if not release:
+        templates = glob.glob(os.path.join(app.root_path, app.template_folder, '*.html'))
+        release = str(int(max(map(os.path.getmtime, templates), default=0)))
+    return f"{release}-{assets.manifest['version']}"
+
+
+RELEASE = _release()
+
+
+def user_state():
+    """What pages show of the current user: the fields of its cached snapshot"""
+    return tuple(getattr(current_user, field) for field in users.SNAPSHOT_FIELDS)
+
+
+def make_etag(scopes, extra=()):
+    """Weak ETag value of a response built from ``scopes`` as of now"""
+    parts = (RELEASE, request.full_path, user_state(), tuple(scopes),
+             tuple(versions.current_many(list(scopes))), tuple(extra))
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def conditional(validator, cache_control='private, no-cache'):
+    """Answer GETs of the view with 304 while its ETag is unchanged
+
+    ``validator`` takes the view's arguments and returns ``(scopes, extra)``:
+    the (scope, scope_id) pairs the response depends on and any other values
+    it does, such as the user's teams; or None to skip validation.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            validators = validator(*args, **kwargs)
+            if validators is None:
+                return view(*args, **kwargs)
+            etag = make_etag(*validators)
+            pending_flash = bool(session.get('_flashes'))
+
+            if request.if_none_match.contains_weak(etag) and not pending_flash:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                # A page showing a flash message must not be replayed from cache
+                if response.status_code != 200 or (pending_flash and response.mimetype == 'text/html'):
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
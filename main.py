@@ -6,6 +6,10 @@ import routes  # noqa: F401
 application = app
 
 if __name__ == "__main__":
+    import migrations
+    with app.app_context():
+        migrations.upgrade()
+
     # Get port from environment variable (for cloud deployment)
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
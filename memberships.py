@@ -0,0 +1,105 @@
+"""
+Team membership lookups for File Drive
+Authorization checks ask "is this user in this team, and with what role?"
+on nearly every request. Answers are memoized for the request in flask.g
+and kept in a process-wide TTL cache; TeamMember inserts, role changes and
+deletes invalidate their entry when the transaction commits.
+
+Lookups return a read-only Membership snapshot, not the ORM row; load the
+TeamMember itself to change it. teams() caches a user's team list for the
+team switcher the same way, as TeamSummary snapshots.
+"""
+from collections import namedtuple
+
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import app, db
+from cache import TTLCache
+from models import Team, TeamMember
+
+Membership = namedtuple('Membership', ['id', 'team_id', 'user_id', 'role', 'joined_at'])
+TeamSummary = namedtuple('TeamSummary', ['id', 'name', 'description', 'invite_code', 'role'])
+
+cache = TTLCache(
+    'memberships',
+    maxsize=app.config.get('MEMBERSHIP_CACHE_SIZE', 4096),
+    ttl=app.config.get('MEMBERSHIP_CACHE_TTL', 30),
+)
+
+team_lists = TTLCache(
+    'user_teams',
+    maxsize=app.config.get('MEMBERSHIP_CACHE_SIZE', 4096),
+    ttl=app.config.get('MEMBERSHIP_CACHE_TTL', 30),
+)
+
+
+def get(team_id, user_id):
+    """Membership of ``user_id`` in ``team_id``, or None if not a member"""
+    if not team_id or not user_id:
+        return None
+    key = (team_id, user_id)
+    memo = g.setdefault('_memberships', {}) if has_app_context() else {}
+    if key in memo:
+        return memo[key]
+
+    membership = cache.get(key, default=False)
+    if membership is False:
+        row = TeamMember.query.filter(
+            TeamMember.team_id == team_id,
+            TeamMember.user_id == user_id
+        ).first()
+        membership = Membership(row.id, row.team_id, row.user_id, row.role, row.joined_at) if row else None
+        # Non-members are cached too; joining invalidates the entry
+        cache.set(key, membership)
+    memo[key] = membership
+    return membership
+
+
+def role(team_id, user_id):
+    membership = get(team_id, user_id)
+    return membership.role if membership else None
+
+
+def teams(user_id):
+    """TeamSummary of every team ``user_id`` belongs to, with the user's role in it"""
+    summaries = team_lists.get(user_id)
+    if summaries is None:
+        rows = db.session.query(Team.id, Team.name, Team.description, Team.invite_code, TeamMember.role).join(
+            TeamMember, TeamMember.team_id == Team.id
+        ).filter(TeamMember.user_id == user_id).order_by(Team.id).all()
+        summaries = [TeamSummary(*row) for row in rows]
+        team_lists.set(user_id, summaries)
+    return summaries
+
+
+def invalidate(team_id, user_id):
+    cache.delete((team_id, user_id))
+    team_lists.delete(user_id)
+    if has_app_context():
+        g.get('_memberships', {}).pop((team_id, user_id), None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_membership_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TeamMember):
+            session.info.setdefault('changed_memberships', set()).add((obj.team_id, obj.user_id))
+        elif isinstance(obj, Team) and (obj not in session.dirty or session.is_modified(obj)):
+            session.info['teams_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for team_id, user_id in session.info.pop('changed_memberships', ()):
+        invalidate(team_id, user_id)
+    # Renames are rare; drop every cached list rather than track who sees the team
+    if session.info.pop('teams_changed', False):
+        team_lists.clear()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('changed_memberships', None)
+    session.info.pop('teams_changed', None)
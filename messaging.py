@@ -0,0 +1,116 @@
+"""
+Team chat messaging for File Drive
+send() stores a message and its activity event in one transaction. A
+client may pass an idempotency key; retrying with the same key returns the
+message the first attempt stored instead of posting it twice.
+
+Message changes are pushed to the team's ``chat`` channel (see events.py)
+once their transaction commits: ``message.created``, ``message.updated``
+and ``message.deleted``, each carrying message_json(). The payload is
+built at flush time, while the row is loaded and its id known, and
+dropped if the transaction rolls back.
+"""
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import activity
+import events
+import users
+from app import db
+from models import Message
+
+CLIENT_KEY_MAX_LENGTH = 64
+
+
+def _sent_with_key(team_id, client_key):
+    return Message.query.filter_by(
+        team_id=team_id, sender_id=current_user.id, client_key=client_key
+    ).first()
+
+
+def send(team_id, content, client_key=None, reply_to_id=None):
+    """Post a message as the current user; returns (message, created)
+
+    Raises ValueError for a reply to a message outside the team.
+    """
+    if client_key:
+        existing = _sent_with_key(team_id, client_key)
+        if existing:
+            return existing, False
+    if reply_to_id and not Message.query.filter_by(id=reply_to_id, team_id=team_id).first():
+        raise ValueError('Reply target not found')
+
+    message = Message(
+        content=content,
+        team_id=team_id,
+        sender=current_user.load(),
+        reply_to_id=reply_to_id,
+        client_key=client_key
+    )
+    db.session.add(message)
+    activity.record(team_id, 'send_message', message, 'Sent a message')
+    session = db.session()
+    try:
+        # The caller renders the message next; keep it loaded rather than
+        # re-reading it in a second transaction
+        session.expire_on_commit = False
+        session.commit()
+    except IntegrityError:
+        # A concurrent retry with the same key got there first
+        session.rollback()
+        existing = _sent_with_key(team_id, client_key) if client_key else None
+        if existing is None:
+            raise
+        return existing, False
+    finally:
+        session.expire_on_commit = True
+    return message, True
+
+
+def message_json(message):
+    """What clients need to render a message, without per-viewer markup"""
+    # Pages preload senders; single messages use the user cache instead of a lazy load
+    sender = message.sender if 'sender' in message.__dict__ else users.load_user(message.sender_id)
+    return {
+        'id': message.id,
+        'team_id': message.team_id,
+        'sender_id': message.sender_id,
+        'sender_name': sender.display_name if sender else None,
+        'sender_avatar': sender.profile_image_url if sender else None,
+        'content': message.content,
+        'reply_to_id': message.reply_to_id,
+        'client_key': message.client_key,
+        'is_edited': bool(message.is_edited),
+        'created_at': message.created_at.isoformat() if message.created_at else None,
+        'edited_at': message.edited_at.isoformat() if message.edited_at else None,
+    }
+
+
+def _change_type(session, message):
+    if message in session.new:
+        return 'message.created'
+    if message.is_deleted:
+        return 'message.deleted'
+    return 'message.updated'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_message_events(session, flush_context):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Message) and (obj in session.new or session.is_modified(obj)):
+            event_type = _change_type(session, obj)
+            data = {'id': obj.id, 'team_id': obj.team_id} if event_type == 'message.deleted' else message_json(obj)
+            session.info.setdefault('chat_events', []).append((obj.team_id, event_type, data))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    for team_id, event_type, data in session.info.pop('chat_events', ()):
+        events.publish(events.team_channel(team_id, 'chat'), event_type, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('chat_events', None)
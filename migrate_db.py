@@ -1,84 +1,30 @@
 #!/usr/bin/env python3
 """
 Database Migration Script
-Handles schema updates for the File Drive application
+Applies the versioned schema migrations in migrations/versions
+
+Usage: python migrate_db.py [upgrade|status]
 """
 
-import os
 import sys
-from app import app, db
+from app import app
+import migrations
 
-def migrate_database():
-    """Add missing columns to existing database"""
+def main(command='upgrade'):
     with app.app_context():
-        try:
-            # Add missing columns to users table
-            db.engine.execute("""
-                ALTER TABLE users 
-                ADD COLUMN use_single_user_mode BOOLEAN DEFAULT FALSE
-            """)
-            print("✓ Added use_single_user_mode column to users table")
-        except Exception as e:
-            print(f"Note: use_single_user_mode column might already exist: {e}")
-        
-        try:
-            # Add missing columns to teams table
-            db.engine.execute("""
-                ALTER TABLE teams 
-                ADD COLUMN group_photo_url VARCHAR(500)
-            """)
-            print("✓ Added group_photo_url column to teams table")
-        except Exception as e:
-            print(f"Note: group_photo_url column might already exist: {e}")
-        
-        try:
-            db.engine.execute("""
-                ALTER TABLE teams 
-                ADD COLUMN bin_retention_days INTEGER DEFAULT 30
-            """)
-            print("✓ Added bin_retention_days column to teams table")
-        except Exception as e:
-            print(f"Note: bin_retention_days column might already exist: {e}")
-        
-        try:
-            db.engine.execute("""
-                ALTER TABLE teams 
-                ADD COLUMN only_admin_can_restore BOOLEAN DEFAULT TRUE
-            """)
-            print("✓ Added only_admin_can_restore column to teams table")
-        except Exception as e:
-            print(f"Note: only_admin_can_restore column might already exist: {e}")
-        
-        try:
-            # Add missing columns to files table
-            db.engine.execute("""
-                ALTER TABLE files 
-                ADD COLUMN is_in_bin BOOLEAN DEFAULT FALSE
-            """)
-            print("✓ Added is_in_bin column to files table")
-        except Exception as e:
-            print(f"Note: is_in_bin column might already exist: {e}")
-        
-        try:
-            db.engine.execute("""
-                ALTER TABLE files 
-                ADD COLUMN bin_expiry_date DATETIME
-            """)
-            print("✓ Added bin_expiry_date column to files table")
-        except Exception as e:
-            print(f"Note: bin_expiry_date column might already exist: {e}")
-        
-        try:
-            db.engine.execute("""
-                ALTER TABLE files 
-                ADD COLUMN deleted_by VARCHAR
-            """)
-            print("✓ Added deleted_by column to files table")
-        except Exception as e:
-            print(f"Note: deleted_by column might already exist: {e}")
-        
-        print("\n✓ Database migration completed successfully!")
-        print("The application should now work without errors.")
+        if command == 'upgrade':
+            applied = migrations.upgrade()
+            if applied:
+                print(f"✓ Applied migrations: {', '.join(applied)}")
+            else:
+                print("✓ Database is up to date")
+        elif command == 'status':
+            for revision, description, applied in migrations.status():
+                print(f"{'✓' if applied else ' '} {revision} {description}")
+        else:
+            print(__doc__)
+            return 1
+    return 0
 
 if __name__ == "__main__":
-    migrate_database() 
\ No newline at end of file
+    sys.exit(main(*sys.argv[1:2]))
@@ -0,0 +1,151 @@
+"""
+Versioned schema migrations for File Drive
+Each module in migrations/versions defines ``revision``, ``description`` and
+``upgrade(ctx)``; applied revisions are recorded in schema_migrations so every
+revision runs exactly once per database. Run with ``flask db-upgrade`` or
+``python migrate_db.py upgrade`` before starting the web workers.
+
+Revisions run inside a transaction unless they set ``transactional = False``,
+which Postgres requires for CREATE INDEX CONCURRENTLY.
+"""
+import importlib
+import logging
+import pkgutil
+from datetime import datetime
+
+from sqlalchemy import text
+
+from app import db
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('revision', db.String(64), primary_key=True),
+    db.Column('description', db.String(200)),
+    db.Column('applied_at', db.DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_lock so concurrent deploys run migrations one at a time
+_ADVISORY_LOCK_KEY = 72_015_001
+
+
+class MigrationContext:
+    """What a revision's upgrade() gets: a connection plus dialect-aware helpers"""
+
+    def __init__(self, conn, transactional=True):
+        self.conn = conn
+        self.transactional = transactional
+        self.dialect = conn.dialect.name
+
+    def execute(self, statement, params=None):
+        return self.conn.execute(text(statement), params or {})
+
+    def has_table(self, name):
+        return db.inspect(self.conn).has_table(name)
+
+    def has_column(self, table_name, column_name):
+        return any(col['name'] == column_name for col in db.inspect(self.conn).get_columns(table_name))
+
+    @property
+    def false(self):
+        """Literal for a false boolean in this dialect"""
+        return 'false' if self.dialect == 'postgresql' else '0'
+
+    def create_index(self, name, table_name, columns, where=None, using=None, unique=False):
+        """Create an index if it does not exist yet
+
+        On Postgres, non-transactional revisions build it CONCURRENTLY so the
+        table stays writable; a previous interrupted build leaves an INVALID
+        index behind, which is dropped and rebuilt. ``where`` makes it partial.
+        """
+        concurrently = self.dialect == 'postgresql' and not self.transactional
+        if concurrently:
+            invalid = self.execute(
+                "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND NOT i.indisvalid",
+                {'name': name}
+            ).first()
+            if invalid:
+                self.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+        parts = ['CREATE']
+        if unique:
+            parts.append('UNIQUE')
+        parts.append('INDEX')
+        if concurrently:
+            parts.append('CONCURRENTLY')
+        parts.append(f'IF NOT EXISTS {name} ON {table_name}')
+        if using and self.dialect == 'postgresql':
+            parts.append(f'USING {using}')
+        parts.append(f"({', '.join(columns)})")
+        if where:
+            parts.append(f'WHERE {where}')
+        self.execute(' '.join(parts))
+
+
+def load_revisions():
+    """All revision modules, ordered by revision id"""
+    from migrations import versions
+    modules = [
+        importlib.import_module(f'{versions.__name__}.{info.name}')
+        for info in pkgutil.iter_modules(versions.__path__)
+    ]
+    return sorted(modules, key=lambda module: module.revision)
+
+
+def applied_revisions(engine):
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {row.revision for row in conn.execute(schema_migrations.select())}
+
+
+def _record(conn, module):
+    conn.execute(schema_migrations.insert().values(
+        revision=module.revision,
+        description=module.description,
+        applied_at=datetime.utcnow(),
+    ))
+
+
+def _apply(engine, module):
+    if getattr(module, 'transactional', True):
+        with engine.begin() as conn:
+            module.upgrade(MigrationContext(conn))
+            _record(conn, module)
+    else:
+        with engine.connect() as conn:
+            autocommit = conn.execution_options(isolation_level='AUTOCOMMIT')
+            module.upgrade(MigrationContext(autocommit, transactional=False))
+        # Recorded only once every statement went through; IF NOT EXISTS makes a rerun safe
+        with engine.begin() as conn:
+            _record(conn, module)
+
+
+def upgrade(engine=None):
+    """Apply pending revisions in order; returns the ids that were applied"""
+    engine = engine or db.engine
+    import models  # noqa: F401 -- every table must be on db.metadata
+
+    lock = None
+    if engine.dialect.name == 'postgresql':
+        lock = engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        lock.execute(text('SELECT pg_advisory_lock(:key)'), {'key': _ADVISORY_LOCK_KEY})
+    try:
+        done = applied_revisions(engine)
+        applied = []
+        for module in load_revisions():
+            if module.revision in done:
+                continue
+            logging.info(f"Applying migration {module.revision}: {module.description}")
+            _apply(engine, module)
+            applied.append(module.revision)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': _ADVISORY_LOCK_KEY})
+            lock.close()
+
+
+def status(engine=None):
+    """(revision, description, applied) for every known revision"""
+    done = applied_revisions(engine or db.engine)
+    return [(module.revision, module.description, module.revision in done) for module in load_revisions()]
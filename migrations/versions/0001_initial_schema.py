@@ -0,0 +1,10 @@
+"""Create every table defined in models.py that does not exist yet"""
+from app import db
+
+revision = '0001'
+description = 'initial schema'
+
+
+def upgrade(ctx):
+    # checkfirst keeps this safe on databases that predate schema_migrations
+    db.metadata.create_all(ctx.conn, checkfirst=True)
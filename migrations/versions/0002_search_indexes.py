@@ -0,0 +1,17 @@
+"""Filename trigram and message full-text indexes (see search.py)"""
+import search
+
+revision = '0002'
+description = 'search indexes'
+transactional = False
+
+
+def upgrade(ctx):
+    if ctx.dialect == 'sqlite':
+        search.install_sqlite_indexes(ctx.conn)
+    elif ctx.dialect == 'postgresql':
+        ctx.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        ctx.create_index('ix_files_original_filename_trgm', 'files',
+                         ['original_filename gin_trgm_ops'], using='gin')
+        ctx.create_index('ix_messages_content_fts', 'messages',
+                         ["to_tsvector('simple', content)"], using='gin')
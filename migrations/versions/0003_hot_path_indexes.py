@@ -0,0 +1,16 @@
+"""Indexes behind the listing, chat, activity feed and membership lookups"""
+revision = '0003'
+description = 'hot path indexes'
+transactional = False
+
+
+def upgrade(ctx):
+    live = f'is_deleted = {ctx.false}'
+    for name, column in [('updated', 'updated_at'), ('name', 'original_filename'),
+                         ('size', 'file_size'), ('type', 'file_type')]:
+        ctx.create_index(f'ix_files_listing_{name}', 'files',
+                         ['team_id', 'folder_id', column, 'id'], where=live)
+    ctx.create_index('ix_folders_listing', 'folders', ['team_id', 'parent_id', 'name', 'id'])
+    ctx.create_index('ix_messages_team_created', 'messages', ['team_id', 'created_at', 'id'])
+    ctx.create_index('ix_activities_team_created', 'activities', ['team_id', 'created_at'])
+    ctx.create_index('ix_team_members_user', 'team_members', ['user_id'])
@@ -0,0 +1,26 @@
+"""Materialized ancestor paths on folders (see Folder.path)"""
+revision = '0004'
+description = 'folder paths'
+
+
+def upgrade(ctx):
+    if not ctx.has_column('folders', 'path'):
+        ctx.execute("ALTER TABLE folders ADD COLUMN path VARCHAR(1000) NOT NULL DEFAULT '/'")
+
+    parents = dict(ctx.execute('SELECT id, parent_id FROM folders').all())
+    paths = {}
+
+    def path_of(folder_id):
+        if folder_id not in paths:
+            chain, current = [], parents[folder_id]
+            while current is not None:
+                chain.append(current)
+                current = parents.get(current)
+            paths[folder_id] = '/' + ''.join(f'{ancestor}/' for ancestor in reversed(chain))
+        return paths[folder_id]
+
+    updates = [{'id': folder_id, 'path': path_of(folder_id)} for folder_id in parents]
+    updates = [row for row in updates if row['path'] != '/']
+    if updates:
+        ctx.execute('UPDATE folders SET path = :path WHERE id = :id', updates)
+    ctx.create_index('ix_folders_path', 'folders', ['team_id', 'path'])
@@ -0,0 +1,9 @@
+"""Per-scope change counters behind cached responses (see versions.py)"""
+from models import ChangeCounter
+
+revision = '0005'
+description = 'change counters'
+
+
+def upgrade(ctx):
+    ChangeCounter.__table__.create(ctx.conn, checkfirst=True)
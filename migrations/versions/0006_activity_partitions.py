@@ -0,0 +1,66 @@
+"""Monthly activity partitions on Postgres and daily rollups (see activity_storage.py)
+
+Postgres cannot partition an existing table in place: the table is renamed,
+a partitioned ``activities`` is created with partitions for every month
+that has rows, and the rows are copied over. The primary key becomes
+(id, created_at), as partitioning requires. SQLite keeps its table; the
+archive tables appear on the first ``flask activity-maintain``.
+"""
+from datetime import date
+
+import activity_storage
+from models import ActivityDaily
+
+revision = '0006'
+description = 'activity partitions and daily rollups'
+
+COLUMNS = 'id, team_id, user_id, action, target_type, target_id, description, created_at'
+
+
+def upgrade(ctx):
+    ActivityDaily.__table__.create(ctx.conn, checkfirst=True)
+    if ctx.dialect != 'postgresql':
+        return
+
+    partitioned = ctx.execute(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'activities'"
+    ).first()
+    if partitioned:
+        return
+
+    ctx.execute('ALTER TABLE activities RENAME TO activities_unpartitioned')
+    ctx.execute('ALTER TABLE activities_unpartitioned RENAME CONSTRAINT activities_pkey TO activities_unpartitioned_pkey')
+    ctx.execute('ALTER INDEX IF EXISTS ix_activities_team_created RENAME TO ix_activities_unpartitioned_team_created')
+    ctx.execute('ALTER SEQUENCE activities_id_seq OWNED BY NONE')
+    ctx.execute("""
+        CREATE TABLE activities (
+            id INTEGER NOT NULL DEFAULT nextval('activities_id_seq'),
+            team_id INTEGER NOT NULL REFERENCES teams (id),
+            user_id VARCHAR NOT NULL REFERENCES users (id),
+            action VARCHAR(50) NOT NULL,
+            target_type VARCHAR(20),
+            target_id INTEGER,
+            description VARCHAR(255),
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    ctx.execute('ALTER SEQUENCE activities_id_seq OWNED BY activities.id')
+    ctx.execute(f'CREATE TABLE {activity_storage.DEFAULT_PARTITION} PARTITION OF activities DEFAULT')
+    ctx.execute('CREATE INDEX ix_activities_team_created ON activities (team_id, created_at)')
+
+    oldest = ctx.execute('SELECT min(created_at) FROM activities_unpartitioned').scalar()
+    this_month = activity_storage.month_start(date.today())
+    month = activity_storage.month_start(oldest) if oldest else this_month
+    while month < this_month:
+        activity_storage.create_partition(ctx.conn, month)
+        month = activity_storage.add_months(month, 1)
+    activity_storage.create_partitions(ctx.conn)
+
+    ctx.execute(
+        f'INSERT INTO activities ({COLUMNS}) '
+        f'SELECT id, team_id, user_id, action, target_type, target_id, description, '
+        f'COALESCE(created_at, now()) FROM activities_unpartitioned'
+    )
+    ctx.execute('DROP TABLE activities_unpartitioned')
@@ -0,0 +1,11 @@
+"""Idempotency keys for sending chat messages (see Message.client_key)"""
+revision = '0007'
+description = 'message client keys'
+transactional = False
+
+
+def upgrade(ctx):
+    if not ctx.has_column('messages', 'client_key'):
+        ctx.execute('ALTER TABLE messages ADD COLUMN client_key VARCHAR(64)')
+    # NULL keys never conflict, so messages sent without one are unaffected
+    ctx.create_index('ux_messages_sender_client_key', 'messages', ['sender_id', 'client_key'], unique=True)
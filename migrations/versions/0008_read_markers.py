@@ -0,0 +1,26 @@
+"""Read markers with unread counters (see read_markers.py)
+
+Existing members start with everything read; counting starts from here.
+Runs in a transaction: activities is partitioned on Postgres, where an
+index cannot be built CONCURRENTLY.
+"""
+from models import ReadMarker
+
+revision = '0008'
+description = 'read markers'
+
+
+def upgrade(ctx):
+    ReadMarker.__table__.create(ctx.conn, checkfirst=True)
+    ctx.create_index('ix_messages_team_id', 'messages', ['team_id', 'id'])
+    ctx.create_index('ix_activities_team_id', 'activities', ['team_id', 'id'])
+    ctx.execute(
+        'INSERT INTO read_markers (user_id, team_id, last_read_message_id, last_read_activity_id, '
+        'unread_messages, unread_activities, updated_at) '
+        'SELECT tm.user_id, tm.team_id, '
+        'COALESCE((SELECT max(m.id) FROM messages m WHERE m.team_id = tm.team_id), 0), '
+        'COALESCE((SELECT max(a.id) FROM activities a WHERE a.team_id = tm.team_id), 0), '
+        '0, 0, CURRENT_TIMESTAMP '
+        'FROM team_members tm '
+        'WHERE NOT EXISTS (SELECT 1 FROM read_markers r WHERE r.user_id = tm.user_id AND r.team_id = tm.team_id)'
+    )
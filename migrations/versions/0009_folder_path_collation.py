@@ -0,0 +1,11 @@
+"""Byte-order collation for folder paths on Postgres (see Folder.in_subtree)
+
+Rewrites ix_folders_path along with the column.
+"""
+revision = '0009'
+description = 'folder path collation'
+
+
+def upgrade(ctx):
+    if ctx.dialect == 'postgresql':
+        ctx.execute('ALTER TABLE folders ALTER COLUMN path TYPE VARCHAR(1000) COLLATE "C"')
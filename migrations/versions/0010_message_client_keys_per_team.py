@@ -0,0 +1,15 @@
+"""Scope message idempotency keys to the team (see messaging._sent_with_key)
+
+The new index is built before the old one goes, so keys stay unique
+throughout.
+"""
+revision = '0010'
+description = 'message client keys per team'
+transactional = False
+
+
+def upgrade(ctx):
+    ctx.create_index('ux_messages_team_sender_client_key', 'messages',
+                     ['team_id', 'sender_id', 'client_key'], unique=True)
+    concurrently = ' CONCURRENTLY' if ctx.dialect == 'postgresql' else ''
+    ctx.execute(f'DROP INDEX{concurrently} IF EXISTS ux_messages_sender_client_key')
@@ -0,0 +1,31 @@
+"""One version number per file (see File.next_version)
+
+Earlier concurrent edits could store the same number twice; those files'
+versions are renumbered in order before the unique index is built, and
+files.version is raised to the highest number.
+"""
+revision = '0011'
+description = 'file version numbers'
+
+
+def upgrade(ctx):
+    rows = ctx.execute(
+        'SELECT file_id, id, version_number FROM file_versions ORDER BY file_id, version_number, id'
+    ).all()
+    by_file = {}
+    for file_id, version_id, number in rows:
+        by_file.setdefault(file_id, []).append((version_id, number))
+    renumbered = []
+    for versions in by_file.values():
+        numbers = [number for _, number in versions]
+        if len(set(numbers)) != len(numbers):
+            renumbered += [{'id': version_id, 'number': position}
+                           for position, (version_id, _) in enumerate(versions, 1)]
+    if renumbered:
+        ctx.execute('UPDATE file_versions SET version_number = :number WHERE id = :id', renumbered)
+    ctx.execute(
+        'UPDATE files SET version = (SELECT max(v.version_number) FROM file_versions v WHERE v.file_id = files.id) '
+        'WHERE version IS NULL OR version < (SELECT max(v.version_number) FROM file_versions v WHERE v.file_id = files.id)'
+    )
+    ctx.execute('UPDATE files SET version = 1 WHERE version IS NULL')
+    ctx.create_index('ux_file_versions_number', 'file_versions', ['file_id', 'version_number'], unique=True)
@@ -0,0 +1,36 @@
+"""SQLite: AUTOINCREMENT activity ids (see Activity.__table_args__)
+
+Without it SQLite gives a new row the highest id in the table plus one, so
+once rotate() has moved the newest rows to an archive table their ids are
+handed out again. The table is rebuilt with AUTOINCREMENT and its sequence
+starts after the highest id in it or in any archive table.
+"""
+import activity_storage
+from models import Activity
+
+revision = '0012'
+description = 'activity ids never reused'
+
+COLUMNS = 'id, team_id, user_id, action, target_type, target_id, description, created_at'
+
+
+def upgrade(ctx):
+    if ctx.dialect != 'sqlite':
+        return
+    ddl = ctx.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'activities'").scalar()
+    if 'AUTOINCREMENT' not in ddl.upper():
+        ctx.execute('ALTER TABLE activities RENAME TO activities_rebuild')
+        for index in Activity.__table__.indexes:
+            ctx.execute(f'DROP INDEX IF EXISTS {index.name}')
+        Activity.__table__.create(ctx.conn)
+        ctx.execute(f'INSERT INTO activities ({COLUMNS}) SELECT {COLUMNS} FROM activities_rebuild')
+        ctx.execute('DROP TABLE activities_rebuild')
+
+    tables = ['activities'] + [activity_storage.partition_name(month)
+                               for month in activity_storage.stored_months(ctx.conn)]
+    highest = max(ctx.execute(f'SELECT COALESCE(max(id), 0) FROM {table}').scalar() for table in tables)
+    used = ctx.execute("SELECT seq FROM sqlite_sequence WHERE name = 'activities'").scalar()
+    if used is None:
+        ctx.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('activities', :seq)", {'seq': highest})
+    elif used < highest:
+        ctx.execute("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'activities'", {'seq': highest})
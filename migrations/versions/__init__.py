@@ -0,0 +1 @@
+"""Migration revisions, applied in order of their ``revision`` id"""
@@ -5,7 +5,9 @@ import random
 import string
 from app import db
 from flask_login import UserMixin
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import DDL, UniqueConstraint, and_, event, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session, attributes
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(UserMixin, db.Model):
@@ -135,7 +137,10 @@ class TeamMember(db.Model):
     team = db.relationship('Team', back_populates='members')
     user = db.relationship('User', back_populates='team_memberships')
     
-    __table_args__ = (UniqueConstraint('team_id', 'user_id', name='uq_team_user'),)
+    __table_args__ = (
+        UniqueConstraint('team_id', 'user_id', name='uq_team_user'),
+        db.Index('ix_team_members_user', 'user_id'),
+    )
 
 class UploadPermission(db.Model):
     __tablename__ = 'upload_permissions'
@@ -158,6 +163,10 @@ class Folder(db.Model):
     name = db.Column(db.String(100), nullable=False)
     team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('folders.id'), nullable=True)
+    # Materialized path: ids of all ancestors, root first, e.g. '/3/17/'; '/' at the top level.
+    # Compared byte by byte on Postgres too, where locale collations skip '/' (see in_subtree)
+    path = db.Column(db.String(1000).with_variant(postgresql.VARCHAR(1000, collation='C'), 'postgresql'),
+                     nullable=False, default='/')
     created_by = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     
@@ -167,6 +176,94 @@ class Folder(db.Model):
     parent = db.relationship('Folder', remote_side=[id], backref='subfolders')
     files = db.relationship('File', back_populates='folder')
 
+    __table_args__ = (
+        db.Index('ix_folders_listing', 'team_id', 'parent_id', 'name', 'id'),
+        db.Index('ix_folders_path', 'team_id', 'path'),
+    )
+
+    @property
+    def subtree_prefix(self):
+        """Path shared by every folder below this one"""
+        return f'{self.path}{self.id}/'
+
+    @property
+    def ancestor_ids(self):
+        return [int(part) for part in self.path.strip('/').split('/') if part]
+
+    def ancestors(self):
+        """Ancestors from the top level down, in a single query"""
+        ids = self.ancestor_ids
+        if not ids:
+            return []
+        by_id = {folder.id: folder for folder in Folder.query.filter(Folder.id.in_(ids))}
+        return [by_id[folder_id] for folder_id in ids if folder_id in by_id]
+
+    def breadcrumbs(self):
+        return self.ancestors() + [self]
+
+    def contains(self, other):
+        """True if ``other`` is this folder or lies anywhere below it"""
+        return other.id == self.id or other.path.startswith(self.subtree_prefix)
+
+    @staticmethod
+    def in_subtree(prefix):
+        """Filter for paths starting with ``prefix``, as an index-friendly range
+
+        Same rows as ``path LIKE prefix || '%'``; the prefix always ends in
+        '/', and '0' is the character right after '/'. That needs byte order,
+        which is why the column uses the "C" collation on Postgres: under
+        en_US.UTF-8, '/3/17/' sorts after '/30' and would be missed.
+        """
+        return and_(Folder.path >= prefix, Folder.path < prefix[:-1] + '0')
+
+    def descendants(self):
+        """Query for every folder below this one, at any depth"""
+        return Folder.query.filter(Folder.team_id == self.team_id, Folder.in_subtree(self.subtree_prefix))
+
+
+def _parent_path(connection, parent_id):
+    if parent_id is None:
+        return '/'
+    parent_path = connection.execute(
+        select(Folder.path).where(Folder.id == parent_id)
+    ).scalar_one()
+    return f'{parent_path}{parent_id}/'
+
+
+@event.listens_for(Folder, 'before_insert')
+def _set_folder_path(mapper, connection, folder):
+    folder.path = _parent_path(connection, folder.parent_id)
+
+
+@event.listens_for(Folder, 'before_update')
+def _move_folder_subtree(mapper, connection, folder):
+    """Rewrite the paths of a moved folder and everything below it"""
+    if not attributes.get_history(folder, 'parent_id').has_changes():
+        return
+    old_prefix = folder.subtree_prefix
+    new_path = _parent_path(connection, folder.parent_id)
+    if new_path.startswith(old_prefix):
+        raise ValueError('A folder cannot be moved into itself')
+    folder.path = new_path
+    new_prefix = folder.subtree_prefix
+    connection.execute(
+        update(Folder).where(
+            Folder.team_id == folder.team_id, Folder.in_subtree(old_prefix)
+        ).values(path=new_prefix + db.func.substr(Folder.path, len(old_prefix) + 1))
+    )
+    session = attributes.instance_state(folder).session
+    if session is not None:
+        session.info['moved_folders'] = True
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_moved_paths(session, flush_context):
+    """Loaded descendants of a moved folder still hold their old path"""
+    if session.info.pop('moved_folders', None):
+        for obj in list(session.identity_map.values()):
+            if isinstance(obj, Folder):
+                session.expire(obj, ['path'])
+
 class File(db.Model):
     __tablename__ = 'files'
     id = db.Column(db.Integer, primary_key=True)
@@ -196,6 +293,59 @@ class File(db.Model):
     uploader = db.relationship('User', back_populates='uploaded_files')
     versions = db.relationship('FileVersion', back_populates='file', cascade='all, delete-orphan')
 
+    def next_version(self):
+        """Raise the file's version in SQL and return the new number
+
+        The database computes it from the committed row under the write
+        lock, so concurrent edits get distinct numbers whatever they read.
+        """
+        files = File.__table__
+        version = db.session.execute(
+            update(files).where(files.c.id == self.id)
+            .values(version=db.func.coalesce(files.c.version, 1) + 1)
+            .returning(files.c.version)
+        ).scalar_one()
+        attributes.set_committed_value(self, 'version', version)
+        return version
+
+    @property
+    def content_tag(self):
+        """Changes whenever the file does; versions download and thumbnail URLs"""
+        stamp = self.updated_at or self.created_at
+        return format(int(stamp.timestamp() * 1000), 'x') if stamp else '0'
+
+    __table_args__ = (
+        # Keyset listing indexes, one per sort key (see pagination.py)
+        db.Index('ix_files_listing_updated', 'team_id', 'folder_id', 'updated_at', 'id',
+                 sqlite_where=db.text('is_deleted = 0'), postgresql_where=db.text('is_deleted = false')),
+        db.Index('ix_files_listing_name', 'team_id', 'folder_id', 'original_filename', 'id',
+                 sqlite_where=db.text('is_deleted = 0'), postgresql_where=db.text('is_deleted = false')),
+        db.Index('ix_files_listing_size', 'team_id', 'folder_id', 'file_size', 'id',
+                 sqlite_where=db.text('is_deleted = 0'), postgresql_where=db.text('is_deleted = false')),
+        db.Index('ix_files_listing_type', 'team_id', 'folder_id', 'file_type', 'id',
+                 sqlite_where=db.text('is_deleted = 0'), postgresql_where=db.text('is_deleted = false')),
+        # Trigram index for filename autocomplete (Postgres only, see search.py)
+        db.Index(
+            'ix_files_original_filename_trgm', 'original_filename',
+            postgresql_using='gin',
+            postgresql_ops={'original_filename': 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql'),
+    )
+
+class ChangeCounter(db.Model):
+    """Version number of a scope (e.g. a team's folders), bumped on every change; see versions.py"""
+    __tablename__ = 'change_counters'
+    scope = db.Column(db.String(50), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# The trigram index on files needs pg_trgm; a no-op on other databases
+event.listen(
+    File.__table__,
+    'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql')
+)
+
 class FileVersion(db.Model):
     __tablename__ = 'file_versions'
     id = db.Column(db.Integer, primary_key=True)
@@ -210,6 +360,11 @@ class FileVersion(db.Model):
     file = db.relationship('File', back_populates='versions')
     creator = db.relationship('User', foreign_keys=[created_by])
 
+    __table_args__ = (
+        # Numbers come from File.next_version(); two edits never share one
+        db.Index('ux_file_versions_number', 'file_id', 'version_number', unique=True),
+    )
+
 class Message(db.Model):
     __tablename__ = 'messages'
     id = db.Column(db.Integer, primary_key=True)
@@ -219,6 +374,8 @@ class Message(db.Model):
     team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
     sender_id = db.Column(db.String, db.ForeignKey('users.id'), nullable=False)
     reply_to_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)
+    # Idempotency key chosen by the sending client, so a retried send is stored once
+    client_key = db.Column(db.String(64), nullable=True)
     
     # Edit and deletion tracking
     is_edited = db.Column(db.Boolean, default=False)
@@ -233,7 +390,22 @@ class Message(db.Model):
     sender = db.relationship('User', back_populates='messages')
     reply_to = db.relationship('Message', remote_side=[id], backref='replies')
 
+    __table_args__ = (
+        db.Index('ix_messages_team_created', 'team_id', 'created_at', 'id'),
+        # Unread recounts: a team's messages after a read marker
+        db.Index('ix_messages_team_id', 'team_id', 'id'),
+        # Matches messaging._sent_with_key, so a key reused in another team is a new message
+        db.Index('ux_messages_team_sender_client_key', 'team_id', 'sender_id', 'client_key', unique=True),
+        # Full-text index for chat search (Postgres only, see search.py)
+        db.Index(
+            'ix_messages_content_fts', db.text("to_tsvector('simple', content)"),
+            postgresql_using='gin'
+        ).ddl_if(dialect='postgresql'),
+    )
+
 class Activity(db.Model):
+    # On Postgres the table is partitioned by month of created_at, and on
+    # SQLite older months are moved to archive tables (see activity_storage.py)
     __tablename__ = 'activities'
     id = db.Column(db.Integer, primary_key=True)
     team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), nullable=False)
@@ -247,3 +419,38 @@ class Activity(db.Model):
     # Relationships
     team = db.relationship('Team', foreign_keys=[team_id])
     user = db.relationship('User', foreign_keys=[user_id])
+
+    __table_args__ = (
+        db.Index('ix_activities_team_created', 'team_id', 'created_at'),
+        db.Index('ix_activities_team_id', 'team_id', 'id'),
+        # Ids are stream cursors and read markers: SQLite must not hand out
+        # the id of a row rotate() moved to an archive table again
+        {'sqlite_autoincrement': True},
+    )
+
+class ActivityDaily(db.Model):
+    """Activities per team, action and day; kept after the raw rows expire (see activity_storage.py)"""
+    __tablename__ = 'activity_daily'
+    day = db.Column(db.Date, primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_activity_daily_team_day', 'team_id', 'day'),
+    )
+
+class ReadMarker(db.Model):
+    """How far a member has read a team's chat and activity, and how much is left (see read_markers.py)"""
+    __tablename__ = 'read_markers'
+    user_id = db.Column(db.String, db.ForeignKey('users.id'), primary_key=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('teams.id'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, nullable=False, default=0)
+    last_read_activity_id = db.Column(db.Integer, nullable=False, default=0)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)
+    unread_activities = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('ix_read_markers_team', 'team_id'),
+    )
@@ -0,0 +1,217 @@
+"""
+Keyset (cursor) pagination for File Drive listings
+Pages are fetched with WHERE (sort_key, id) > last_seen instead of OFFSET,
+so every page costs the same no matter how deep into a folder, or how far
+back into a chat's history, it is.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from sqlalchemy import or_, tuple_
+
+from models import File, Folder, Message
+from queries import CHAT_MESSAGE_OPTIONS, FILE_ROW_OPTIONS, FOLDER_ROW_OPTIONS
+
+PAGE_SIZE = 50
+CHAT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Sortable listing keys and the File columns behind them
+FILE_SORT_KEYS = {
+    'name': File.original_filename,
+    'size': File.file_size,
+    'updated_at': File.updated_at,
+    'type': File.file_type,
+}
+DEFAULT_SORT = 'updated_at'
+DEFAULT_ORDER = {'name': 'asc', 'size': 'desc', 'updated_at': 'desc', 'type': 'asc'}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or does not match the listing"""
+
+
+class Page:
+    """One page of a folder listing: folders first, then files"""
+
+    def __init__(self, folders, files, next_cursor, sort, order):
+        self.folders = folders
+        self.files = files
+        self.next_cursor = next_cursor
+        self.sort = sort
+        self.order = order
+
+
+class MessagePage:
+    """One page of chat history in display order; next_cursor points further back"""
+
+    def __init__(self, messages, next_cursor):
+        self.messages = messages
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(data, dict):
+        raise InvalidCursor('Malformed cursor')
+    return data
+
+
+def _dump_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _load_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Malformed cursor')
+
+
+def _load_value(sort, value):
+    if sort == 'updated_at' and value is not None:
+        return _load_datetime(value)
+    return value
+
+
+def normalize_sort(sort, order):
+    """Fall back to the default sort for unknown keys or directions"""
+    if sort not in FILE_SORT_KEYS:
+        sort = DEFAULT_SORT
+    if order not in ('asc', 'desc'):
+        order = DEFAULT_ORDER[sort]
+    return sort, order
+
+
+def _after(columns, values, order):
+    """Keyset condition: rows strictly after ``values`` in listing order"""
+    key = tuple_(*columns)
+    return key > tuple_(*values) if order == 'asc' else key < tuple_(*values)
+
+
+def _ordering(columns, order):
+    return [column.asc() if order == 'asc' else column.desc() for column in columns]
+
+
+def list_directory(team_id, user_id, folder_id=None, sort=DEFAULT_SORT, order=None,
+                   cursor=None, limit=PAGE_SIZE, search_query=None):
+    """Return one Page of a folder in a team, or of a user's personal space
+
+    Folders (team mode only) come before files and are always sorted by
+    name. ``cursor`` is the ``next_cursor`` of the previous page.
+    """
+    sort, order = normalize_sort(sort, order)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    phase, last = 'folders' if team_id else 'files', None
+    if cursor:
+        data = decode_cursor(cursor)
+        if data.get('s') != sort or data.get('o') != order or data.get('p') not in ('folders', 'files'):
+            raise InvalidCursor('Cursor does not match this listing')
+        phase, last = data['p'], data.get('k')
+        if last is not None and (not isinstance(last, list) or len(last) != 2):
+            raise InvalidCursor('Malformed cursor')
+
+    folders = []
+    if phase == 'folders':
+        folders_query = Folder.query.filter(
+            Folder.team_id == team_id,
+            Folder.parent_id == folder_id
+        )
+        if search_query:
+            folders_query = folders_query.filter(Folder.name.contains(search_query))
+        if last is not None:
+            folders_query = folders_query.filter(
+                _after([Folder.name, Folder.id], last, 'asc')
+            )
+        folders = folders_query.options(*FOLDER_ROW_OPTIONS).order_by(
+            Folder.name.asc(), Folder.id.asc()
+        ).limit(limit + 1).all()
+        if len(folders) > limit:
+            folders = folders[:limit]
+            next_cursor = encode_cursor({
+                's': sort, 'o': order, 'p': 'folders', 'k': [folders[-1].name, folders[-1].id]
+            })
+            return Page(folders, [], next_cursor, sort, order)
+        # Folders are exhausted; fill the rest of this page with files
+        phase, last = 'files', None
+
+    if team_id:
+        files_query = File.query.filter(File.team_id == team_id)
+    else:
+        files_query = File.query.filter(File.team_id.is_(None), File.uploaded_by == user_id)
+    files_query = files_query.filter(
+        File.folder_id == folder_id,
+        File.is_deleted == False
+    )
+    if search_query:
+        files_query = files_query.filter(
+            or_(
+                File.original_filename.contains(search_query),
+                File.file_type.contains(search_query)
+            )
+        )
+
+    columns = [FILE_SORT_KEYS[sort], File.id]
+    if last is not None:
+        files_query = files_query.filter(_after(columns, [_load_value(sort, last[0]), last[1]], order))
+
+    remaining = limit - len(folders)
+    files = files_query.options(*FILE_ROW_OPTIONS).order_by(
+        *_ordering(columns, order)
+    ).limit(remaining + 1).all() if remaining else []
+
+    next_cursor = None
+    if len(files) > remaining or (remaining == 0 and files_query.first() is not None):
+        files = files[:remaining]
+        if files:
+            last_file = files[-1]
+            next_cursor = encode_cursor({
+                's': sort, 'o': order, 'p': 'files',
+                'k': [_dump_value(getattr(last_file, FILE_SORT_KEYS[sort].key)), last_file.id]
+            })
+        else:
+            next_cursor = encode_cursor({'s': sort, 'o': order, 'p': 'files', 'k': None})
+    return Page(folders, files, next_cursor, sort, order)
+
+
+def chat_history(team_id, cursor=None, limit=CHAT_PAGE_SIZE):
+    """Return a MessagePage: the latest messages of a team, or those before ``cursor``
+
+    Walks ix_messages_team_created backwards, so the first page and the
+    thousandth cost the same.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = Message.query.filter(
+        Message.team_id == team_id,
+        Message.is_deleted == False
+    )
+    columns = [Message.created_at, Message.id]
+    if cursor:
+        data = decode_cursor(cursor)
+        last = data.get('k')
+        if data.get('p') != 'messages' or not isinstance(last, list) or len(last) != 2:
+            raise InvalidCursor('Cursor does not match this listing')
+        query = query.filter(_after(columns, [_load_datetime(last[0]), last[1]], 'desc'))
+
+    messages = query.options(*CHAT_MESSAGE_OPTIONS).order_by(
+        *_ordering(columns, 'desc')
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        oldest = messages[-1]
+        next_cursor = encode_cursor({'p': 'messages', 'k': [_dump_value(oldest.created_at), oldest.id]})
+    return MessagePage(list(reversed(messages)), next_cursor)
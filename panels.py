@@ -0,0 +1,96 @@
+"""
+Team dashboard panels for File Drive
+Recent files, members, activity and messages of a team are built together
+and cached in-process under the team's change version (scope ``team`` in
+versions.py), which goes up with any file, message, activity, member or
+team write. A repeat dashboard load for an unchanged team is then served
+from memory: the version comes from versions.cached() and the panels from
+the entry stored under it, without a query.
+
+Each panel is kept both as data for the JSON endpoint and as rendered HTML
+for the page. Panels are the same for every member; per-user state such as
+unread markers is filled in by the browser (see read_markers.py). User
+renames and avatars are not part of the version and show up when the entry
+expires (DASHBOARD_CACHE_TTL).
+"""
+from flask import render_template
+
+import activity
+import messaging
+import queries
+import versions
+from app import app
+from cache import TTLCache
+
+PANELS = ('files', 'members', 'activities', 'messages')
+
+cache = TTLCache(
+    'dashboard_panels',
+    maxsize=app.config.get('DASHBOARD_CACHE_SIZE', 512),
+    ttl=app.config.get('DASHBOARD_CACHE_TTL', 300),
+)
+
+
+def file_json(file):
+    return {
+        'id': file.id,
+        'original_filename': file.original_filename,
+        'file_type': file.file_type,
+        'file_size': file.file_size,
+        'uploaded_by': file.uploaded_by,
+        'uploader_name': file.uploader.display_name if file.uploader else None,
+        'updated_at': file.updated_at.isoformat() if file.updated_at else None,
+    }
+
+
+def member_json(user, role):
+    return {
+        'user_id': user.id,
+        'display_name': user.display_name,
+        'profile_image_url': user.profile_image_url,
+        'role': role,
+    }
+
+
+def render(team_id, recent_files, team_members, team_activities, team_messages):
+    """HTML of each panel, by name"""
+    context = dict(
+        team_id=team_id,
+        recent_files=recent_files,
+        team_members=team_members,
+        team_activities=team_activities,
+        team_messages=team_messages,
+        activity_limit=queries.DASHBOARD_ACTIVITIES,
+    )
+    return {name: render_template(f'dashboard_{name}.html', **context) for name in PANELS}
+
+
+def _build(team_id, version):
+    recent_files = queries.recent_files(team_id=team_id)
+    team_members = queries.team_members(team_id)
+    team_activities = queries.recent_activities(team_id)
+    team_messages = queries.recent_messages(team_id)
+    return {
+        'team_id': team_id,
+        'version': version,
+        'data': {
+            'files': [file_json(file) for file in recent_files],
+            'members': [member_json(user, role) for user, role in team_members],
+            'activities': [activity.activity_json(row) for row in team_activities],
+            'messages': [messaging.message_json(message) for message in team_messages],
+        },
+        'html': render(team_id, recent_files, team_members, team_activities, team_messages),
+    }
+
+
+def team_panels(team_id):
+    """Every panel of a team's dashboard as of its current version
+
+    Needs a request context, for url_for in the panel templates.
+    """
+    version = versions.cached('team', team_id)
+    panels = cache.get((team_id, version))
+    if panels is None:
+        panels = _build(team_id, version)
+        cache.set((team_id, version), panels)
+    return panels
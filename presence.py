@@ -0,0 +1,189 @@
+"""
+Presence and typing indicators for File Drive
+Who has a team's chat open and who is typing there. Browsers send a
+heartbeat every half PRESENCE_TTL and a typing ping while keys are being
+pressed; entries that are not refreshed in time expire. State lives only
+in memory with a TTL and is never written to the database.
+
+The default store is a dict in this worker. With several workers set
+PRESENCE_STORE_URL (or EVENT_BROKER_URL) to a Redis server so they all
+see the same state.
+
+Changes go out as ``presence`` events on the team's ``chat`` channel (see
+events.py) carrying the user's whole state, so browsers can expire it
+themselves with the same TTLs. Events are coalesced per user: at most one
+per PRESENCE_MIN_INTERVAL, and the last state of a burst is sent when the
+interval ends.
+"""
+import threading
+import time
+
+import events
+from app import app
+
+KEY_PREFIX = 'filedrive:presence:'
+
+
+class LocalStore:
+    """Expiring sets of user ids per (kind, team) in this worker"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _live(self, kind, team_id):
+        # Caller holds the lock; drops expired entries on the way
+        users = self._entries.get((kind, team_id), {})
+        now = time.monotonic()
+        for user_id in [user_id for user_id, expires in users.items() if expires <= now]:
+            del users[user_id]
+        return users
+
+    def touch(self, kind, team_id, user_id, ttl):
+        """Mark ``user_id`` present for ``ttl`` seconds; True if they were not"""
+        with self._lock:
+            users = self._live(kind, team_id)
+            added = user_id not in users
+            users[user_id] = time.monotonic() + ttl
+            self._entries[(kind, team_id)] = users
+            return added
+
+    def remove(self, kind, team_id, user_id):
+        """True if ``user_id`` was present"""
+        with self._lock:
+            users = self._live(kind, team_id)
+            removed = users.pop(user_id, None) is not None
+            if not users:
+                self._entries.pop((kind, team_id), None)
+            return removed
+
+    def members(self, kind, team_id):
+        with self._lock:
+            users = self._live(kind, team_id)
+            if not users:
+                self._entries.pop((kind, team_id), None)
+            return sorted(users)
+
+
+class RedisStore:
+    """Shared store: one sorted set per (kind, team) scored by expiry time"""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed with a presence store URL
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, kind, team_id):
+        return f'{KEY_PREFIX}{kind}:{team_id}'
+
+    def touch(self, kind, team_id, user_id, ttl):
+        key, now = self._key(kind, team_id), time.time()
+        pipe = self._redis.pipeline()
+        pipe.zscore(key, user_id)
+        pipe.zadd(key, {user_id: now + ttl})
+        pipe.expire(key, int(ttl) + 1)
+        previous, _, _ = pipe.execute()
+        return previous is None or previous <= now
+
+    def remove(self, kind, team_id, user_id):
+        key, now = self._key(kind, team_id), time.time()
+        pipe = self._redis.pipeline()
+        pipe.zscore(key, user_id)
+        pipe.zrem(key, user_id)
+        previous, _ = pipe.execute()
+        return previous is not None and previous > now
+
+    def members(self, kind, team_id):
+        key, now = self._key(kind, team_id), time.time()
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zrange(key, 0, -1)
+        _, users = pipe.execute()
+        return sorted(user.decode() for user in users)
+
+
+def create_store(url=None):
+    if not url:
+        return LocalStore()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    raise ValueError(f'Unsupported PRESENCE_STORE_URL: {url}')
+
+
+class Coalescer:
+    """Sends at most one event per key per ``interval`` seconds
+
+    An event submitted too soon is held back; later ones replace it, and
+    the last is sent once the interval has passed.
+    """
+
+    def __init__(self, send, interval):
+        self.send = send
+        self.interval = interval
+        self._sent_at = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, *args):
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = args
+                return
+            now = time.monotonic()
+            wait = self._sent_at.get(key, float('-inf')) + self.interval - now
+            if wait > 0:
+                self._pending[key] = args
+                timer = threading.Timer(wait, self._send_pending, (key,))
+                timer.daemon = True
+                timer.start()
+                return
+            self._forget_before(now - self.interval)
+            self._sent_at[key] = now
+        self.send(*args)
+
+    def _send_pending(self, key):
+        with self._lock:
+            args = self._pending.pop(key)
+            self._sent_at[key] = time.monotonic()
+        self.send(*args)
+
+    def _forget_before(self, cutoff):
+        # Keys of users who went quiet; keeps the map from growing for good
+        if len(self._sent_at) > 1024:
+            for key in [key for key, sent_at in self._sent_at.items() if sent_at <= cutoff]:
+                del self._sent_at[key]
+
+
+store = create_store(app.config.get('PRESENCE_STORE_URL') or app.config.get('EVENT_BROKER_URL'))
+coalescer = Coalescer(
+    lambda channel, data: events.publish(channel, 'presence', data),
+    app.config.get('PRESENCE_MIN_INTERVAL', 1.0),
+)
+
+
+def snapshot(team_id):
+    """User ids online in and typing to a team's chat"""
+    return {'online': store.members('online', team_id), 'typing': store.members('typing', team_id)}
+
+
+def update(team_id, user_id, online=True, typing=None):
+    """Record a heartbeat or typing change and tell the team
+
+    ``typing`` None leaves it as it was; going offline also stops typing.
+    """
+    if not online:
+        store.remove('online', team_id, user_id)
+        store.remove('typing', team_id, user_id)
+        typing = False
+    else:
+        store.touch('online', team_id, user_id, app.config.get('PRESENCE_TTL', 45))
+        if typing:
+            store.touch('typing', team_id, user_id, app.config.get('TYPING_TTL', 6))
+        elif typing is None:
+            typing = user_id in store.members('typing', team_id)
+        else:
+            store.remove('typing', team_id, user_id)
+    coalescer.submit(
+        (team_id, user_id),
+        events.team_channel(team_id, 'chat'),
+        {'user_id': user_id, 'online': online, 'typing': typing},
+    )
@@ -0,0 +1,111 @@
+"""
+View queries for File Drive
+Each function returns exactly what one template renders, with the
+relationships that template walks loaded up front, so a page costs a fixed
+number of SELECTs however many rows it shows. Many-to-one relationships
+(file.uploader, message.sender) are joined in; collections use selectinload.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased, joinedload, selectinload
+
+from app import db
+from models import User, Team, TeamMember, File, Folder, Message, Activity, ActivityDaily
+
+# Loading strategy per rendered row type
+FILE_ROW_OPTIONS = (joinedload(File.uploader),)
+FOLDER_ROW_OPTIONS = (joinedload(Folder.creator),)
+MESSAGE_OPTIONS = (joinedload(Message.sender),)
+# Chat rows also quote the message they reply to
+CHAT_MESSAGE_OPTIONS = MESSAGE_OPTIONS + (selectinload(Message.reply_to).joinedload(Message.sender),)
+ACTIVITY_OPTIONS = (joinedload(Activity.user),)
+
+DASHBOARD_FILES = 10
+DASHBOARD_MESSAGES = 20
+DASHBOARD_ACTIVITIES = 10
+# Missed activities replayed to a resuming stream before it is told to reload
+ACTIVITY_BACKLOG = 100
+# How far back a resuming stream looks below its cursor for rows that committed late
+ACTIVITY_LATE_COMMIT = timedelta(seconds=60)
+
+
+def team_members(team_id):
+    """(User, role) pairs for a team's member list"""
+    return db.session.query(User, TeamMember.role).join(
+        TeamMember, User.id == TeamMember.user_id
+    ).filter(TeamMember.team_id == team_id).all()
+
+
+def recent_files(team_id=None, user_id=None, limit=DASHBOARD_FILES):
+    """Latest live files of a team, or of a user's personal space"""
+    if team_id:
+        query = File.query.filter(File.team_id == team_id)
+    else:
+        query = File.query.filter(File.uploaded_by == user_id, File.team_id.is_(None))
+    return query.filter(File.is_deleted == False).options(
+        *FILE_ROW_OPTIONS
+    ).order_by(File.updated_at.desc()).limit(limit).all()
+
+
+def recent_messages(team_id, limit=DASHBOARD_MESSAGES):
+    return Message.query.filter(
+        Message.team_id == team_id
+    ).options(*MESSAGE_OPTIONS).order_by(Message.created_at.desc()).limit(limit).all()
+
+
+def recent_activities(team_id, limit=DASHBOARD_ACTIVITIES):
+    return Activity.query.filter(
+        Activity.team_id == team_id
+    ).options(*ACTIVITY_OPTIONS).order_by(Activity.created_at.desc()).limit(limit).all()
+
+
+def activities_after(team_id, after_id, limit=ACTIVITY_BACKLOG):
+    """A team's activities with ids above ``after_id``, oldest first"""
+    return Activity.query.filter(
+        Activity.team_id == team_id,
+        Activity.id > after_id
+    ).order_by(Activity.id).limit(limit).all()
+
+
+def activities_committed_late(team_id, through_id, limit=ACTIVITY_BACKLOG):
+    """Recent activities with ids up to ``through_id``, oldest first
+
+    Ids are assigned at insert but visible at commit, so a row with a lower
+    id can appear after a client has seen higher ones. Rows created within
+    ACTIVITY_LATE_COMMIT are sent again; the client skips those it has.
+    """
+    return Activity.query.filter(
+        Activity.team_id == team_id,
+        Activity.id <= through_id,
+        Activity.created_at >= datetime.now() - ACTIVITY_LATE_COMMIT
+    ).order_by(Activity.id).limit(limit).all()
+
+
+def latest_activity_id(team_id):
+    return db.session.query(func.max(Activity.id)).filter(Activity.team_id == team_id).scalar() or 0
+
+
+def activity_daily(team_id, since):
+    """Rolled-up (day, action, count) rows of a team from ``since`` on"""
+    return db.session.query(ActivityDaily.day, ActivityDaily.action, ActivityDaily.count).filter(
+        ActivityDaily.team_id == team_id,
+        ActivityDaily.day >= since
+    ).order_by(ActivityDaily.day, ActivityDaily.action).all()
+
+
+def settings_team(team_id):
+    """Team for the settings page, with memberships for the joined-at column"""
+    return Team.query.options(selectinload(Team.members)).filter(Team.id == team_id).first()
+
+
+def folder_children(team_id, parent_id=None):
+    """(folder, child_count) for one level of a team's folder tree, by name"""
+    child = aliased(Folder)
+    child_count = select(func.count(child.id)).where(
+        child.team_id == team_id, child.parent_id == Folder.id
+    ).correlate(Folder).scalar_subquery()
+    return db.session.query(Folder, child_count).filter(
+        Folder.team_id == team_id,
+        Folder.parent_id == parent_id
+    ).order_by(Folder.name, Folder.id).all()
@@ -0,0 +1,172 @@
+"""
+Read markers and unread counters for File Drive
+Every member has one read_markers row per team: the newest message and
+activity they have read, and how many newer ones there are. The counters
+are maintained as things happen rather than counted per page view:
+
+- a new message or activity adds one for every other member of its team
+  (one UPDATE per team and author in a flush),
+- deleting a message takes it back off for those who had not read it,
+- advancing a marker recounts only what is still after it,
+- joining a team starts the marker at the latest message and activity.
+
+Unread badges for all of a user's teams are then one primary-key range
+read (for_user()). Activities written with a Core insert (activity.py)
+report themselves through activities_added().
+"""
+from collections import Counter, namedtuple
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Activity, Message, ReadMarker, TeamMember
+
+Marker = namedtuple('Marker', [
+    'team_id', 'last_read_message_id', 'last_read_activity_id', 'unread_messages', 'unread_activities'
+])
+
+markers = ReadMarker.__table__
+
+
+def for_user(user_id):
+    """Markers of every team ``user_id`` belongs to, by team id, in one query"""
+    rows = db.session.execute(
+        select(
+            markers.c.team_id, markers.c.last_read_message_id, markers.c.last_read_activity_id,
+            markers.c.unread_messages, markers.c.unread_activities
+        ).where(markers.c.user_id == user_id)
+    )
+    return {row.team_id: Marker(*row) for row in rows}
+
+
+def unread_json(marker):
+    return {
+        'messages': marker.unread_messages if marker else 0,
+        'activities': marker.unread_activities if marker else 0,
+        'last_read_message_id': marker.last_read_message_id if marker else 0,
+        'last_read_activity_id': marker.last_read_activity_id if marker else 0,
+    }
+
+
+def _unread_messages_after(user_id, team_id, message_id):
+    return select(func.count()).select_from(Message).where(
+        Message.team_id == team_id,
+        Message.id > message_id,
+        Message.sender_id != user_id,
+        Message.is_deleted == False
+    ).scalar_subquery()
+
+
+def _unread_activities_after(user_id, team_id, activity_id):
+    return select(func.count()).select_from(Activity).where(
+        Activity.team_id == team_id,
+        Activity.id > activity_id,
+        Activity.user_id != user_id
+    ).scalar_subquery()
+
+
+def mark_read(user_id, team_id, message_id=None, activity_id=None):
+    """Advance the user's marker to ``message_id`` and/or ``activity_id``
+
+    Markers never move back. Returns the new Marker; the caller commits.
+    """
+    if db.session.get(ReadMarker, (user_id, team_id)) is None:
+        db.session.add(ReadMarker(user_id=user_id, team_id=team_id))
+        db.session.flush()
+    mine = (markers.c.user_id == user_id, markers.c.team_id == team_id)
+    now = datetime.now()
+    if message_id:
+        db.session.execute(
+            update(markers).where(*mine, markers.c.last_read_message_id < message_id).values(
+                last_read_message_id=message_id,
+                unread_messages=_unread_messages_after(user_id, team_id, message_id),
+                updated_at=now
+            )
+        )
+    if activity_id:
+        db.session.execute(
+            update(markers).where(*mine, markers.c.last_read_activity_id < activity_id).values(
+                last_read_activity_id=activity_id,
+                unread_activities=_unread_activities_after(user_id, team_id, activity_id),
+                updated_at=now
+            )
+        )
+    return for_user(user_id).get(team_id)
+
+
+def _add_unread(conn, column, counts):
+    """Add ``counts[(team_id, author_id)]`` to everyone in the team but the author"""
+    for (team_id, author_id), count in counts.items():
+        conn.execute(
+            update(markers)
+            .where(markers.c.team_id == team_id, markers.c.user_id != author_id)
+            .values({column: markers.c[column] + count})
+        )
+
+
+def activities_added(conn, rows):
+    """Count activity rows inserted without the ORM as unread"""
+    _add_unread(conn, 'unread_activities', Counter((row['team_id'], row['user_id']) for row in rows))
+
+
+def _was_deleted(message):
+    history = sa_inspect(message).attrs.is_deleted.history
+    return message.is_deleted and history.added and not any(history.deleted)
+
+
+def _latest(model, team_id):
+    return select(func.coalesce(func.max(model.id), 0)).where(model.team_id == team_id).scalar_subquery()
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_unread(session, flush_context):
+    new_messages, new_activities = Counter(), Counter()
+    removed_messages, joined, left = [], [], []
+    for obj in session.new:
+        if isinstance(obj, Message) and not obj.is_deleted:
+            new_messages[(obj.team_id, obj.sender_id)] += 1
+        elif isinstance(obj, Activity):
+            new_activities[(obj.team_id, obj.user_id)] += 1
+        elif isinstance(obj, TeamMember):
+            joined.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Message) and _was_deleted(obj):
+            removed_messages.append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Message) and not obj.is_deleted:
+            removed_messages.append(obj)
+        elif isinstance(obj, TeamMember):
+            left.append(obj)
+    if not (new_messages or new_activities or removed_messages or joined or left):
+        return
+
+    conn = session.connection()
+    _add_unread(conn, 'unread_messages', new_messages)
+    _add_unread(conn, 'unread_activities', new_activities)
+    for message in removed_messages:
+        conn.execute(
+            update(markers).where(
+                markers.c.team_id == message.team_id,
+                markers.c.user_id != message.sender_id,
+                markers.c.last_read_message_id < message.id,
+                markers.c.unread_messages > 0
+            ).values(unread_messages=markers.c.unread_messages - 1)
+        )
+    # After the counts above, so a new member doesn't count this flush's rows
+    for member in joined:
+        conn.execute(insert(markers).values(
+            user_id=member.user_id,
+            team_id=member.team_id,
+            last_read_message_id=_latest(Message, member.team_id),
+            last_read_activity_id=_latest(Activity, member.team_id),
+            unread_messages=0,
+            unread_activities=0,
+            updated_at=datetime.now()
+        ))
+    for member in left:
+        conn.execute(markers.delete().where(
+            markers.c.user_id == member.user_id, markers.c.team_id == member.team_id
+        ))
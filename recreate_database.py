@@ -4,6 +4,7 @@ Script to recreate the database with correct schema
 """
 
 from app import app, db
+import migrations
 import os
 
 def recreate_database():
@@ -15,7 +16,7 @@ def recreate_database():
         
         # Create all tables with updated schema
         print("Creating tables with updated schema...")
-        db.create_all()
+        migrations.upgrade()
         
         print("Database recreated successfully!")
         print("The team_id field in the files table is now nullable for single users.")
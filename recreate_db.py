@@ -2,6 +2,7 @@
 
 import os
 from app import app, db
+import migrations
 
 def recreate_database():
     """Recreate the database with the correct schema"""
@@ -11,8 +12,8 @@ def recreate_database():
             db.drop_all()
             print("✓ Dropped all existing tables")
             
-            # Create all tables with current schema
-            db.create_all()
+            # Create all tables and indexes with current schema
+            migrations.upgrade()
             print("✓ Created all tables with current schema")
             
             print("\n✓ Database recreated successfully!")
@@ -0,0 +1,183 @@
+"""
+Read-replica routing for File Drive
+Replicas are extra SQLALCHEMY_BINDS whose key starts with ``replica``
+(set from DATABASE_REPLICA_URLS in config.py). db.session is a RoutingSession:
+inside GET/HEAD requests its reads go to a healthy replica, and everything
+else goes to the primary. The replica is chosen round-robin once per
+session (that is, per request) and used for all of its reads: replicas lag
+by different amounts, and a page's ETag must come from the same point in
+time as the page (see http_cache.py). The primary takes:
+
+- flushes, INSERT/UPDATE/DELETE and SELECT ... FOR UPDATE;
+- any statement after the request has written;
+- every request from a user for REPLICA_READ_YOUR_WRITES seconds after
+  they committed a write, so they see their own changes despite lag.
+
+A replica is probed with SELECT 1 at most every REPLICA_HEALTH_INTERVAL
+seconds; one that has not answered within REPLICA_PROBE_TIMEOUT seconds
+counts as failed. One that fails a probe or a query is skipped for
+REPLICA_RETRY_AFTER seconds and then probed again; a read that fails on a
+replica before the request has written is retried once on the primary,
+and the rest of the request stays there.
+
+This module must not import app: app.py imports it to build db.
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+# Flask session key holding the end of the user's read-your-writes window
+_RYW_KEY = '_primary_until'
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self.checked_at = 0.0
+
+
+class ReplicaRouter:
+    """Picks a healthy replica for a read; None means use the primary"""
+
+    def __init__(self):
+        self._replicas = None
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def reset(self, replicas=None):
+        """Replace the replica list; None rebuilds it from the app's binds on next use"""
+        with self._lock:
+            self._replicas = replicas
+
+    def replicas(self, db):
+        if self._replicas is None:
+            with self._lock:
+                if self._replicas is None:
+                    self._replicas = [
+                        Replica(key, engine) for key, engine in sorted(db.engines.items(), key=lambda item: str(item[0]))
+                        if key and key.startswith(REPLICA_BIND_PREFIX)
+                    ]
+        return self._replicas
+
+    def choose(self, db):
+        healthy = [replica for replica in self.replicas(db) if self._healthy(replica)]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def _healthy(self, replica):
+        now = time.monotonic()
+        if replica.down_until > now:
+            return False
+        if now - replica.checked_at >= current_app.config.get('REPLICA_HEALTH_INTERVAL', 10):
+            replica.checked_at = now
+            try:
+                _probe(replica, current_app.config.get('REPLICA_PROBE_TIMEOUT', 2))
+            except Exception as e:
+                self.mark_down(replica, e)
+                return False
+        return True
+
+    def mark_down(self, replica, error=None):
+        replica.down_until = time.monotonic() + current_app.config.get('REPLICA_RETRY_AFTER', 30)
+        # Probe again as soon as the retry window ends
+        replica.checked_at = 0.0
+        logging.warning(f"Read replica {replica.name} unavailable, using primary: {error}")
+
+
+router = ReplicaRouter()
+
+
+def _probe(replica, timeout):
+    """SELECT 1 on the replica; raises if it fails or takes over ``timeout`` seconds
+
+    Runs in its own thread so a hung replica cannot hold up the request;
+    that thread is left to finish or fail on its own.
+    """
+    outcome = {}
+
+    def run():
+        try:
+            with replica.engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            outcome['ok'] = True
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, name=f'probe-{replica.name}', daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if 'ok' not in outcome:
+        raise outcome.get('error') or TimeoutError(f'no answer within {timeout}s')
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends safe reads to read replicas"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._can_use_replica(clause):
+            if 'replica' not in self.info:
+                self.info['replica'] = router.choose(self._db)
+            replica = self.info['replica']
+            self.info['reading_replica'] = replica is not None
+            if replica is not None:
+                return replica.engine
+        else:
+            self.info['reading_replica'] = False
+            if clause is not None and _is_write(clause):
+                self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _can_use_replica(self, clause):
+        if not router.replicas(self._db):
+            return False
+        if self._flushing or self.info.get('wrote') or self.info.get('primary_only'):
+            return False
+        if clause is not None and _is_write(clause):
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        return flask_session.get(_RYW_KEY, 0) < time.time()
+
+    def execute(self, statement, *args, **kwargs):
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except DBAPIError as e:
+            if not self.info.get('reading_replica') or self.info.get('wrote') or self.new or self.dirty or self.deleted:
+                raise
+            router.mark_down(self.info['replica'], e)
+            self.rollback()
+            self.info['primary_only'] = True
+            self.info['replica'] = None
+            return super().execute(statement, *args, **kwargs)
+
+    def flush(self, objects=None):
+        if self.new or self.dirty or self.deleted:
+            self.info['wrote'] = True
+        super().flush(objects)
+
+    def commit(self):
+        super().commit()
+        if self.info.get('wrote') and has_request_context() and router.replicas(self._db):
+            window = current_app.config.get('REPLICA_READ_YOUR_WRITES', 5)
+            flask_session[_RYW_KEY] = time.time() + window
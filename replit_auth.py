@@ -18,12 +18,12 @@ from werkzeug.local import LocalProxy
 
 from app import app, db
 from models import OAuth, User
+import users
 
 login_manager = LoginManager(app)
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(user_id)
+# Snapshots come from a process-local cache; see users.py
+login_manager.user_loader(users.load_user)
 
 class UserSessionStorage(BaseStorage):
 
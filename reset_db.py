@@ -8,6 +8,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from app import app, db
+    import migrations
     
     with app.app_context():
         # Remove existing database file
@@ -17,7 +18,7 @@ try:
             print(f"✓ Removed existing database: {db_path}")
         
         # Create new database with current schema
-        db.create_all()
+        migrations.upgrade()
         print("✓ Created new database with current schema")
         
         print("\n✓ Database reset successful!")
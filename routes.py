@@ -1,15 +1,28 @@
 import os
 import secrets
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 from werkzeug.utils import secure_filename
 from flask import session, render_template, request, redirect, url_for, flash, send_file, jsonify, abort
 from flask_login import login_user, logout_user
 from flask_login import current_user
-from sqlalchemy import or_
 from s3_storage import upload_to_s3, delete_from_s3, get_download_url, s3_storage
 
+import activity
+import assets  # noqa: F401  (hashed static URLs)
+import cache
+import events
+import http_cache
+import memberships
+import messaging
+import pagination
+import panels
+import presence
+import queries
+import read_markers
+import search
+import thumbnails
 from app import app, db
 from auth import require_login
 from models import User, Team, TeamMember, File, Folder, Message, Activity, FileVersion, UploadPermission
@@ -19,21 +32,9 @@ from models import User, Team, TeamMember, File, Folder, Message, Activity, File
 # Make session permanent
 @app.before_request
 def make_session_permanent():
-    session.permanent = True
-
-def log_activity(team_id, action, target_type=None, target_id=None, description=None):
-    """Helper function to log team activities"""
-    if current_user.is_authenticated:
-        activity = Activity(
-            team_id=team_id,
-            user_id=current_user.id,
-            action=action,
-            target_type=target_type,
-            target_id=target_id,
-            description=description
-        )
-        db.session.add(activity)
-        db.session.commit()
+    # Static files are public and cached; they must not carry a session cookie
+    if request.endpoint != 'static':
+        session.permanent = True
 
 def allowed_file(filename):
     """Check if uploaded file is allowed"""
@@ -57,6 +58,34 @@ def can_upload_file(team_id, user_id):
     # Allow everyone to upload files - no restrictions
     return True
 
+# ETag validators (see http_cache.py): the change counters each view is built from
+def current_team_scopes(*scopes):
+    """Validator for views of the session's current team; personal files have no counter"""
+    def validator(*args, **kwargs):
+        team_id = session.get('current_team_id')
+        if getattr(current_user, 'mode_preference', 'team') == 'single' or not team_id:
+            return None
+        if not memberships.get(team_id, current_user.id):
+            return None
+        # The dashboard's team switcher lists every team of the user
+        return [(scope, team_id) for scope in scopes], memberships.teams(current_user.id)
+    return validator
+
+def team_scope(team_id, **kwargs):
+    # Non-members get the view's refusal, never a 304
+    if not memberships.get(team_id, current_user.id):
+        return None
+    return [('team', team_id)], ()
+
+def file_scope(file_id, **kwargs):
+    scopes = [('file', file_id)]
+    # The page shows the name of the file's folder
+    team_id = db.session.query(File.team_id).filter_by(id=file_id).scalar()
+    if team_id:
+        scopes.append(('folders', team_id))
+    # Roles in the file's team decide which actions the page offers
+    return scopes, memberships.teams(current_user.id)
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -106,10 +135,8 @@ def demo_dashboard():
     return render_template('dashboard.html',
                          user_teams=[demo_team],
                          current_team=demo_team,
-                         recent_files=demo_files,
-                         team_messages=demo_messages,
-                         team_activities=demo_activities,
-                         team_members=demo_team_members)
+                         panel_html=panels.render(demo_team['id'], demo_files, demo_team_members,
+                                                  demo_activities, demo_messages))
 
 # Authentication Routes
 @app.route('/signup', methods=['GET', 'POST'])
@@ -234,7 +261,7 @@ def switch_mode(mode):
         flash('Invalid mode selected', 'error')
         return redirect(url_for('dashboard'))
     
-    current_user.mode_preference = mode
+    current_user.load().mode_preference = mode
     db.session.commit()
     
     flash(f'Switched to {mode} mode', 'success')
@@ -248,10 +275,7 @@ def edit_file(file_id):
     file = File.query.get_or_404(file_id)
     
     # Check team membership
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == file.team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(file.team_id, current_user.id)
     
     if not membership:
         flash('You do not have access to this file.', 'error')
@@ -292,10 +316,7 @@ def save_file_edit(file_id):
     file = File.query.get_or_404(file_id)
     
     # Check permissions
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == file.team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(file.team_id, current_user.id)
     
     if not membership or (membership and membership.role == 'viewer'):
         return jsonify({'success': False, 'error': 'Permission denied'})
@@ -310,28 +331,18 @@ def save_file_edit(file_id):
             
             # Update file metadata
             file.updated_at = datetime.now()
-            file.version += 1
             
             # Create file version record
             version = FileVersion(
                 file_id=file.id,
-                version_number=file.version,
+                version_number=file.next_version(),
                 content=content,
                 created_by=current_user.id
             )
             db.session.add(version)
+            activity.record(file.team_id, 'edit_file', file, f"Updated {file.original_filename}")
             db.session.commit()
             
-            # Log activity
-            log_activity(
-                file.team_id, 
-                current_user.id, 
-                'file_edit', 
-                'file', 
-                file.id, 
-                f"Updated {file.original_filename}"
-            )
-            
             return jsonify({'success': True})
         else:
             return jsonify({'success': False, 'error': 'S3 files cannot be edited yet'})
@@ -341,30 +352,24 @@ def save_file_edit(file_id):
 
 @app.route('/dashboard')
 @require_login
+@http_cache.conditional(current_team_scopes('team'))
 def dashboard():
     # Check user's mode preference
     user_mode = getattr(current_user, 'mode_preference', 'team')
     
     if user_mode == 'single':
         # Single mode - show only user's personal files
-        recent_files = File.query.filter(
-            File.uploaded_by == current_user.id,
-            File.is_deleted == False,
-            File.team_id.is_(None)  # Personal files have no team
-        ).order_by(File.updated_at.desc()).limit(10).all()
+        recent_files = queries.recent_files(user_id=current_user.id)
         
         # In single mode, we don't show team data
         user_teams = []
         current_team = None
-        team_messages = []
-        team_activities = []
-        team_members = []
+        panel_html = {}
         
     else:
         # Team mode - show team data
-        user_teams = db.session.query(Team).join(TeamMember).filter(
-            TeamMember.user_id == current_user.id
-        ).all()
+        recent_files = []
+        user_teams = memberships.teams(current_user.id)
         
         # Get current team from session or first team
         current_team_id = session.get('current_team_id')
@@ -377,51 +382,36 @@ def dashboard():
             current_team = user_teams[0]
             session['current_team_id'] = current_team.id
         
-        # Get team data if user has a team
-        recent_files = []
-        team_messages = []
-        team_activities = []
-        team_members = []
-        
-        if current_team:
-            # Get recent files
-            recent_files = File.query.filter(
-                File.team_id == current_team.id,
-                File.is_deleted == False
-            ).order_by(File.updated_at.desc()).limit(10).all()
-            
-            # Get recent messages
-            team_messages = Message.query.filter(
-                Message.team_id == current_team.id
-            ).order_by(Message.created_at.desc()).limit(20).all()
-            
-            # Get recent activities
-            team_activities = Activity.query.filter(
-                Activity.team_id == current_team.id
-            ).order_by(Activity.created_at.desc()).limit(10).all()
-            
-            # Get team members
-            team_members = db.session.query(User, TeamMember.role).join(
-                TeamMember, User.id == TeamMember.user_id
-            ).filter(TeamMember.team_id == current_team.id).all()
+        # Panels come from cache while the team is unchanged
+        panel_html = panels.team_panels(current_team.id)['html'] if current_team else {}
     
     return render_template('dashboard.html',
                          user_teams=user_teams,
                          current_team=current_team,
                          recent_files=recent_files,
-                         team_messages=team_messages,
-                         team_activities=team_activities,
-                         team_members=team_members,
+                         panel_html=panel_html,
                          user_mode=user_mode)
 
+@app.route('/api/teams/<int:team_id>/dashboard')
+@require_login
+@http_cache.conditional(team_scope)
+def dashboard_panels(team_id):
+    """Every dashboard panel of a team, as data and as rendered HTML"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    team_panels = panels.team_panels(team_id)
+    return jsonify({
+        'success': True,
+        'version': team_panels['version'],
+        'panels': team_panels['data'],
+        'html': team_panels['html'],
+    })
+
 @app.route('/switch_team/<int:team_id>')
 @require_login
 def switch_team(team_id):
     # Check if user is member of this team
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(team_id, current_user.id)
     
     if membership:
         session['current_team_id'] = team_id
@@ -470,12 +460,10 @@ def create_team():
             created_by=current_user.id
         )
         db.session.add(default_folder)
+        activity.record(team.id, 'create_team', team, f'Created team "{name}"')
         
         db.session.commit()
         
-        # Log activity
-        log_activity(team.id, 'create_team', 'team', team.id, f'Created team "{name}"')
-        
         session['current_team_id'] = team.id
         flash('Team created successfully!', 'success')
         return redirect(url_for('dashboard'))
@@ -499,10 +487,7 @@ def join_team():
             return render_template('team_join.html')
         
         # Check if already a member
-        existing_membership = TeamMember.query.filter(
-            TeamMember.team_id == team.id,
-            TeamMember.user_id == current_user.id
-        ).first()
+        existing_membership = memberships.get(team.id, current_user.id)
         
         if existing_membership:
             flash('You are already a member of this team.', 'warning')
@@ -516,11 +501,9 @@ def join_team():
             role='editor'
         )
         db.session.add(membership)
+        activity.record(team.id, 'join_team', team, f'{current_user.display_name} joined the team')
         db.session.commit()
         
-        # Log activity
-        log_activity(team.id, 'join_team', 'team', team.id, f'{current_user.display_name} joined the team')
-        
         session['current_team_id'] = team.id
         flash(f'Successfully joined team "{team.name}"!', 'success')
         return redirect(url_for('dashboard'))
@@ -529,6 +512,7 @@ def join_team():
 
 @app.route('/files')
 @require_login
+@http_cache.conditional(current_team_scopes('team', 'folders'))
 def files():
     user_mode = getattr(current_user, 'mode_preference', 'team')
     
@@ -544,10 +528,7 @@ def files():
             return redirect(url_for('dashboard'))
         
         # No membership restrictions - everyone can access all teams
-        membership = TeamMember.query.filter(
-            TeamMember.team_id == current_team_id,
-            TeamMember.user_id == current_user.id
-        ).first()
+        membership = memberships.get(current_team_id, current_user.id)
     
     folder_id = request.args.get('folder', type=int)
     search_query = request.args.get('search', '').strip()
@@ -568,58 +549,133 @@ def files():
                 flash('Folder not found.', 'error')
                 return redirect(url_for('files'))
     
-    # Get folders in current directory
-    if user_mode == 'single':
-        folders = []  # No folders in single mode
-    else:
-        folders = Folder.query.filter(
-            Folder.team_id == current_team_id,
-            Folder.parent_id == folder_id
-        ).order_by(Folder.name).all()
-    
-    # Get files in current directory
-    if user_mode == 'single':
-        files_query = File.query.filter(
-            File.team_id.is_(None),  # Personal files
-            File.uploaded_by == current_user.id,
-            File.folder_id == folder_id,
-            File.is_deleted == False
-        )
-    else:
-        files_query = File.query.filter(
-            File.team_id == current_team_id,
-            File.folder_id == folder_id,
-            File.is_deleted == False
-        )
-    
-    # Apply search filter
-    if search_query:
-        files_query = files_query.filter(
-            or_(
-                File.original_filename.contains(search_query),
-                File.file_type.contains(search_query)
-            )
+    # First page of the listing; later pages come from /api/files
+    try:
+        page = pagination.list_directory(
+            current_team_id, current_user.id, folder_id,
+            sort=request.args.get('sort'), order=request.args.get('order'),
+            search_query=search_query
         )
+    except pagination.InvalidCursor:
+        abort(400)
     
-    files = files_query.order_by(File.updated_at.desc()).all()
-    
-    # Get breadcrumb path
-    breadcrumbs = []
-    if current_folder:
-        folder = current_folder
-        while folder:
-            breadcrumbs.insert(0, folder)
-            folder = folder.parent
+    # Breadcrumbs come from the folder's materialized path in one query
+    breadcrumbs = current_folder.breadcrumbs() if current_folder else []
     
     return render_template('file_view.html',
-                         folders=folders,
-                         files=files,
+                         folders=page.folders,
+                         files=page.files,
+                         next_cursor=page.next_cursor,
+                         sort=page.sort,
+                         order=page.order,
                          current_folder=current_folder,
                          breadcrumbs=breadcrumbs,
                          search_query=search_query,
                          membership=membership,
                          user_mode=user_mode)
 
+@app.route('/api/files')
+@require_login
+@http_cache.conditional(current_team_scopes('team', 'folders'))
+def list_files_api():
+    """One keyset page of a folder listing, as JSON plus rendered table rows"""
+    user_mode = getattr(current_user, 'mode_preference', 'team')
+    current_team_id = None if user_mode == 'single' else session.get('current_team_id')
+    if user_mode != 'single' and not current_team_id:
+        return jsonify({'success': False, 'error': 'No team selected'}), 400
+
+    folder_id = request.args.get('folder', type=int)
+    if folder_id and not current_team_id:
+        return jsonify({'success': False, 'error': 'Folders are not supported in single mode'}), 400
+
+    try:
+        page = pagination.list_directory(
+            current_team_id, current_user.id, folder_id,
+            sort=request.args.get('sort'), order=request.args.get('order'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', pagination.PAGE_SIZE, type=int),
+            search_query=request.args.get('search', '').strip() or None
+        )
+    except pagination.InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'sort': page.sort,
+        'order': page.order,
+        'next_cursor': page.next_cursor,
+        'folders': [{
+            'id': folder.id,
+            'name': folder.name,
+            'created_at': folder.created_at.isoformat() if folder.created_at else None
+        } for folder in page.folders],
+        'files': [{
+            'id': file.id,
+            'name': file.original_filename,
+            'file_type': file.file_type,
+            'file_size': file.file_size,
+            'updated_at': file.updated_at.isoformat() if file.updated_at else None,
+            'url': url_for('view_file', file_id=file.id)
+        } for file in page.files],
+        'html': render_template('file_rows.html', folders=page.folders, files=page.files)
+    })
+
+@app.route('/api/folders/tree')
+@require_login
+@http_cache.conditional(current_team_scopes('folders'))
+def folder_tree():
+    """One level of the current team's folder tree, with child counts"""
+    current_team_id = session.get('current_team_id')
+    if not current_team_id:
+        return jsonify({'success': False, 'error': 'No team selected'}), 400
+    
+    parent_id = request.args.get('parent', type=int)
+    
+    if parent_id and not Folder.query.filter_by(id=parent_id, team_id=current_team_id).first():
+        return jsonify({'success': False, 'error': 'Folder not found'}), 404
+    children = queries.folder_children(current_team_id, parent_id)
+    return jsonify({
+        'success': True,
+        'parent_id': parent_id,
+        'folders': [{
+            'id': folder.id,
+            'name': folder.name,
+            'child_count': child_count,
+            'url': url_for('files', folder=folder.id),
+        } for folder, child_count in children]
+    })
+
+@app.route('/api/files/autocomplete')
+@require_login
+def autocomplete_files():
+    """Search-as-you-type filename suggestions for the current team or personal space"""
+    user_mode = getattr(current_user, 'mode_preference', 'team')
+    current_team_id = None if user_mode == 'single' else session.get('current_team_id')
+    if user_mode != 'single' and not current_team_id:
+        return jsonify({'success': False, 'error': 'No team selected'}), 400
+
+    query = request.args.get('q', '').strip()
+    folder_id = request.args.get('folder', type=int)
+    limit = request.args.get('limit', search.AUTOCOMPLETE_LIMIT, type=int)
+
+    matches = search.autocomplete_files(query, current_team_id, current_user.id,
+                                        folder_id=folder_id, limit=limit)
+    response = jsonify({
+        'query': query,
+        'results': [{
+            'id': file.id,
+            'name': file.original_filename,
+            'file_type': file.file_type,
+            'folder_id': file.folder_id,
+            'score': round(score, 3),
+            'url': url_for('view_file', file_id=file.id)
+        } for file, score in matches]
+    })
+    # Keystrokes repeat prefixes; let the browser reuse answers briefly
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    response.vary.add('Cookie')
+    return response
+
 @app.route('/upload', methods=['GET', 'POST'])
 @require_login
 def upload_file():
@@ -639,10 +695,7 @@ def upload_file():
             return redirect(url_for('dashboard'))
         
         # No membership restrictions - everyone can upload to any team
-        membership = TeamMember.query.filter(
-            TeamMember.team_id == current_team_id,
-            TeamMember.user_id == current_user.id
-        ).first()
+        membership = memberships.get(current_team_id, current_user.id)
         
         team = Team.query.get(current_team_id)
     
@@ -757,12 +810,12 @@ def upload_file():
                     except Exception as e:
                         print(f"Error reading text file: {e}")
                 
-                db.session.commit()
-                
                 # Log activity (only in team mode)
                 if user_mode == 'team' and current_team_id:
-                    log_activity(current_team_id, 'upload_file', 'file', new_file.id, 
-                               f'Uploaded "{original_filename}"')
+                    activity.record(current_team_id, 'upload_file', new_file,
+                                    f'Uploaded "{original_filename}"')
+                
+                db.session.commit()
                 
                 flash('File uploaded successfully!', 'success')
                 return redirect(url_for('files', folder=folder_id))
@@ -775,19 +828,22 @@ def upload_file():
             flash('File type not allowed. Please upload txt, md, docx, jpg, jpeg, png, gif, pdf, or svg files.', 'error')
             return redirect(request.url)
     
-    # Get folders for upload form
+    # The folder picker loads the tree on demand from /api/folders/tree
     folder_id = request.args.get('folder', type=int)
-    if user_mode == 'single':
-        folders = []  # No folders in single mode for now
-    else:
-        folders = Folder.query.filter(
+    current_folder = None
+    if folder_id and user_mode != 'single':  # No folders in single mode for now
+        current_folder = Folder.query.filter(
+            Folder.id == folder_id,
             Folder.team_id == current_team_id
-        ).order_by(Folder.name).all()
+        ).first()
+    breadcrumbs = current_folder.breadcrumbs() if current_folder else []
     
-    return render_template('file_upload.html', folders=folders, current_folder_id=folder_id, user_mode=user_mode)
+    return render_template('file_upload.html', current_folder=current_folder,
+                         breadcrumbs=breadcrumbs, user_mode=user_mode)
 
 @app.route('/file/<int:file_id>')
 @require_login
+@http_cache.conditional(file_scope)
 def view_file(file_id):
     file = File.query.get_or_404(file_id)
     
@@ -799,10 +855,7 @@ def view_file(file_id):
     else:
         # In team mode, get membership for UI purposes only
         if file.team_id:
-            membership = TeamMember.query.filter(
-                TeamMember.team_id == file.team_id,
-                TeamMember.user_id == current_user.id
-            ).first()
+            membership = memberships.get(file.team_id, current_user.id)
         else:
             membership = None
     
@@ -838,10 +891,7 @@ def edit_file_simple(file_id):
     else:
         # In team mode, get membership for UI purposes only
         if file.team_id:
-            membership = TeamMember.query.filter(
-                TeamMember.team_id == file.team_id,
-                TeamMember.user_id == current_user.id
-            ).first()
+            membership = memberships.get(file.team_id, current_user.id)
         else:
             membership = None
     
@@ -874,25 +924,23 @@ def edit_file_simple(file_id):
                 f.write(new_content)
             
             # Create new version
-            next_version = (latest_version.version_number + 1) if latest_version else 1
             version = FileVersion(
                 file_id=file.id,
-                version_number=next_version,
+                version_number=file.next_version(),
                 content=new_content,
                 created_by=current_user.id
             )
             db.session.add(version)
             
             # Update file metadata
-            file.version = next_version
             file.updated_at = datetime.now()
             
-            db.session.commit()
-            
             # Log activity (only for team mode)
             if file.team_id:
-                log_activity(file.team_id, 'edit_file', 'file', file.id, 
-                            f'Edited "{file.original_filename}"')
+                activity.record(file.team_id, 'edit_file', file,
+                                f'Edited "{file.original_filename}"')
+            
+            db.session.commit()
             
             flash('File saved successfully!', 'success')
             return redirect(url_for('view_file', file_id=file_id))
@@ -909,6 +957,14 @@ def edit_file_simple(file_id):
     return render_template('file_edit.html', file=file, content=current_content, 
                          versions=versions, membership=membership)
 
+def file_cache_headers(response, file):
+    """Keep a response fetched by its versioned URL for good; revalidate others by ETag"""
+    if request.args.get('v') == file.content_tag:
+        response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/download/<int:file_id>')
 @require_login
 def download_file(file_id):
@@ -918,12 +974,27 @@ def download_file(file_id):
     user_mode = current_user.mode_preference
     
     try:
-        return send_file(file.file_path, as_attachment=True, 
+        response = send_file(file.file_path, as_attachment=True, 
                         download_name=file.original_filename)
     except Exception as e:
         print(f"Error downloading file: {e}")
         flash('Error downloading file.', 'error')
         return redirect(url_for('view_file', file_id=file_id))
+    return file_cache_headers(response, file)
+
+@app.route('/file/<int:file_id>/thumbnail')
+@require_login
+def file_thumbnail(file_id):
+    """Small JPEG preview of an image file; the image itself if it has none"""
+    file = File.query.get_or_404(file_id)
+    if file.file_type != 'image':
+        abort(404)
+    path = thumbnails.path_for(file) or file.file_path
+    try:
+        response = send_file(path)
+    except FileNotFoundError:
+        abort(404)
+    return file_cache_headers(response, file)
 
 @app.route('/chat')
 @require_login
@@ -934,29 +1005,138 @@ def chat():
         return redirect(url_for('dashboard'))
     
     # Check team membership
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == current_team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(current_team_id, current_user.id)
     
     if not membership:
         flash('You are not a member of this team.', 'error')
         return redirect(url_for('dashboard'))
     
-    # Get team and messages
+    # Get team and the latest page of messages; older ones load on scroll
     team = Team.query.get(current_team_id)
-    messages = Message.query.filter(
-        Message.team_id == current_team_id
-    ).order_by(Message.created_at.asc()).all()
-    
-    # Get team members
-    team_members = db.session.query(User, TeamMember.role).join(
-        TeamMember, User.id == TeamMember.user_id
-    ).filter(TeamMember.team_id == current_team_id).all()
+    page = pagination.chat_history(current_team_id)
+    team_members = queries.team_members(current_team_id)
     
-    return render_template('chat.html', team=team, messages=messages, 
+    return render_template('chat.html', team=team, messages=page.messages,
+                         next_cursor=page.next_cursor,
                          team_members=team_members, membership=membership)
 
+@app.route('/api/teams/<int:team_id>/chat/messages')
+@require_login
+def chat_history(team_id):
+    """A page of chat history, newest first by page; ``before`` is the previous next_cursor"""
+    membership = memberships.get(team_id, current_user.id)
+    if not membership:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    try:
+        page = pagination.chat_history(
+            team_id,
+            cursor=request.args.get('before'),
+            limit=request.args.get('limit', pagination.CHAT_PAGE_SIZE, type=int)
+        )
+    except pagination.InvalidCursor as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'next_cursor': page.next_cursor,
+        'messages': [messaging.message_json(message) for message in page.messages],
+        'html': ''.join(
+            render_template('chat_message.html', message=message, membership=membership)
+            for message in page.messages
+        )
+    })
+
+@app.route('/api/teams/<int:team_id>/chat/messages', methods=['POST'])
+@require_login
+def post_message(team_id):
+    """Send a message; a retry with the same Idempotency-Key returns the stored one"""
+    membership = memberships.get(team_id, current_user.id)
+    if not membership:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({'success': False, 'error': 'Message cannot be empty'}), 400
+    client_key = request.headers.get('Idempotency-Key') or data.get('client_key') or None
+    if client_key and len(client_key) > messaging.CLIENT_KEY_MAX_LENGTH:
+        return jsonify({'success': False, 'error': 'Idempotency key too long'}), 400
+
+    try:
+        reply_to_id = int(data['reply_to_id']) if data.get('reply_to_id') else None
+        message, created = messaging.send(team_id, content, client_key=client_key, reply_to_id=reply_to_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'created': created,
+        'message': messaging.message_json(message),
+        'html': render_template('chat_message.html', message=message, membership=membership)
+    }), 201 if created else 200
+
+@app.route('/api/teams/<int:team_id>/chat/events')
+@require_login
+def chat_events(team_id):
+    """Server-Sent Events stream of a team's message changes"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    # Don't hold a pooled connection for the life of the stream
+    db.session.remove()
+    return events.sse_response(events.broker.subscribe(events.team_channel(team_id, 'chat')))
+
+@app.route('/api/unread')
+@require_login
+def unread_counts():
+    """Unread messages and activities in each of the current user's teams"""
+    markers = read_markers.for_user(current_user.id)
+    return jsonify({
+        'success': True,
+        'teams': {team_id: read_markers.unread_json(marker) for team_id, marker in markers.items()}
+    })
+
+@app.route('/api/teams/<int:team_id>/read', methods=['POST'])
+@require_login
+def mark_read(team_id):
+    """Move the current user's read marker up to ``message_id`` and/or ``activity_id``"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    data = request.get_json(silent=True) or request.form
+    try:
+        message_id = int(data['message_id']) if data.get('message_id') else None
+        activity_id = int(data['activity_id']) if data.get('activity_id') else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Invalid id'}), 400
+
+    marker = read_markers.mark_read(current_user.id, team_id, message_id, activity_id)
+    db.session.commit()
+    return jsonify({'success': True, 'unread': read_markers.unread_json(marker)})
+
+@app.route('/api/teams/<int:team_id>/presence')
+@require_login
+def team_presence(team_id):
+    """Who is online in and typing to a team's chat right now"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    return jsonify({'success': True, **presence.snapshot(team_id)})
+
+@app.route('/api/teams/<int:team_id>/presence', methods=['POST'])
+@require_login
+def update_presence(team_id):
+    """Heartbeat; ``typing`` starts or stops the typing indicator, ``online: false`` leaves"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    data = request.get_json(silent=True) or {}
+    typing = data.get('typing')
+    presence.update(
+        team_id, current_user.id,
+        online=data.get('online', True) is not False,
+        typing=None if typing is None else bool(typing)
+    )
+    return jsonify({'success': True})
+
 @app.route('/send_message', methods=['POST'])
 @require_login
 def send_message():
@@ -966,10 +1146,7 @@ def send_message():
         return redirect(url_for('dashboard'))
     
     # Check team membership
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == current_team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(current_team_id, current_user.id)
     
     if not membership:
         flash('You are not a member of this team.', 'error')
@@ -980,18 +1157,8 @@ def send_message():
         flash('Message cannot be empty.', 'error')
         return redirect(url_for('chat'))
     
-    # Create message
-    message = Message(
-        content=content,
-        team_id=current_team_id,
-        sender_id=current_user.id
-    )
-    db.session.add(message)
-    db.session.commit()
-    
-    # Log activity
-    log_activity(current_team_id, 'send_message', 'message', message.id, 
-                'Sent a message')
+    # Form fallback for browsers without JavaScript; the chat page posts to post_message
+    messaging.send(current_team_id, content)
     
     return redirect(url_for('chat'))
 
@@ -1002,10 +1169,7 @@ def delete_message(message_id):
     
     # Check if user can delete this message
     # Users can delete their own messages, admins can delete any message
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == message.team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(message.team_id, current_user.id)
     
     if not membership:
         return jsonify({'success': False, 'error': 'Access denied'})
@@ -1017,12 +1181,9 @@ def delete_message(message_id):
     # Soft delete the message
     message.is_deleted = True
     message.deleted_at = datetime.now()
+    activity.record(message.team_id, 'delete_message', message, 'Deleted a message')
     db.session.commit()
     
-    # Log activity
-    log_activity(message.team_id, 'delete_message', 'message', message.id, 
-                f'Deleted a message')
-    
     return jsonify({'success': True})
 
 @app.route('/edit_message/<int:message_id>', methods=['POST'])
@@ -1050,16 +1211,64 @@ def edit_message(message_id):
     
     return jsonify({'success': True, 'content': new_content})
 
+@app.route('/api/chat/search')
+@require_login
+def search_chat():
+    """Full-text search over the current team's messages"""
+    current_team_id = session.get('current_team_id')
+    membership = memberships.get(current_team_id, current_user.id) if current_team_id else None
+
+    if not membership:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    query = request.args.get('q', '').strip()
+    results = search.search_messages(query, current_team_id,
+                                     limit=request.args.get('limit', search.MESSAGE_SEARCH_LIMIT, type=int))
+    return jsonify({
+        'success': True,
+        'query': query,
+        'results': [{
+            'id': message.id,
+            'sender': message.sender.display_name,
+            'created_at': message.created_at.isoformat(),
+            'snippet': str(snippet)
+        } for message, snippet in results]
+    })
+
+@app.route('/api/chat/messages/<int:message_id>/context')
+@require_login
+def message_context(message_id):
+    """A window of messages around one message, for jumping to a search hit"""
+    message = Message.query.get_or_404(message_id)
+
+    membership = memberships.get(message.team_id, current_user.id)
+
+    if not membership or message.is_deleted:
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+
+    size = max(1, min(request.args.get('size', search.MESSAGE_CONTEXT_SIZE, type=int), 50))
+    messages, has_more_before, has_more_after = search.message_context(message, size)
+    return jsonify({
+        'success': True,
+        'anchor_id': message.id,
+        'has_more_before': has_more_before,
+        'has_more_after': has_more_after,
+        'html': ''.join(
+            render_template('chat_message.html', message=item, membership=membership)
+            for item in messages
+        )
+    })
+
 @app.route('/team/<int:team_id>/settings', methods=['GET', 'POST'])
 @require_login
+@http_cache.conditional(team_scope)
 def team_settings(team_id):
-    team = Team.query.get_or_404(team_id)
+    team = queries.settings_team(team_id)
+    if not team:
+        abort(404)
     
     # Check team membership
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(team_id, current_user.id)
     
     if not membership:
         flash('You are not a member of this team.', 'error')
@@ -1100,9 +1309,7 @@ def team_settings(team_id):
         return redirect(url_for('team_settings', team_id=team_id))
     
     # Get team statistics
-    team_members = db.session.query(User, TeamMember.role).join(
-        TeamMember, User.id == TeamMember.user_id
-    ).filter(TeamMember.team_id == team_id).all()
+    team_members = queries.team_members(team_id)
     
     team_files_count = File.query.filter(
         File.team_id == team_id,
@@ -1132,10 +1339,7 @@ def team_settings(team_id):
 def change_member_role(team_id, user_id):
     """Change a team member's role (admin only)"""
     # Check if current user is admin of this team
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(team_id, current_user.id)
     
     if not membership or membership.role != 'admin':
         flash('Only team administrators can change member roles.', 'error')
@@ -1166,12 +1370,12 @@ def change_member_role(team_id, user_id):
     # Update role
     old_role = target_membership.role
     target_membership.role = new_role
-    db.session.commit()
     
     # Log activity
     user = User.query.get(user_id)
-    log_activity(team_id, 'change_role', 'member', target_membership.id, 
-                f'Changed {user.display_name} role from {old_role} to {new_role}')
+    activity.record(team_id, 'change_role', target_membership,
+                    f'Changed {user.display_name} role from {old_role} to {new_role}')
+    db.session.commit()
     
     flash(f'Successfully changed {user.display_name}\'s role to {new_role}.', 'success')
     return redirect(url_for('team_settings', team_id=team_id))
@@ -1182,7 +1386,7 @@ def settings():
     if request.method == 'POST':
         theme = request.form.get('theme')
         if theme in ['light', 'dark']:
-            current_user.theme_preference = theme
+            current_user.load().theme_preference = theme
             db.session.commit()
             flash('Settings updated successfully!', 'success')
         else:
@@ -1199,10 +1403,7 @@ def create_folder():
         return redirect(url_for('dashboard'))
     
     # Check permissions
-    membership = TeamMember.query.filter(
-        TeamMember.team_id == current_team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
+    membership = memberships.get(current_team_id, current_user.id)
     
     # No restrictions - everyone can create folders
     
@@ -1213,6 +1414,10 @@ def create_folder():
         flash('Folder name is required.', 'error')
         return redirect(url_for('files', folder=parent_id))
     
+    if parent_id and not Folder.query.filter_by(id=parent_id, team_id=current_team_id).first():
+        flash('Folder not found.', 'error')
+        return redirect(url_for('files'))
+    
     # Create folder
     folder = Folder(
         name=folder_name,
@@ -1221,15 +1426,54 @@ def create_folder():
         created_by=current_user.id
     )
     db.session.add(folder)
+    activity.record(current_team_id, 'create_folder', folder, f'Created folder "{folder_name}"')
     db.session.commit()
     
-    # Log activity
-    log_activity(current_team_id, 'create_folder', 'folder', folder.id, 
-                f'Created folder "{folder_name}"')
-    
     flash('Folder created successfully!', 'success')
     return redirect(url_for('files', folder=parent_id))
 
+@app.route('/folder/<int:folder_id>/rename', methods=['POST'])
+@require_login
+def rename_folder(folder_id):
+    folder = Folder.query.filter_by(id=folder_id, team_id=session.get('current_team_id')).first_or_404()
+    
+    folder_name = request.form.get('name', '').strip()
+    if not folder_name:
+        flash('Folder name is required.', 'error')
+        return redirect(url_for('files', folder=folder.parent_id))
+    
+    old_name = folder.name
+    folder.name = folder_name
+    activity.record(folder.team_id, 'rename_folder', folder,
+                    f'Renamed folder "{old_name}" to "{folder_name}"')
+    db.session.commit()
+    
+    flash('Folder renamed successfully!', 'success')
+    return redirect(url_for('files', folder=folder.parent_id))
+
+@app.route('/folder/<int:folder_id>/move', methods=['POST'])
+@require_login
+def move_folder(folder_id):
+    folder = Folder.query.filter_by(id=folder_id, team_id=session.get('current_team_id')).first_or_404()
+    
+    parent_id = request.form.get('parent_id', type=int)
+    if parent_id:
+        parent = Folder.query.filter_by(id=parent_id, team_id=folder.team_id).first()
+        if not parent:
+            flash('Folder not found.', 'error')
+            return redirect(url_for('files', folder=folder.parent_id))
+        if folder.contains(parent):
+            flash('A folder cannot be moved into itself.', 'error')
+            return redirect(url_for('files', folder=folder.parent_id))
+    
+    # Paths of the whole subtree are rewritten in one UPDATE on flush (see models.Folder)
+    folder.parent_id = parent_id
+    activity.record(folder.team_id, 'move_folder', folder, f'Moved folder "{folder.name}"')
+    db.session.commit()
+    
+    flash('Folder moved successfully!', 'success')
+    return redirect(url_for('files', folder=parent_id))
+
 @app.route('/delete_file/<int:file_id>', methods=['POST'])
 @require_login
 def delete_file(file_id):
@@ -1241,16 +1485,73 @@ def delete_file(file_id):
     # Soft delete
     file.is_deleted = True
     file.deleted_at = datetime.now()
-    db.session.commit()
     
     # Log activity (only for team mode)
     if file.team_id:
-        log_activity(file.team_id, 'delete_file', 'file', file.id, 
-                    f'Deleted "{file.original_filename}"')
+        activity.record(file.team_id, 'delete_file', file, f'Deleted "{file.original_filename}"')
+    db.session.commit()
     
     flash('File deleted successfully!', 'success')
     return redirect(url_for('files', folder=file.folder_id))
 
+@app.route('/api/teams/<int:team_id>/activity/events')
+@require_login
+def activity_events(team_id):
+    """Server-Sent Events stream of a team's activity
+
+    A client resuming with Last-Event-ID (or ``after`` on first connect)
+    gets what it missed from the activity table first, or a ``reset`` event
+    to reload the panel when that is more than a backlog's worth. Recent
+    rows below its cursor are sent again in case they committed after it
+    passed them (see queries.activities_committed_late). A row created
+    longer ago than that window, and committed while the client was away,
+    is still missed.
+    """
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('after') or -1)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid event id'}), 400
+
+    # Subscribe before reading the backlog so nothing falls in between
+    subscription = events.broker.subscribe(events.team_channel(team_id, 'activity'))
+    backlog = []
+    if last_event_id >= 0:
+        missed = queries.activities_after(team_id, last_event_id, limit=queries.ACTIVITY_BACKLOG + 1)
+        if len(missed) > queries.ACTIVITY_BACKLOG:
+            backlog = [{'id': queries.latest_activity_id(team_id), 'type': 'reset', 'data': {}}]
+        else:
+            late = queries.activities_committed_late(team_id, last_event_id)
+            backlog = [
+                {'id': row.id, 'type': 'activity', 'data': activity.activity_json(row)} for row in late + missed
+            ]
+    # Don't hold a pooled connection for the life of the stream
+    db.session.remove()
+    return events.sse_response(subscription, backlog, last_id=last_event_id if last_event_id >= 0 else None)
+
+@app.route('/api/teams/<int:team_id>/activity/daily')
+@require_login
+def activity_daily(team_id):
+    """Per-day, per-action activity counts of a team from the rollup table"""
+    if not memberships.get(team_id, current_user.id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    since = datetime.now().date() - timedelta(days=days - 1)
+    rows = queries.activity_daily(team_id, since)
+    return jsonify({
+        'success': True,
+        'days': [{'day': row.day.isoformat(), 'action': row.action, 'count': row.count} for row in rows],
+    })
+
+@app.route('/api/cache/stats')
+@require_login
+def cache_stats():
+    """Hit rates of this worker's in-process caches, in debug and testing only"""
+    if not (app.debug or app.testing):
+        abort(404)
+    return jsonify({'success': True, 'pid': os.getpid(), 'caches': cache.stats()})
+
 @app.route('/help')
 def help_page():
     """Help and guidelines page"""
@@ -16,10 +16,11 @@ def main():
         
         # Import and run the application
         from app import app, db
+        import migrations
         
         with app.app_context():
             # Create new database with current schema
-            db.create_all()
+            migrations.upgrade()
             print("✓ Created new database with current schema")
         
         print("✓ Starting application...")
@@ -1,45 +1,52 @@
 """
 AWS S3 Storage Integration for File Drive
 Provides cloud storage capabilities with fast upload/download
+
+boto3 takes about a tenth of a second to import, so it is imported, and the
+client built, the first time a configured bucket is actually used.
 """
-import boto3
 import uuid
 import mimetypes
-from botocore.exceptions import ClientError
 import os
+import threading
 from werkzeug.utils import secure_filename
 
+def _client_error():
+    # botocore is loaded along with the client, which exists by the time this is needed
+    from botocore.exceptions import ClientError
+    return ClientError
+
 class S3Storage:
     def __init__(self, bucket_name=None, region_name='us-east-1'):
         self.bucket_name = bucket_name or os.environ.get('AWS_S3_BUCKET_NAME')
         self.region_name = region_name
-        
-        # Initialize S3 client
-        try:
-            # Only initialize if AWS credentials are provided
-            aws_access_key = os.environ.get('AWS_ACCESS_KEY_ID')
-            aws_secret_key = os.environ.get('AWS_SECRET_ACCESS_KEY')
-            
-            if aws_access_key and aws_secret_key:
-                self.s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=aws_access_key,
-                    aws_secret_access_key=aws_secret_key,
-                    region_name=self.region_name
-                )
-            else:
-                self.s3_client = None
-        except Exception:
-            self.s3_client = None
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def s3_client(self):
+        """boto3 S3 client, created on first use; None without credentials"""
+        if self._client is None and self._has_credentials():
+            with self._client_lock:
+                if self._client is None:
+                    try:
+                        import boto3
+                        self._client = boto3.client(
+                            's3',
+                            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+                            region_name=self.region_name
+                        )
+                    except Exception as e:
+                        print(f"Error creating S3 client: {e}")
+        return self._client
+    
+    def _has_credentials(self):
+        return bool(os.environ.get('AWS_ACCESS_KEY_ID') and os.environ.get('AWS_SECRET_ACCESS_KEY'))
     
     def is_configured(self):
         """Check if S3 is properly configured"""
-        return (
-            self.s3_client is not None and 
-            self.bucket_name and
-            os.environ.get('AWS_ACCESS_KEY_ID') and
-            os.environ.get('AWS_SECRET_ACCESS_KEY')
-        )
+        return bool(self.bucket_name and self._has_credentials() and self.s3_client is not None)
     
     def generate_file_key(self, team_id, original_filename):
         """Generate a unique S3 key for the file"""
@@ -76,7 +83,7 @@ class S3Storage:
             
             return file_key, file_url
             
-        except ClientError as e:
+        except _client_error() as e:
             print(f"Error uploading file to S3: {e}")
             return None, None
     
@@ -91,7 +98,7 @@ class S3Storage:
                 Key=file_key
             )
             return True
-        except ClientError as e:
+        except _client_error() as e:
             print(f"Error deleting file from S3: {e}")
             return False
     
@@ -107,7 +114,7 @@ class S3Storage:
                 ExpiresIn=expiration
             )
             return response
-        except ClientError as e:
+        except _client_error() as e:
             print(f"Error generating presigned URL: {e}")
             return None
     
@@ -126,7 +133,7 @@ class S3Storage:
                 'last_modified': response['LastModified'],
                 'content_type': response.get('ContentType', 'application/octet-stream')
             }
-        except ClientError as e:
+        except _client_error() as e:
             print(f"Error getting file info: {e}")
             return None
 
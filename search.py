@@ -0,0 +1,300 @@
+"""
+Search for File Drive
+Trigram index over File.original_filename used by the autocomplete endpoint,
+and a full-text index over Message.content used by chat search.
+
+Postgres uses a pg_trgm GIN index and similarity() for filenames and a
+tsvector GIN index for messages. SQLite uses FTS5 tables kept in sync by
+triggers: a trigram one for filenames, whose candidates are ranked in-process
+with the same trigram similarity pg_trgm uses, and a word one for messages.
+"""
+import logging
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import column, func, or_, table, text, tuple_
+
+from app import db
+from models import File, Message
+from queries import CHAT_MESSAGE_OPTIONS, MESSAGE_OPTIONS
+
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_MAX_LIMIT = 20
+# Rows pulled from the FTS index before in-process ranking on SQLite
+SQLITE_CANDIDATES = 200
+
+MESSAGE_SEARCH_LIMIT = 20
+MESSAGE_CONTEXT_SIZE = 20
+# Snippet highlight markers; swapped for <mark> after the text is escaped
+_HIGHLIGHT_START, _HIGHLIGHT_END = '\x02', '\x03'
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+files_trgm = table('files_trgm', column('rowid'), column('rank'))
+messages_fts = table('messages_fts', column('rowid'))
+
+# Which SQLite FTS5 tables exist; looked up once per process
+_sqlite_indexes = {}
+
+SQLITE_FILES_TRGM_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_trgm USING fts5(
+        original_filename,
+        content='files',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_trgm_ai AFTER INSERT ON files BEGIN
+        INSERT INTO files_trgm(rowid, original_filename) VALUES (new.id, new.original_filename);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_trgm_ad AFTER DELETE ON files BEGIN
+        INSERT INTO files_trgm(files_trgm, rowid, original_filename) VALUES ('delete', old.id, old.original_filename);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_trgm_au AFTER UPDATE OF original_filename ON files BEGIN
+        INSERT INTO files_trgm(files_trgm, rowid, original_filename) VALUES ('delete', old.id, old.original_filename);
+        INSERT INTO files_trgm(rowid, original_filename) VALUES (new.id, new.original_filename);
+    END
+    """,
+]
+
+SQLITE_MESSAGES_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content,
+        content='messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+SQLITE_SEARCH_INDEXES = {
+    'files_trgm': SQLITE_FILES_TRGM_DDL,
+    'messages_fts': SQLITE_MESSAGES_FTS_DDL,
+}
+
+
+def install_sqlite_indexes(conn):
+    """Create the SQLite FTS5 indexes and (re)build them from their tables
+
+    Run by the search index migration; a rebuild is also what brings an
+    index back in line if its content table was dropped and recreated.
+    """
+    for name, statements in SQLITE_SEARCH_INDEXES.items():
+        try:
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+        except Exception as e:
+            # SQLite builds older than 3.34 have no trigram tokenizer
+            logging.warning(f"Search index {name} unavailable, falling back to scans: {e}")
+            _sqlite_indexes[name] = False
+            continue
+        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+        _sqlite_indexes[name] = True
+
+
+def _has_sqlite_index(name):
+    if name not in _sqlite_indexes:
+        _sqlite_indexes[name] = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+        ), {'name': name}).first() is not None
+    return _sqlite_indexes[name]
+
+
+def trigrams(value):
+    """Trigram set of a string, padded per word the same way pg_trgm does"""
+    grams = set()
+    for word in _WORD_RE.findall((value or '').lower()):
+        padded = f'  {word} '
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def similarity(query, value):
+    """Trigram similarity in [0, 1], matching pg_trgm's similarity()"""
+    a, b = trigrams(query), trigrams(value)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _rank(query, name):
+    """Fuzzy score with a boost for prefix and substring hits"""
+    lowered_query, lowered_name = query.lower(), name.lower()
+    score = similarity(query, name)
+    if lowered_name.startswith(lowered_query):
+        score += 0.5
+    elif lowered_query in lowered_name:
+        score += 0.25
+    return score
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_match_expression(query):
+    """OR of the query's raw trigrams, each quoted as an FTS5 string"""
+    lowered = query.lower()
+    grams = {lowered[i:i + 3] for i in range(len(lowered) - 2)}
+    return ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in sorted(grams))
+
+
+def scoped_files_query(team_id, user_id, folder_id=None):
+    """Live (not deleted) files visible in a team, or a user's personal space"""
+    if team_id:
+        query = File.query.filter(File.team_id == team_id)
+    else:
+        query = File.query.filter(File.team_id.is_(None), File.uploaded_by == user_id)
+    if folder_id is not None:
+        query = query.filter(File.folder_id == folder_id)
+    return query.filter(File.is_deleted == False)
+
+
+def autocomplete_files(query, team_id, user_id, folder_id=None, limit=AUTOCOMPLETE_LIMIT):
+    """Return up to ``limit`` (file, score) pairs ranked by fuzzy filename match"""
+    query = (query or '').strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    base = scoped_files_query(team_id, user_id, folder_id)
+    like = f'%{_escape_like(query)}%'
+
+    if db.engine.dialect.name == 'postgresql':
+        score = func.similarity(File.original_filename, query)
+        rows = base.with_entities(File, score).filter(
+            or_(
+                File.original_filename.op('%')(query),
+                File.original_filename.ilike(like, escape='\\')
+            )
+        ).order_by(score.desc(), File.updated_at.desc()).limit(limit).all()
+        return [(file, float(file_score)) for file, file_score in rows]
+
+    if len(query) >= 3 and _has_sqlite_index('files_trgm'):
+        candidates = base.join(
+            files_trgm, files_trgm.c.rowid == File.id
+        ).filter(
+            text('files_trgm MATCH :match')
+        ).params(match=_fts_match_expression(query)).order_by(
+            files_trgm.c.rank
+        ).limit(SQLITE_CANDIDATES).all()
+    else:
+        # Short queries have no trigrams; a prefix/substring scan is enough
+        candidates = base.filter(
+            File.original_filename.ilike(like, escape='\\')
+        ).order_by(File.updated_at.desc()).limit(SQLITE_CANDIDATES).all()
+
+    ranked = sorted(
+        ((file, _rank(query, file.original_filename)) for file in candidates),
+        key=lambda pair: (pair[1], pair[0].updated_at), reverse=True
+    )
+    return ranked[:limit]
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the highlight markers into <mark> tags"""
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
+
+
+def _fts_word_query(query):
+    """Every word must match; the last one as a prefix so partial words hit"""
+    tokens = _TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    quoted = ['"' + token.replace('"', '""') + '"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_messages(query, team_id, limit=MESSAGE_SEARCH_LIMIT):
+    """Return up to ``limit`` (message, snippet) pairs, newest first
+
+    Soft-deleted messages are never returned; edits are indexed as they
+    happen (by trigger on SQLite, by the expression index on Postgres).
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, MESSAGE_SEARCH_LIMIT))
+    base = Message.query.filter(
+        Message.team_id == team_id,
+        Message.is_deleted == False
+    ).options(*MESSAGE_OPTIONS)
+
+    if db.engine.dialect.name == 'postgresql':
+        tsquery = func.plainto_tsquery('simple', query)
+        snippet = func.ts_headline(
+            'simple', Message.content, tsquery,
+            f'StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_END}, MaxWords=24, MinWords=8'
+        )
+        rows = base.with_entities(Message, snippet).filter(
+            func.to_tsvector('simple', Message.content).op('@@')(tsquery)
+        ).order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+        return [(message, highlight(text_snippet)) for message, text_snippet in rows]
+
+    match = _fts_word_query(query)
+    if match and _has_sqlite_index('messages_fts'):
+        snippet = text(f"snippet(messages_fts, 0, '{_HIGHLIGHT_START}', '{_HIGHLIGHT_END}', '…', 16)")
+        rows = base.join(
+            messages_fts, messages_fts.c.rowid == Message.id
+        ).with_entities(Message, snippet).filter(
+            text('messages_fts MATCH :match')
+        ).params(match=match).order_by(
+            messages_fts.c.rowid.desc()
+        ).limit(limit).all()
+        return [(message, highlight(text_snippet)) for message, text_snippet in rows]
+
+    messages = base.filter(
+        Message.content.ilike(f'%{_escape_like(query)}%', escape='\\')
+    ).order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+    return [(message, highlight(message.content[:160])) for message in messages]
+
+
+def message_context(anchor, size=MESSAGE_CONTEXT_SIZE):
+    """Messages around ``anchor`` in chat order, fetched by (created_at, id) keyset
+
+    Returns (messages, has_more_before, has_more_after).
+    """
+    key = tuple_(Message.created_at, Message.id)
+    anchor_key = tuple_(anchor.created_at, anchor.id)
+    base = Message.query.filter(
+        Message.team_id == anchor.team_id,
+        Message.is_deleted == False
+    ).options(*CHAT_MESSAGE_OPTIONS)
+
+    before = base.filter(key < anchor_key).order_by(
+        Message.created_at.desc(), Message.id.desc()
+    ).limit(size + 1).all()
+    after = base.filter(key > anchor_key).order_by(
+        Message.created_at.asc(), Message.id.asc()
+    ).limit(size + 1).all()
+
+    has_more_before, has_more_after = len(before) > size, len(after) > size
+    messages = list(reversed(before[:size])) + [anchor] + after[:size]
+    return messages, has_more_before, has_more_after
@@ -0,0 +1,107 @@
+"""
+SQLite production profile for File Drive
+Makes a SQLite file usable by several gunicorn workers at once:
+
+- WAL journal, so readers never block the writer or each other;
+- busy_timeout, so a writer waits for the lock instead of failing with
+  "database is locked";
+- synchronous=NORMAL, which is durable in WAL mode except for the last
+  transactions before a power cut, at a fraction of the fsync cost;
+- transactions begin deferred and switch to BEGIN IMMEDIATE at their first
+  write. A deferred transaction that reads first and then writes can
+  deadlock with another writer, and SQLite then fails at once regardless
+  of busy_timeout. So at the first statement that is not a read, the
+  transaction (which has only read so far) is committed and restarted as
+  BEGIN IMMEDIATE, which queues writers on busy_timeout. The write lock is
+  held from the first INSERT/UPDATE/DELETE to the commit. Requests that
+  only read, and a handler's file or S3 I/O before its first flush, never
+  hold it.
+
+Reads before the first write and the write itself therefore do not share
+a snapshot: the same READ COMMITTED behaviour the app has on Postgres. A
+value computed from an earlier read can be overwritten by a concurrent
+transaction, so counters and numbers are computed in SQL: change counters
+(versions.py), unread counts (read_markers.py) and file versions
+(File.next_version). This module must not import app.
+"""
+import os
+
+from sqlalchemy import event
+
+# Statements that never need the write lock
+READ_STATEMENTS = ('SELECT', 'PRAGMA', 'EXPLAIN')
+BUSY_TIMEOUT_MS = 10000
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def is_sqlite(url):
+    return url.startswith('sqlite')
+
+
+def is_memory(url):
+    return url in ('sqlite://', 'sqlite:///:memory:')
+
+
+def engine_options(url):
+    """Engine options for a SQLite URL: one pooled connection per worker thread"""
+    if is_memory(url):
+        return {}
+    threads = int(os.environ.get('DB_POOL_SIZE') or os.environ.get('GUNICORN_THREADS') or 4)
+    return {
+        'pool_size': threads,
+        'max_overflow': 2,
+        'pool_timeout': 30,
+        # Local files don't drop connections; skip the per-checkout ping
+        'pool_pre_ping': False,
+        'connect_args': {'timeout': BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False},
+    }
+
+
+def _is_write(statement):
+    return statement.lstrip().split(None, 1)[0].upper() not in READ_STATEMENTS
+
+
+def install(engine):
+    """Apply the pragmas and explicit transaction control to a SQLite engine"""
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        # Take BEGIN away from the driver so the hooks below decide
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        # Nothing is sent until the first statement shows whether it writes
+        autocommit = conn.get_execution_options().get('isolation_level') == 'AUTOCOMMIT'
+        conn.info['sqlite_transaction'] = None if autocommit else 'pending'
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_or_upgrade(conn, cursor, statement, parameters, context, executemany):
+        state = conn.info.get('sqlite_transaction')
+        if state is None or state == 'write':
+            return
+        write = _is_write(statement)
+        if state == 'read' and not write:
+            return
+        # Cleared while our own statements go through this hook
+        conn.info['sqlite_transaction'] = None
+        if state == 'read':
+            # Only reads so far, so nothing is lost by ending the deferred transaction
+            conn.exec_driver_sql('COMMIT')
+        conn.exec_driver_sql('BEGIN IMMEDIATE' if write else 'BEGIN')
+        conn.info['sqlite_transaction'] = 'write' if write else 'read'
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def end(conn):
+        conn.info.pop('sqlite_transaction', None)
@@ -160,7 +160,8 @@ function handleDrop(e) {
 
 // Search Functionality
 function initializeSearch() {
-    const searchInputs = document.querySelectorAll('input[name="search"]');
+    // Inputs with autocomplete suggest as you type instead of auto-submitting
+    const searchInputs = document.querySelectorAll('input[name="search"]:not([data-autocomplete-url])');
 
     searchInputs.forEach(input => {
         let searchTimeout;
@@ -182,6 +183,143 @@ function initializeSearch() {
     });
 }
 
+// Filename Autocomplete
+function initializeAutocomplete() {
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(input => {
+        const results = input.parentElement.querySelector('.autocomplete-results');
+        let controller = null;
+
+        const hide = () => results.classList.add('d-none');
+
+        const suggest = debounce(function () {
+            const query = input.value.trim();
+            if (!query) {
+                hide();
+                return;
+            }
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+
+            const url = new URL(input.dataset.autocompleteUrl, window.location.origin);
+            url.searchParams.set('q', query);
+            fetch(url, { signal: controller.signal, credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(data => {
+                    results.innerHTML = '';
+                    (data.results || []).forEach(result => {
+                        const item = document.createElement('a');
+                        item.className = 'list-group-item list-group-item-action';
+                        item.href = result.url;
+                        item.textContent = result.name;
+                        results.appendChild(item);
+                    });
+                    results.classList.toggle('d-none', results.children.length === 0);
+                })
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Autocomplete failed:', error);
+                    }
+                });
+        }, 120);
+
+        input.addEventListener('input', suggest);
+        input.addEventListener('keydown', e => {
+            if (e.key === 'Escape') {
+                hide();
+            }
+        });
+        input.addEventListener('blur', () => setTimeout(hide, 150));
+    });
+}
+
+// Folder Trees: one level is fetched when a node is expanded.
+// Responses carry an ETag from the team's folder counter, so 'no-cache'
+// revalidates against the browser cache instead of re-downloading.
+function initializeFolderTrees() {
+    document.querySelectorAll('ul[data-folder-tree-url]').forEach(tree => {
+        const selectable = tree.dataset.folderTreeMode === 'select';
+        const input = selectable ? document.getElementById(tree.dataset.targetInput) : null;
+        const label = selectable ? document.getElementById(tree.dataset.targetLabel) : null;
+
+        const loadLevel = (list, parentId) => {
+            const url = new URL(tree.dataset.folderTreeUrl, window.location.origin);
+            if (parentId) {
+                url.searchParams.set('parent', parentId);
+            }
+            return fetch(url, { credentials: 'same-origin', cache: 'no-cache' })
+                .then(response => response.json())
+                .then(data => {
+                    (data.folders || []).forEach(folder => list.appendChild(renderNode(folder)));
+                    if (!list.children.length && parentId) {
+                        list.innerHTML = '<li class="text-muted small ps-4">No subfolders</li>';
+                    }
+                })
+                .catch(error => console.error('Folder tree failed:', error));
+        };
+
+        const renderNode = folder => {
+            const item = document.createElement('li');
+            const row = document.createElement('div');
+            row.className = 'folder-tree-node d-flex align-items-center';
+
+            const toggle = document.createElement('button');
+            toggle.type = 'button';
+            toggle.className = 'btn btn-sm btn-link folder-tree-toggle p-0 me-1';
+            toggle.innerHTML = '<i class="fas fa-caret-right"></i>';
+            toggle.style.visibility = folder.child_count ? 'visible' : 'hidden';
+
+            const name = document.createElement(selectable ? 'button' : 'a');
+            name.className = 'folder-tree-label text-decoration-none text-truncate';
+            name.innerHTML = '<i class="fas fa-folder text-warning me-1"></i>';
+            name.appendChild(document.createTextNode(folder.name));
+            if (selectable) {
+                name.type = 'button';
+                name.classList.add('btn', 'btn-sm', 'btn-link', 'p-0');
+                name.addEventListener('click', () => {
+                    input.value = folder.id;
+                    label.textContent = folder.name;
+                    tree.querySelectorAll('.folder-tree-node.active').forEach(node => node.classList.remove('active'));
+                    row.classList.add('active');
+                });
+            } else {
+                name.href = folder.url;
+            }
+            if (String(folder.id) === tree.dataset.selected) {
+                row.classList.add('active');
+            }
+
+            const children = document.createElement('ul');
+            children.className = 'folder-tree list-unstyled ps-3 d-none';
+            let loaded = false;
+            toggle.addEventListener('click', () => {
+                const expanded = children.classList.toggle('d-none') === false;
+                toggle.innerHTML = `<i class="fas fa-caret-${expanded ? 'down' : 'right'}"></i>`;
+                if (expanded && !loaded) {
+                    loaded = true;
+                    loadLevel(children, folder.id);
+                }
+            });
+
+            row.append(toggle, name);
+            item.append(row, children);
+            return item;
+        };
+
+        if (selectable) {
+            tree.querySelectorAll('[data-folder-id]').forEach(root => {
+                root.addEventListener('click', () => {
+                    input.value = root.dataset.folderId;
+                    label.textContent = root.textContent.trim();
+                    tree.querySelectorAll('.folder-tree-node.active').forEach(node => node.classList.remove('active'));
+                });
+            });
+        }
+        loadLevel(tree, null);
+    });
+}
+
 // Auto-save for Text Editors
 function initializeAutoSave() {
     const textareas = document.querySelectorAll('.code-editor');
@@ -668,6 +806,8 @@ document.addEventListener('DOMContentLoaded', function () {
     initializeFileUpload();
     initializeDragAndDrop();
     initializeSearch();
+    initializeAutocomplete();
+    initializeFolderTrees();
     initializeAutoSave();
     initializeForms();
     initializeKeyboardShortcuts();
@@ -694,7 +834,8 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // Register Service Worker for PWA
     if ('serviceWorker' in navigator) {
-        navigator.serviceWorker.register('/static/sw.js')
+        // The URL carries the asset version, which names the worker's cache, and its byte budget
+        navigator.serviceWorker.register(document.documentElement.dataset.swUrl || '/static/sw.js', { scope: '/' })
             .then(registration => {
                 console.log('Service Worker registered successfully:', registration);
             })
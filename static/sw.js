@@ -1,35 +1,226 @@
 // File Drive Service Worker
-const CACHE_NAME = 'filedrive-v1';
+// Registered as sw.js?v=<asset version>&budget=<bytes> with scope '/' (see
+// assets.py). Each build of the static assets gets its own cache, and
+// activating it drops the old ones.
+//
+// Recently opened files, thumbnails and file pages go to a second cache kept
+// under the byte budget: least recently used entries are dropped first.
+// Downloads and thumbnails under a versioned URL (?v=) never change and are
+// served from it straight away; anything else is revalidated by ETag and
+// only served from the cache when offline. Folder listings are answered from
+// the cache at once and refreshed in the background.
+const params = new URL(self.location).searchParams;
+const ASSET_VERSION = params.get('v') || 'dev';
+const CACHE_NAME = 'filedrive-' + ASSET_VERSION;
+const DATA_CACHE = 'filedrive-data';
+const BUDGET = parseInt(params.get('budget'), 10) || 50 * 1024 * 1024;
+// Anything bigger would push most other files out
+const MAX_ENTRY = BUDGET / 4;
 const urlsToCache = [
-    '/',
-    '/static/css/style.css',
-    '/static/js/main.js',
     'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
     'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
     'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css'
 ];
 
+const FILE_URL = /^\/(download\/\d+|file\/\d+\/thumbnail)$/;
+const FILE_PAGE = /^\/file\/\d+$/;
+const LISTING_URL = /^\/api\/(files|folders\/tree)$/;
+// Navigations that change whose or which team's data the pages show;
+// creating or joining a team (form posts) makes it the current one
+const CONTEXT_CHANGE = /^\/(logout|switch_team\/|switch_mode\/|create_team$|join_team$)/;
+
+// Hashed asset URLs from the build manifest; the plain files in development
+function assetUrls() {
+    return fetch('/static/dist/assets.json', { cache: 'no-cache' })
+        .then(response => response.ok ? response.json() : { assets: {} })
+        .then(manifest => Object.values(manifest.assets).map(path => '/static/' + path))
+        .then(urls => urls.length ? urls : ['/static/css/style.css', '/static/js/main.js']);
+}
+
+// LRU bookkeeping for DATA_CACHE: url -> { size, used }, itself kept in the cache
+const INDEX_URL = '/__filedrive-data-index__';
+let index = null;
+let saveTimer = null;
+
+function loadIndex() {
+    if (index) {
+        return Promise.resolve(index);
+    }
+    return caches.open(DATA_CACHE)
+        .then(cache => cache.match(INDEX_URL))
+        .then(response => response ? response.json() : {})
+        .then(entries => {
+            index = index || new Map(Object.entries(entries));
+            return index;
+        });
+}
+
+function saveIndex() {
+    clearTimeout(saveTimer);
+    saveTimer = setTimeout(() => {
+        const body = JSON.stringify(Object.fromEntries(index));
+        caches.open(DATA_CACHE).then(cache => cache.put(INDEX_URL, new Response(body)));
+    }, 1000);
+}
+
+function touch(url) {
+    return loadIndex().then(entries => {
+        const entry = entries.get(url);
+        if (entry) {
+            entry.used = Date.now();
+            saveIndex();
+        }
+    });
+}
+
+function evict(cache, entries) {
+    let total = 0;
+    entries.forEach(entry => { total += entry.size; });
+    const oldest = [...entries.entries()].sort((a, b) => a[1].used - b[1].used);
+    const removals = [];
+    while (total > BUDGET && oldest.length) {
+        const [url, entry] = oldest.shift();
+        entries.delete(url);
+        total -= entry.size;
+        removals.push(cache.delete(url));
+    }
+    return Promise.all(removals);
+}
+
+// Keep a copy of a response under the budget, replacing an older one of the same URL
+function store(request, response) {
+    if (!response.ok || response.type !== 'basic') {
+        return Promise.resolve();
+    }
+    const copy = response.clone();
+    return Promise.all([copy.clone().blob(), caches.open(DATA_CACHE), loadIndex()])
+        .then(([blob, cache, entries]) => {
+            if (blob.size > MAX_ENTRY) {
+                return;
+            }
+            return cache.put(request.url, copy).then(() => {
+                entries.set(request.url, { size: blob.size, used: Date.now() });
+                return evict(cache, entries);
+            }).then(saveIndex);
+        })
+        .catch(error => console.log('Offline cache write failed:', error));
+}
+
+// Ask the server whether the cached copy still holds; a 304 keeps it
+function revalidate(request, cached) {
+    const headers = new Headers();
+    const etag = cached && cached.headers.get('ETag');
+    if (etag) {
+        headers.set('If-None-Match', etag);
+    }
+    return fetch(request.url, { headers: headers, credentials: 'same-origin', cache: 'no-cache' })
+        .then(response => {
+            if (response.status === 304 && cached) {
+                touch(request.url);
+                return cached;
+            }
+            if (response.redirected) {
+                // e.g. to the login page; navigations can't be answered with a followed redirect
+                return Response.redirect(response.url, 302);
+            }
+            store(request, response);
+            return response;
+        });
+}
+
+function cacheFirst(event) {
+    return caches.open(DATA_CACHE)
+        .then(cache => cache.match(event.request, { ignoreVary: true }))
+        .then(cached => {
+            if (cached) {
+                event.waitUntil(touch(event.request.url));
+                return cached;
+            }
+            return fetch(event.request).then(response => {
+                event.waitUntil(store(event.request, response.clone()));
+                return response;
+            });
+        });
+}
+
+function networkFirst(event) {
+    return caches.open(DATA_CACHE)
+        .then(cache => cache.match(event.request, { ignoreVary: true }))
+        .then(cached => revalidate(event.request, cached)
+            .catch(error => cached || Promise.reject(error)));
+}
+
+function staleWhileRevalidate(event) {
+    return caches.open(DATA_CACHE)
+        .then(cache => cache.match(event.request, { ignoreVary: true }))
+        .then(cached => {
+            const fresh = revalidate(event.request, cached);
+            if (cached) {
+                event.waitUntil(fresh.catch(() => null));
+                return cached;
+            }
+            return fresh;
+        });
+}
+
+// Another user or team: nothing kept for the previous one may be shown
+function clearData() {
+    index = new Map();
+    return caches.delete(DATA_CACHE);
+}
+
 // Install event
 self.addEventListener('install', event => {
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then(cache => {
-                console.log('Opened cache');
-                return cache.addAll(urlsToCache);
+        Promise.all([caches.open(CACHE_NAME), assetUrls()])
+            .then(([cache, assets]) => {
+                console.log('Opened cache', CACHE_NAME);
+                return cache.addAll(urlsToCache.concat(assets));
             })
     );
 });
 
 // Fetch event
 self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+    if (sameOrigin && CONTEXT_CHANGE.test(url.pathname)) {
+        event.waitUntil(clearData());
+        return;
+    }
+    if (request.method !== 'GET') {
+        return;
+    }
+
+    if (sameOrigin) {
+        if (FILE_URL.test(url.pathname)) {
+            event.respondWith(url.searchParams.has('v') ? cacheFirst(event) : networkFirst(event));
+            return;
+        }
+        if (FILE_PAGE.test(url.pathname) && request.mode === 'navigate') {
+            event.respondWith(networkFirst(event));
+            return;
+        }
+        if (LISTING_URL.test(url.pathname)) {
+            event.respondWith(staleWhileRevalidate(event));
+            return;
+        }
+        if (!url.pathname.startsWith('/static/')) {
+            // Other pages and APIs always come from the server
+            return;
+        }
+    }
+
+    // Static assets: hashed names never change, so the cached copy is good
     event.respondWith(
-        caches.match(event.request)
+        caches.match(request)
             .then(response => {
                 // Return cached version or fetch from network
                 if (response) {
                     return response;
                 }
-                return fetch(event.request);
+                return fetch(request);
             }
             )
     );
@@ -41,12 +232,12 @@ self.addEventListener('activate', event => {
         caches.keys().then(cacheNames => {
             return Promise.all(
                 cacheNames.map(cacheName => {
-                    if (cacheName !== CACHE_NAME) {
+                    if (cacheName !== CACHE_NAME && cacheName !== DATA_CACHE) {
                         console.log('Deleting old cache:', cacheName);
                         return caches.delete(cacheName);
                     }
                 })
             );
-        })
+        }).then(() => self.clients.claim())
     );
-}); 
\ No newline at end of file
+});
@@ -0,0 +1,59 @@
+import activity
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import Folder, Message, Activity
+
+
+def logged_in(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+    return team.id
+
+
+def transactions(statements):
+    return sum(1 for statement in statements if statement.startswith('BEGIN IMMEDIATE'))
+
+
+def test_action_and_activity_share_one_transaction(client):
+    team_id = logged_in(client)
+    with assert_max_queries(20) as statements:
+        response = client.post('/create_folder', data={'name': 'Reports'})
+    assert response.status_code == 302
+    assert transactions(statements) == 1
+
+    with app.app_context():
+        folder = Folder.query.filter_by(team_id=team_id, name='Reports').one()
+        logged = Activity.query.filter_by(team_id=team_id).one()
+        assert (logged.action, logged.target_type, logged.target_id) == ('create_folder', 'folder', folder.id)
+
+
+def test_rolled_back_action_leaves_no_activity(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        message = Message(content='hello', team_id=team.id, sender_id=user.id)
+        db.session.add(message)
+        activity.record(team.id, 'send_message', message, user_id=user.id)
+        db.session.rollback()
+        db.session.add(Message(content='again', team_id=team.id, sender_id=user.id))
+        db.session.commit()
+        assert Activity.query.filter_by(team_id=team.id).count() == 0
+
+
+def test_async_actions_are_batched_after_commit(client):
+    team_id = logged_in(client)
+    app.config['ACTIVITY_ASYNC_ACTIONS'] = {'send_message'}
+    try:
+        for i in range(3):
+            response = client.post('/send_message', data={'content': f'message {i}'})
+            assert response.status_code == 302
+        activity.buffer.flush()
+    finally:
+        app.config['ACTIVITY_ASYNC_ACTIONS'] = set()
+
+    with app.app_context():
+        message_ids = {m.id for m in Message.query.filter_by(team_id=team_id)}
+        logged = Activity.query.filter_by(team_id=team_id, action='send_message').all()
+        assert {a.target_id for a in logged} == message_ids
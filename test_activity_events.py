@@ -0,0 +1,83 @@
+import json
+
+import activity
+import events
+import queries
+from app import app, db
+from conftest import login, team_with_admin
+
+
+def record(team_id, user_id, description):
+    activity.record(team_id, 'upload_file', description=description, user_id=user_id)
+    db.session.commit()
+
+
+def frames(response):
+    for chunk in response.response:
+        chunk = chunk.decode()
+        if chunk.startswith('event:') or chunk.startswith('id:'):
+            fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+            yield fields.get('id'), fields['event'], json.loads(fields['data'])
+
+
+def test_committed_activity_is_published_with_its_id(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        subscription = events.broker.subscribe(events.team_channel(team.id, 'activity'))
+        try:
+            record(team.id, user.id, 'uploaded a.txt')
+            published = subscription.get(timeout=1)
+            assert published['type'] == 'activity' and isinstance(published['id'], int)
+            assert published['data']['description'] == 'uploaded a.txt'
+
+            activity.record(team.id, 'upload_file', description='never', user_id=user.id)
+            db.session.flush()
+            db.session.rollback()
+            assert subscription.get(timeout=0) is None
+        finally:
+            subscription.close()
+
+
+def test_stream_resumes_from_last_event_id(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        team_id = team.id
+        for name in ('a', 'b', 'c'):
+            record(team_id, user.id, f'uploaded {name}')
+        first_id = queries.activities_after(team_id, 0)[0].id
+        login(client, user)
+
+    url = f'/api/teams/{team_id}/activity/events'
+    response = client.get(url, headers={'Last-Event-ID': str(first_id)})
+    stream = frames(response)
+    replayed = [next(stream) for _ in range(3)]
+    assert [data['description'] for _, _, data in replayed] == ['uploaded a', 'uploaded b', 'uploaded c']
+    # The recent row at the cursor is sent again in case it committed late, without moving the cursor
+    assert [event_id for event_id, _, _ in replayed] == [None, str(first_id + 1), str(first_id + 2)]
+
+    channel = events.team_channel(team_id, 'activity')
+    # A live event the backlog already covered is not sent twice
+    events.publish(channel, 'activity', {}, event_id=first_id + 2)
+    events.publish(channel, 'activity', {'description': 'live'}, event_id=first_id + 4)
+    assert next(stream) == (str(first_id + 4), 'activity', {'description': 'live'})
+    # A lower id that committed after a higher one is still delivered
+    events.publish(channel, 'activity', {'description': 'late'}, event_id=first_id + 3)
+    assert next(stream) == (None, 'activity', {'description': 'late'})
+    response.close()
+
+    assert client.get(url, query_string={'after': 'x'}).status_code == 400
+
+
+def test_stream_resets_when_too_far_behind(client, monkeypatch):
+    monkeypatch.setattr(queries, 'ACTIVITY_BACKLOG', 2)
+    with app.app_context():
+        user, team = team_with_admin()
+        team_id = team.id
+        for name in ('a', 'b', 'c', 'd'):
+            record(team_id, user.id, f'uploaded {name}')
+        latest_id = queries.latest_activity_id(team_id)
+        login(client, user)
+
+    response = client.get(f'/api/teams/{team_id}/activity/events', query_string={'after': 0})
+    assert next(frames(response)) == (str(latest_id), 'reset', {})
+    response.close()
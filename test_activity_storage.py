@@ -0,0 +1,89 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import text
+
+import activity_storage
+from activity_storage import add_months, month_start, partition_name
+from app import app, db
+from conftest import login, team_with_admin
+from models import Activity, ActivityDaily
+
+
+def at(month, day):
+    return datetime.combine(month.replace(day=day), time(12))
+
+
+def test_rollup_rotate_and_expire(client):
+    today = date.today()
+    this_month = month_start(today)
+    expired, archived, last = (add_months(this_month, offset) for offset in (-3, -2, -1))
+    try:
+        with app.app_context():
+            user, team = team_with_admin()
+            for created_at, action in [
+                (at(expired, 15), 'upload_file'),
+                (at(archived, 3), 'upload_file'),
+                (at(archived, 3), 'upload_file'),
+                (at(last, 4), 'send_message'),
+                (at(this_month, 1), 'send_message'),
+            ]:
+                db.session.add(Activity(team_id=team.id, user_id=user.id, action=action, created_at=created_at))
+            db.session.commit()
+            team_id = team.id
+            login(client, user)
+            db.session.close()
+
+            result = activity_storage.maintain(today=today, keep_months=2)
+            assert result['rotated'] == [partition_name(expired), partition_name(archived)]
+            assert result['dropped'] == [partition_name(expired)]
+
+            # Counts outlive the rows they were taken from
+            daily = {(row.day, row.action): row.count for row in ActivityDaily.query.filter_by(team_id=team_id)}
+            assert daily == {
+                (expired.replace(day=15), 'upload_file'): 1,
+                (archived.replace(day=3), 'upload_file'): 2,
+                (last.replace(day=4), 'send_message'): 1,
+                (this_month, 'send_message'): 1,
+            }
+            assert Activity.query.filter_by(team_id=team_id).count() == 2
+            archive = partition_name(archived)
+            assert db.session.execute(text(f'SELECT count(*) FROM {archive}')).scalar() == 2
+            db.session.close()
+
+            # A second run only recounts from the last rolled-up day
+            assert activity_storage.maintain(today=today, keep_months=2)['rotated'] == []
+            assert ActivityDaily.query.filter_by(team_id=team_id).count() == 4
+
+        response = client.get(f'/api/teams/{team_id}/activity/daily?days=7')
+        assert response.get_json()['success']
+        for row in response.get_json()['days']:
+            assert date.fromisoformat(row['day']) > today - timedelta(days=7)
+    finally:
+        with app.app_context():
+            for month in (expired, archived):
+                db.session.execute(text(f'DROP TABLE IF EXISTS {partition_name(month)}'))
+            db.session.commit()
+
+
+def test_ids_of_rotated_rows_are_not_handed_out_again(client):
+    archived = add_months(month_start(date.today()), -2)
+    try:
+        with app.app_context():
+            user, team = team_with_admin()
+            db.session.add_all([Activity(team_id=team.id, user_id=user.id, action='upload_file',
+                                         created_at=at(archived, day)) for day in (1, 2, 3)])
+            db.session.commit()
+            team_id, user_id = team.id, user.id
+            highest = db.session.query(db.func.max(Activity.id)).scalar()
+            db.session.close()
+
+            activity_storage.maintain(today=date.today(), keep_months=0)
+            assert Activity.query.count() == 0
+            fresh = Activity(team_id=team_id, user_id=user_id, action='upload_file')
+            db.session.add(fresh)
+            db.session.commit()
+            assert fresh.id > highest
+    finally:
+        with app.app_context():
+            db.session.execute(text(f'DROP TABLE IF EXISTS {partition_name(archived)}'))
+            db.session.commit()
@@ -0,0 +1,59 @@
+import gzip
+import shutil
+
+from flask import url_for
+
+import assets
+from app import app
+
+
+def built_static(tmp_path):
+    static = tmp_path / 'static'
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns('dist'))
+    return static, assets.build(str(static))
+
+
+def test_build_hashes_contents_and_writes_variants(tmp_path):
+    static, manifest = built_static(tmp_path)
+    hashed = manifest['assets']['css/style.css']
+    assert hashed.startswith('dist/css/style.') and hashed.endswith('.css')
+    original = (static / 'css' / 'style.css').read_bytes()
+    assert (static / hashed).read_bytes() == original
+    assert gzip.decompress((static / (hashed + '.gz')).read_bytes()) == original
+
+    # Same contents, same names; a change gets a new name and version
+    assert assets.build(str(static)) == manifest
+    (static / 'js' / 'main.js').write_text('console.log(1);')
+    rebuilt = assets.build(str(static))
+    assert rebuilt['assets']['js/main.js'] != manifest['assets']['js/main.js']
+    assert rebuilt['version'] != manifest['version']
+    assert assets.load(str(static)) == rebuilt
+
+
+def test_hashed_assets_are_linked_and_served_immutable(client, tmp_path, monkeypatch):
+    static, manifest = built_static(tmp_path)
+    monkeypatch.setattr(app, 'static_folder', str(static))
+    monkeypatch.setattr(assets, 'manifest', manifest)
+
+    with app.test_request_context():
+        url = url_for('static', filename='css/style.css')
+        assert url == '/static/' + manifest['assets']['css/style.css']
+        assert url_for('static', filename='manifest.json') == '/static/manifest.json'
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Accept-Encoding' in response.headers['Vary'] and 'Set-Cookie' not in response.headers
+    assert gzip.decompress(response.data) == (static / 'css' / 'style.css').read_bytes()
+    response.close()
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == (static / 'css' / 'style.css').read_bytes()
+    response.close()
+
+    # Unhashed files and the manifest keep Flask's default caching
+    response = client.get('/static/dist/assets.json')
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    response.close()
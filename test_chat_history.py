@@ -0,0 +1,107 @@
+import secrets
+from datetime import datetime, timedelta
+
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import User, Team, TeamMember, Message, Activity
+
+
+def make_chat(size):
+    """A team with ``size`` messages from different senders, one minute apart"""
+    owner, team = team_with_admin()
+    start = datetime(2026, 1, 1)
+    previous = None
+    for i in range(size):
+        sender = User.create_user(f'member_{secrets.token_hex(4)}', 'password123')
+        db.session.add(sender)
+        db.session.flush()
+        previous = Message(content=f'message {i}', team_id=team.id, sender_id=sender.id,
+                           created_at=start + timedelta(minutes=i), reply_to=previous)
+        db.session.add(previous)
+    owner.mode_preference = 'team'
+    db.session.commit()
+    return owner, team
+
+
+def test_history_pages_back_by_cursor(client):
+    with app.app_context():
+        owner, team = make_chat(7)
+        Message.query.filter_by(team_id=team.id, content='message 5').one().is_deleted = True
+        db.session.commit()
+        login(client, owner)
+        url = f'/api/teams/{team.id}/chat/messages'
+
+    pages, cursor = [], None
+    while True:
+        with assert_max_queries(5):
+            data = client.get(url, query_string={'limit': 3, **({'before': cursor} if cursor else {})}).get_json()
+        pages.append([message['content'] for message in data['messages']])
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert pages == [
+        ['message 3', 'message 4', 'message 6'],
+        ['message 0', 'message 1', 'message 2'],
+    ]
+    assert 'message 2' in data['html']
+
+    assert client.get(url, query_string={'before': 'not-a-cursor'}).status_code == 400
+
+
+def test_chat_page_renders_only_the_latest_page(client):
+    with app.app_context():
+        owner, team = make_chat(60)
+        login(client, owner)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+    html = client.get('/chat').get_data(as_text=True)
+    assert 'message 59' in html and 'message 10' in html
+    assert 'message 9<' not in html
+    assert 'data-next-cursor=""' not in html
+
+
+def test_send_is_one_transaction_and_idempotent(client):
+    with app.app_context():
+        owner, team = make_chat(0)
+        login(client, owner)
+        url = f'/api/teams/{team.id}/chat/messages'
+        team_id = team.id
+
+    headers = {'Idempotency-Key': 'key-1'}
+    # Includes BEGIN for the reads, then COMMIT and BEGIN IMMEDIATE at the first write
+    with assert_max_queries(12) as statements:
+        first = client.post(url, json={'content': 'hello'}, headers=headers)
+    assert first.status_code == 201
+    assert sum(statement.startswith('BEGIN IMMEDIATE') for statement in statements) == 1
+    assert 'hello' in first.get_json()['html']
+
+    retry = client.post(url, json={'content': 'hello'}, headers=headers)
+    assert retry.status_code == 200
+    assert retry.get_json()['message']['id'] == first.get_json()['message']['id']
+
+    assert client.post(url, json={'content': '  '}).status_code == 400
+    assert client.post(url, json={'content': 'hi', 'reply_to_id': 999999}).status_code == 400
+
+    with app.app_context():
+        assert Message.query.filter_by(team_id=team_id).count() == 1
+        assert Activity.query.filter_by(team_id=team_id, action='send_message').count() == 1
+
+
+def test_same_key_in_another_team_is_a_new_message(client):
+    with app.app_context():
+        owner, first = make_chat(0)
+        second = Team(name='Second Team', invite_code=secrets.token_urlsafe(8), created_by=owner.id)
+        db.session.add(second)
+        db.session.flush()
+        db.session.add(TeamMember(team_id=second.id, user_id=owner.id, role='admin'))
+        db.session.commit()
+        team_ids = [first.id, second.id]
+        login(client, owner)
+
+    headers = {'Idempotency-Key': 'shared-key'}
+    ids = []
+    for team_id in team_ids:
+        response = client.post(f'/api/teams/{team_id}/chat/messages', json={'content': 'hi'}, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.get_json()['message']['id'])
+    assert ids[0] != ids[1]
@@ -0,0 +1,50 @@
+import versions
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import User, File
+
+
+def test_repeat_dashboard_loads_are_served_from_cache(client):
+    with app.app_context():
+        user, team = team_with_admin('Panel Team')
+        team_id, user_id = team.id, user.id
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team_id
+
+    assert client.get('/dashboard').status_code == 200
+    # Only the counter lookup behind the ETag (and its BEGIN)
+    with assert_max_queries(2):
+        assert 'Panel Team' in client.get('/dashboard').get_data(as_text=True)
+
+    # A write to the team moves its version on and the panels are rebuilt
+    before = versions.cached('team', team_id)
+    response = client.post(f'/api/teams/{team_id}/chat/messages', json={'content': 'fresh news'})
+    assert response.status_code == 201
+    assert 'fresh news' in client.get('/dashboard').get_data(as_text=True)
+    with app.app_context():
+        assert versions.current('team', team_id) == before + 1
+
+        db.session.add(File(filename='f', original_filename='report.pdf', file_path='uploads/f',
+                            file_size=2048, file_type='document', mime_type='application/pdf',
+                            team_id=team_id, uploaded_by=user_id))
+        db.session.commit()
+    assert 'report.pdf' in client.get('/dashboard').get_data(as_text=True)
+
+
+def test_dashboard_panels_endpoint(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        outsider, _ = team_with_admin()
+        team_id, user_id = team.id, user.id
+        login(client, outsider)
+    url = f'/api/teams/{team_id}/dashboard'
+    assert client.get(url).status_code == 403
+
+    with app.app_context():
+        login(client, db.session.get(User, user_id))
+    data = client.get(url).get_json()
+    assert data['success'] and set(data['panels']) == set(data['html']) == {'files', 'members', 'activities', 'messages'}
+    assert [member['role'] for member in data['panels']['members']] == ['admin']
+    with assert_max_queries(2):
+        assert client.get(url).get_json()['version'] == data['version']
@@ -0,0 +1,109 @@
+import io
+import secrets
+
+import pytest
+from PIL import Image
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+import thumbnails
+from app import app, db
+from conftest import login
+from models import User, File, FileVersion
+
+
+def make_file(path, file_type, mime_type):
+    user = User.create_user(f'user_{secrets.token_hex(4)}', 'password123')
+    db.session.add(user)
+    db.session.flush()
+    file = File(filename=path.name, original_filename=path.name, file_path=str(path),
+                file_size=path.stat().st_size, file_type=file_type, mime_type=mime_type,
+                uploaded_by=user.id)
+    db.session.add(file)
+    db.session.commit()
+    return user, file
+
+
+def test_versioned_downloads_are_immutable(client, tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('hello')
+    with app.app_context():
+        user, file = make_file(path, 'text', 'text/plain')
+        file_id, tag = file.id, file.content_tag
+        login(client, user)
+
+    response = client.get(f'/download/{file_id}', query_string={'v': tag})
+    assert response.data == b'hello'
+    assert response.headers['Cache-Control'] == 'private, max-age=31536000, immutable'
+    etag = response.headers['ETag']
+
+    # Unversioned or outdated URLs are revalidated by ETag
+    response = client.get(f'/download/{file_id}', query_string={'v': 'old'})
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    assert client.get(f'/download/{file_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.get(File, file_id).original_filename = 'renamed.txt'
+        db.session.commit()
+        assert db.session.get(File, file_id).content_tag != tag
+
+
+def test_thumbnails_are_made_once_per_version(client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    path = tmp_path / 'photo.png'
+    Image.new('RGBA', (1024, 512), (255, 0, 0, 128)).save(path)
+    with app.app_context():
+        user, file = make_file(path, 'image', 'image/png')
+        file_id, tag = file.id, file.content_tag
+        login(client, user)
+
+    response = client.get(f'/file/{file_id}/thumbnail', query_string={'v': tag})
+    assert response.mimetype == 'image/jpeg' and 'immutable' in response.headers['Cache-Control']
+    assert Image.open(io.BytesIO(response.data)).size == (thumbnails.SIZE[0], thumbnails.SIZE[1] // 2)
+    response.close()
+    assert [p.name for p in (tmp_path / 'thumbnails').iterdir()] == [f'{file_id}-{tag}.jpg']
+
+
+def test_thumbnails_that_cannot_be_made_leave_nothing_behind(client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+    path = tmp_path / 'photo.png'
+    Image.new('RGB', (64, 64)).save(path)
+    with app.app_context():
+        user, file = make_file(path, 'image', 'image/png')
+
+        # Far more pixels than allowed: Pillow refuses to decode it
+        monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 64)
+        assert thumbnails.path_for(file) is None
+        monkeypatch.undo()
+        monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(tmp_path))
+
+        def full_disk(src, dst):
+            raise OSError('No space left on device')
+        monkeypatch.setattr(thumbnails.os, 'replace', full_disk)
+        assert thumbnails.path_for(file) is None
+    assert list((tmp_path / 'thumbnails').iterdir()) == []
+
+
+def test_service_worker_may_control_the_whole_site(client):
+    response = client.get('/static/sw.js', query_string={'v': 'dev'})
+    assert response.headers['Service-Worker-Allowed'] == '/'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    response.close()
+
+
+def test_version_numbers_come_from_the_committed_row(client, tmp_path):
+    path = tmp_path / 'notes.txt'
+    path.write_text('hello')
+    with app.app_context():
+        user, file = make_file(path, 'text', 'text/plain')
+        assert file.version == 1
+        # Another request's edit, committed after this one loaded the file
+        db.session.execute(update(File.__table__).where(File.__table__.c.id == file.id).values(version=5))
+        assert file.version == 1 and file.next_version() == 6 and file.version == 6
+
+        db.session.add(FileVersion(file_id=file.id, version_number=6, content='a', created_by=user.id))
+        db.session.commit()
+        db.session.add(FileVersion(file_id=file.id, version_number=6, content='b', created_by=user.id))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
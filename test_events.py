@@ -0,0 +1,85 @@
+import json
+
+import events
+from app import app, db
+from conftest import login, team_with_admin
+from models import User, Message
+
+
+def test_message_changes_are_published_after_commit(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        subscription = events.broker.subscribe(events.team_channel(team.id, 'chat'))
+        try:
+            message = Message(content='hello', team_id=team.id, sender_id=user.id)
+            db.session.add(message)
+            db.session.flush()
+            assert subscription.get(timeout=0) is None
+            db.session.commit()
+            created = subscription.get(timeout=1)
+            assert created['type'] == 'message.created'
+            assert created['data']['content'] == 'hello'
+            assert created['data']['sender_name'] == user.display_name
+
+            message.content = 'discarded'
+            db.session.flush()
+            db.session.rollback()
+            assert subscription.get(timeout=0) is None
+
+            message.is_deleted = True
+            db.session.commit()
+            assert subscription.get(timeout=1) == {
+                'id': None, 'type': 'message.deleted', 'data': {'id': message.id, 'team_id': team.id}
+            }
+        finally:
+            subscription.close()
+
+
+def test_chat_event_stream(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        outsider, _ = team_with_admin()
+        team_id, user_id = team.id, user.id
+        login(client, outsider)
+    assert client.get(f'/api/teams/{team_id}/chat/events').status_code == 403
+
+    with app.app_context():
+        login(client, db.session.get(User, user_id))
+    response = client.get(f'/api/teams/{team_id}/chat/events')
+    assert response.mimetype == 'text/event-stream'
+    body = (chunk.decode() for chunk in response.response)
+    assert next(body).startswith('retry:')
+
+    events.publish(events.team_channel(team_id, 'chat'), 'message.created', {'id': 7})
+    frame = next(body)
+    assert frame.startswith('event: message.created\n')
+    assert json.loads(frame.split('data: ', 1)[1]) == {'id': 7}
+
+    channel = events.team_channel(team_id, 'chat')
+    assert events.broker.subscriber_count(channel) == 1
+    response.close()
+    assert events.broker.subscriber_count(channel) == 0
+
+
+def test_streams_over_the_worker_cap_are_turned_away(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SSE_MAX_STREAMS', 1)
+    with app.app_context():
+        user, team = team_with_admin()
+        team_id = team.id
+        login(client, user)
+    url = f'/api/teams/{team_id}/chat/events'
+    channel = events.team_channel(team_id, 'chat')
+
+    first = client.get(url)
+    assert first.status_code == 200
+    busy = client.get(url)
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == '10'
+    assert busy.get_data(as_text=True).startswith('retry: 10000')
+    assert events.broker.subscriber_count(channel) == 1
+
+    first.close()
+    again = client.get(url)
+    assert again.status_code == 200
+    again.close()
+    assert events.stream_slots.open == 0
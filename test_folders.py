@@ -0,0 +1,120 @@
+from sqlalchemy.dialects import postgresql
+
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import Folder
+
+
+def make_chain(team, user, depth, parent=None):
+    folders = []
+    for i in range(depth):
+        parent = Folder(name=f'level-{i}', team_id=team.id, created_by=user.id, parent=parent)
+        db.session.add(parent)
+        folders.append(parent)
+    db.session.commit()
+    return folders
+
+
+def test_paths_follow_create_and_move(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        a, b, c = make_chain(team, user, 3)
+        other, = make_chain(team, user, 1)
+        assert c.path == f'/{a.id}/{b.id}/'
+        assert [f.id for f in c.ancestors()] == [a.id, b.id]
+        assert {f.id for f in a.descendants()} == {b.id, c.id}
+
+        b.parent_id = other.id
+        db.session.commit()
+        assert c.path == f'/{other.id}/{b.id}/'
+        assert a.descendants().count() == 0
+        assert {f.id for f in other.descendants()} == {b.id, c.id}
+
+
+def test_subtree_ranges_do_not_mix_up_ids_sharing_digits(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        # Under a locale collation '/1/17/' sorts after '/170' and fell outside /1/
+        top = Folder(id=1, name='one', team_id=team.id, created_by=user.id)
+        db.session.add(top)
+        db.session.flush()
+        child = Folder(id=17, name='seventeen', team_id=team.id, created_by=user.id, parent_id=1)
+        db.session.add(child)
+        db.session.flush()
+        db.session.add_all([
+            Folder(id=170, name='hundred-seventy', team_id=team.id, created_by=user.id, parent_id=17),
+            Folder(id=2, name='two', team_id=team.id, created_by=user.id),
+        ])
+        db.session.commit()
+        assert {f.id for f in top.descendants()} == {17, 170}
+
+        child.parent_id = 2
+        db.session.commit()
+        assert db.session.get(Folder, 170).path == '/2/17/'
+        assert top.descendants().count() == 0
+
+    column = Folder.__table__.c.path
+    assert 'COLLATE "C"' in str(column.type.compile(dialect=postgresql.dialect()))
+
+
+def test_breadcrumbs_cost_the_same_at_any_depth(client):
+    counts = []
+    for depth in (2, 15):
+        with app.app_context():
+            user, team = team_with_admin()
+            leaf_id = make_chain(team, user, depth)[-1].id
+            login(client, user)
+            with client.session_transaction() as sess:
+                sess['current_team_id'] = team.id
+        with assert_max_queries(10) as statements:
+            response = client.get(f'/files?folder={leaf_id}')
+        assert response.status_code == 200
+        assert f'level-{depth - 1}' in response.get_data(as_text=True)
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_move_route_rejects_cycles(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        a, b = make_chain(team, user, 2)
+        a_id, b_id = a.id, b.id
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+
+    client.post(f'/folder/{a_id}/move', data={'parent_id': b_id})
+    client.post(f'/folder/{a_id}/rename', data={'name': 'renamed'})
+    with app.app_context():
+        a, b = db.session.get(Folder, a_id), db.session.get(Folder, b_id)
+        assert a.parent_id is None and a.name == 'renamed'
+        assert b.path == f'/{a_id}/'
+
+
+def test_folder_tree_api_and_etag(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        a, b, c = make_chain(team, user, 3)
+        make_chain(team, user, 1)
+        a_id = a.id
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+
+    response = client.get('/api/folders/tree')
+    folders = response.get_json()['folders']
+    assert [(f['name'], f['child_count']) for f in folders] == [('level-0', 1), ('level-0', 0)]
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    etag = response.headers['ETag']
+
+    children = client.get(f'/api/folders/tree?parent={a_id}').get_json()['folders']
+    assert [(f['name'], f['child_count']) for f in children] == [('level-1', 1)]
+
+    assert client.get('/api/folders/tree', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/create_folder', data={'name': 'new', 'parent_id': a_id})
+    response = client.get('/api/folders/tree', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert client.get('/api/folders/tree?parent=999999').status_code == 404
+
+    page = client.get(f'/upload?folder={a_id}').get_data(as_text=True)
+    assert 'data-folder-tree-url' in page and 'level-0' in page
@@ -0,0 +1,117 @@
+from flask_login import login_user
+
+import http_cache
+import versions
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import File, FileVersion, Folder
+
+
+def make_team():
+    user, team = team_with_admin()
+    file = File(filename='n', original_filename='notes.txt', file_path='uploads/n',
+                file_size=5, file_type='text', mime_type='text/plain',
+                team_id=team.id, uploaded_by=user.id)
+    db.session.add(file)
+    db.session.flush()
+    db.session.add(FileVersion(file_id=file.id, version_number=1, content='hello', created_by=user.id))
+    db.session.commit()
+    return user, team, file
+
+
+def test_unchanged_pages_revalidate_with_one_counter_lookup(client):
+    with app.app_context():
+        user, team, _ = make_team()
+        team_id = team.id
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team_id
+
+    for url in ('/files', '/dashboard', f'/team/{team_id}/settings', f'/api/teams/{team_id}/dashboard'):
+        response = client.get(url)
+        etag = response.headers['ETag']
+        assert etag.startswith('W/') and response.headers['Cache-Control'] == 'private, no-cache'
+
+        with assert_max_queries(2) as statements:
+            response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 304 and not response.data
+        selects = [statement for statement in statements if statement != 'BEGIN']
+        assert len(selects) == 1 and 'FROM change_counters' in selects[0]
+
+    # Another URL of the same page is a different response
+    response = client.get('/files?sort=name', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+
+def test_file_page_changes_with_a_new_version(client):
+    with app.app_context():
+        user, _, file = make_team()
+        file_id, user_id = file.id, user.id
+        login(client, user)
+
+    url = f'/file/{file_id}'
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.add(FileVersion(file_id=file_id, version_number=2, content='hello again',
+                                   created_by=user_id))
+        db.session.commit()
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and 'hello again' in response.get_data(as_text=True)
+    assert response.headers['ETag'] != etag
+
+    # Error responses are never validated
+    assert 'ETag' not in client.get('/file/999999').headers
+
+
+def test_another_workers_change_is_seen_at_once(client):
+    with app.app_context():
+        user, team, _ = make_team()
+        team_id = team.id
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team_id
+
+    etag = client.get('/files').headers['ETag']
+    with app.app_context():
+        # Committed elsewhere: this process's cached version is now stale
+        with db.engine.begin() as conn:
+            versions.bump(conn, 'folders', [team_id])
+        assert versions.cache.get(('folders', team_id)) is not None
+    assert client.get('/files', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_file_page_changes_with_its_folder(client):
+    with app.app_context():
+        user, team, file = make_team()
+        folder = Folder(name='Drafts', team_id=team.id, created_by=user.id)
+        db.session.add(folder)
+        db.session.flush()
+        file.folder_id = folder.id
+        db.session.commit()
+        file_id, folder_id = file.id, folder.id
+        login(client, user)
+
+    url = f'/file/{file_id}'
+    etag = client.get(url).headers['ETag']
+    with app.app_context():
+        db.session.get(Folder, folder_id).name = 'Final'
+        db.session.commit()
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and 'Final' in response.get_data(as_text=True)
+
+
+def test_non_members_are_refused_even_with_a_matching_etag(client):
+    with app.app_context():
+        _, team, _ = make_team()
+        outsider, _, _ = make_team()
+        team_id = team.id
+        login(client, outsider)
+        url = f'/api/teams/{team_id}/dashboard'
+        # ETags are not secrets: the one the outsider would get as a member
+        with app.test_request_context(url):
+            login_user(outsider)
+            etag = http_cache.make_etag([('team', team_id)])
+    response = client.get(url, headers={'If-None-Match': f'W/"{etag}"'})
+    assert response.status_code == 403
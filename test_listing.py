@@ -0,0 +1,70 @@
+import pytest
+
+from app import app, db
+from conftest import login, team_with_admin
+from models import File, Folder
+import pagination
+
+
+def make_team(file_count=0, folder_count=0):
+    user, team = team_with_admin()
+    for i in range(folder_count):
+        db.session.add(Folder(name=f'folder-{i:02d}', team_id=team.id, created_by=user.id))
+    for i in range(file_count):
+        db.session.add(File(
+            filename=f'f{i}', original_filename=f'file-{i:03d}.txt', file_path=f'uploads/f{i}',
+            file_size=i % 7, file_type='text', mime_type='text/plain',
+            team_id=team.id, uploaded_by=user.id
+        ))
+    db.session.commit()
+    return user, team
+
+
+def walk(team, user, sort, order, limit):
+    folders, files, cursor = [], [], None
+    while True:
+        page = pagination.list_directory(team.id, user.id, None, sort=sort, order=order,
+                                         cursor=cursor, limit=limit)
+        folders += page.folders
+        files += page.files
+        cursor = page.next_cursor
+        if not cursor:
+            return folders, files
+
+
+def test_keyset_pages_cover_listing_in_order(client):
+    with app.app_context():
+        user, team = make_team(file_count=23, folder_count=5)
+        for sort, order in [('name', 'asc'), ('size', 'desc'), ('updated_at', 'desc'), ('type', 'asc')]:
+            folders, files = walk(team, user, sort, order, limit=4)
+            assert [f.name for f in folders] == [f'folder-{i:02d}' for i in range(5)]
+            column = pagination.FILE_SORT_KEYS[sort].key
+            expected = sorted(File.query.filter_by(team_id=team.id).all(),
+                              key=lambda f: (getattr(f, column), f.id), reverse=(order == 'desc'))
+            assert [f.id for f in files] == [f.id for f in expected]
+
+
+def test_cursor_must_match_sort(client):
+    with app.app_context():
+        user, team = make_team(file_count=3)
+        page = pagination.list_directory(team.id, user.id, sort='name', limit=1)
+        with pytest.raises(pagination.InvalidCursor):
+            pagination.list_directory(team.id, user.id, sort='size', cursor=page.next_cursor)
+
+
+def test_listing_api(client):
+    with app.app_context():
+        user, team = make_team(file_count=5)
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+
+    data = client.get('/api/files?sort=name&limit=3').get_json()
+    assert [f['name'] for f in data['files']] == ['file-000.txt', 'file-001.txt', 'file-002.txt']
+    data = client.get(f"/api/files?sort=name&limit=3&cursor={data['next_cursor']}").get_json()
+    assert [f['name'] for f in data['files']] == ['file-003.txt', 'file-004.txt']
+    assert data['next_cursor'] is None
+    assert 'file-004.txt' in data['html']
+
+    assert client.get('/files?sort=size').status_code == 200
+    assert client.get('/api/files?cursor=garbage').status_code == 400
@@ -0,0 +1,61 @@
+import secrets
+
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import User, TeamMember
+import memberships
+
+
+def make_team():
+    admin, team = team_with_admin()
+    member = User.create_user(f'member_{secrets.token_hex(4)}', 'password123')
+    db.session.add(member)
+    db.session.flush()
+    db.session.add(TeamMember(team_id=team.id, user_id=member.id, role='viewer'))
+    db.session.commit()
+    return admin, member, team
+
+
+def test_lookups_are_cached_per_request_and_process(client):
+    with app.app_context():
+        admin, member, team = make_team()
+        team_id, member_id = team.id, member.id
+
+    with app.test_request_context():
+        assert memberships.role(team_id, member_id) == 'viewer'
+        with assert_max_queries(0):
+            assert memberships.role(team_id, member_id) == 'viewer'
+    with app.test_request_context():
+        with assert_max_queries(0):
+            assert memberships.role(team_id, member_id) == 'viewer'
+    stats = memberships.cache.stats()
+    assert stats['hits'] >= 1 and stats['hit_rate'] > 0
+
+
+def test_role_change_and_join_invalidate(client):
+    with app.app_context():
+        admin, member, team = make_team()
+        outsider = User.create_user(f'out_{secrets.token_hex(4)}', 'password123')
+        db.session.add(outsider)
+        db.session.commit()
+        team_id, member_id, outsider_id, invite_code = team.id, member.id, outsider.id, team.invite_code
+        assert memberships.get(team_id, outsider_id) is None
+        assert memberships.role(team_id, member_id) == 'viewer'
+        login(client, admin)
+
+    client.post(f'/team/{team_id}/change_role/{member_id}', data={'role': 'editor'})
+    with app.app_context():
+        assert memberships.role(team_id, member_id) == 'editor'
+
+    with app.app_context():
+        login(client, db.session.get(User, outsider_id))
+    client.post('/join_team', data={'invite_code': invite_code})
+    with app.app_context():
+        assert memberships.role(team_id, outsider_id) == 'editor'
+
+    stats = client.get('/api/cache/stats').get_json()['caches']['memberships']
+    assert stats['hits'] + stats['misses'] > 0
+
+    # Process-wide numbers are not for every logged-in user in production
+    app.config['TESTING'] = False
+    assert client.get('/api/cache/stats').status_code == 404
@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app import app, db
+import migrations
+
+
+def test_upgrade_applies_each_revision_once(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path / "fresh.db"}')
+    with app.app_context():
+        revisions = [module.revision for module in migrations.load_revisions()]
+        assert migrations.upgrade(engine) == revisions
+        assert migrations.upgrade(engine) == []
+        assert all(applied for _, _, applied in migrations.status(engine))
+
+    inspector = inspect(engine)
+    assert 'files_trgm' in inspector.get_table_names()
+    assert 'ix_files_listing_updated' in {ix['name'] for ix in inspector.get_indexes('files')}
+    assert 'ix_messages_team_created' in {ix['name'] for ix in inspector.get_indexes('messages')}
+    assert 'ix_activities_team_created' in {ix['name'] for ix in inspector.get_indexes('activities')}
+    assert 'ix_team_members_user' in {ix['name'] for ix in inspector.get_indexes('team_members')}
+
+
+def test_upgrade_adopts_existing_database(tmp_path):
+    # Databases created by the old create_all() at boot have tables but no history,
+    # and folders from before materialized paths
+    engine = create_engine(f'sqlite:///{tmp_path / "legacy.db"}')
+    with app.app_context():
+        db.metadata.create_all(engine, tables=[t for t in db.metadata.sorted_tables
+                                               if t is not migrations.schema_migrations])
+        with engine.begin() as conn:
+            conn.execute(text('DROP INDEX ix_folders_path'))
+            conn.execute(text('DROP INDEX ux_file_versions_number'))
+            # Activities from before AUTOINCREMENT, rotated up to id 7
+            conn.execute(text('DROP TABLE activities'))
+            conn.execute(text('CREATE TABLE activities (id INTEGER PRIMARY KEY, team_id INTEGER NOT NULL, '
+                              'user_id VARCHAR NOT NULL, action VARCHAR(50) NOT NULL, target_type VARCHAR(20), '
+                              'target_id INTEGER, description VARCHAR(255), created_at DATETIME)'))
+            conn.execute(text("INSERT INTO activities (id, team_id, user_id, action) VALUES (3, 1, 'u', 'join')"))
+            conn.execute(text('CREATE TABLE activities_202001 (id INTEGER PRIMARY KEY, team_id INTEGER, '
+                              'user_id VARCHAR, action VARCHAR(50), target_type VARCHAR(20), target_id INTEGER, '
+                              'description VARCHAR(255), created_at DATETIME)'))
+            conn.execute(text("INSERT INTO activities_202001 (id, team_id, user_id, action) VALUES (7, 1, 'u', 'join')"))
+            # Two edits that once raced to the same version number
+            conn.execute(text("INSERT INTO files (id, filename, original_filename, file_path, file_size, "
+                              "file_type, mime_type, uploaded_by, version) "
+                              "VALUES (1, 'n', 'n.txt', 'n', 1, 'text', 'text/plain', 'u', 2)"))
+            conn.execute(text("INSERT INTO file_versions (id, file_id, version_number, created_by) "
+                              "VALUES (1, 1, 1, 'u'), (2, 1, 2, 'u'), (3, 1, 2, 'u')"))
+            conn.execute(text('ALTER TABLE folders DROP COLUMN path'))
+            conn.execute(text(
+                "INSERT INTO folders (id, name, team_id, parent_id, created_by) VALUES "
+                "(1, 'a', 1, NULL, 'u'), (2, 'b', 1, 1, 'u'), (3, 'c', 1, 2, 'u')"
+            ))
+        assert migrations.upgrade(engine) == [module.revision for module in migrations.load_revisions()]
+
+    with engine.connect() as conn:
+        paths = dict(conn.execute(text('SELECT name, path FROM folders')).all())
+    assert paths == {'a': '/', 'b': '/1/', 'c': '/1/2/'}
+    with engine.connect() as conn:
+        numbers = conn.execute(text('SELECT version_number FROM file_versions ORDER BY id')).scalars().all()
+        assert numbers == [1, 2, 3]
+        assert conn.execute(text('SELECT version FROM files')).scalar() == 3
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM activities'))
+        conn.execute(text("INSERT INTO activities (team_id, user_id, action) VALUES (1, 'u', 'join')"))
+        assert conn.execute(text('SELECT id FROM activities')).scalar() == 8
+        assert {ix['name'] for ix in inspect(conn).get_indexes('activities')} >= {'ix_activities_team_id'}
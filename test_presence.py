@@ -0,0 +1,57 @@
+import time
+
+import events
+import presence
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import User
+
+
+def test_local_store_expires_entries():
+    store = presence.LocalStore()
+    assert store.touch('typing', 1, 'a', ttl=0.05)
+    assert not store.touch('typing', 1, 'a', ttl=0.05)
+    assert store.touch('typing', 1, 'b', ttl=10)
+    assert store.members('typing', 1) == ['a', 'b']
+    time.sleep(0.06)
+    assert store.members('typing', 1) == ['b']
+    assert store.remove('typing', 1, 'b') and not store.remove('typing', 1, 'b')
+
+
+def test_bursts_are_coalesced_to_one_event_per_interval():
+    sent = []
+    coalescer = presence.Coalescer(sent.append, interval=0.2)
+    for i in range(10):
+        coalescer.submit('user', i)
+    assert sent == [0]
+    time.sleep(0.3)
+    # The burst's last state follows once the interval is over
+    assert sent == [0, 9]
+
+
+def test_presence_endpoints_push_without_database_writes(client):
+    with app.app_context():
+        user, team = team_with_admin()
+        outsider, _ = team_with_admin()
+        team_id, user_id = team.id, user.id
+        login(client, outsider)
+    url = f'/api/teams/{team_id}/presence'
+    assert client.post(url, json={'typing': True}).status_code == 403
+
+    with app.app_context():
+        login(client, db.session.get(User, user_id))
+    subscription = events.broker.subscribe(events.team_channel(team_id, 'chat'))
+    try:
+        with assert_max_queries(5) as statements:
+            assert client.post(url, json={'typing': True}).get_json()['success']
+        assert not any(statement.startswith(('INSERT', 'UPDATE', 'DELETE')) for statement in statements)
+        assert subscription.get(timeout=1) == {
+            'id': None, 'type': 'presence', 'data': {'user_id': user_id, 'online': True, 'typing': True}
+        }
+        assert client.get(url).get_json() == {'success': True, 'online': [user_id], 'typing': [user_id]}
+
+        client.post(url, json={'online': False})
+        assert client.get(url).get_json()['online'] == []
+        assert subscription.get(timeout=2)['data'] == {'user_id': user_id, 'online': False, 'typing': False}
+    finally:
+        subscription.close()
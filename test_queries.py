@@ -0,0 +1,50 @@
+import secrets
+
+import pytest
+
+from app import app, db
+from conftest import login, assert_max_queries, team_with_admin
+from models import User, TeamMember, File, Folder, Message, Activity
+
+
+def make_busy_team(size):
+    """A team where every row has a different author, half of whom have left"""
+    owner, team = team_with_admin()
+    for i in range(size):
+        member = User.create_user(f'member_{secrets.token_hex(4)}', 'password123')
+        db.session.add(member)
+        db.session.flush()
+        if i % 2:
+            db.session.add(TeamMember(team_id=team.id, user_id=member.id, role='editor'))
+        db.session.add_all([
+            Folder(name=f'folder-{i}', team_id=team.id, created_by=member.id),
+            File(filename=f'f{i}', original_filename=f'file-{i}.txt', file_path=f'uploads/f{i}',
+                 file_size=1, file_type='text', mime_type='text/plain',
+                 team_id=team.id, uploaded_by=member.id),
+            Message(content=f'hello {i}', team_id=team.id, sender_id=member.id),
+            Activity(team_id=team.id, user_id=member.id, action='upload_file',
+                     description=f'uploaded file-{i}.txt'),
+        ])
+    owner.mode_preference = 'team'
+    db.session.commit()
+    return owner, team
+
+
+def count_queries(client, url):
+    with assert_max_queries(20) as statements:
+        assert client.get(url).status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize('url', ['/dashboard', '/chat', '/files', '/team/{team_id}/settings'])
+def test_pages_render_in_constant_queries(client, url):
+    counts = []
+    for size in (2, 12):
+        with app.app_context():
+            owner, team = make_busy_team(size)
+            login(client, owner)
+            with client.session_transaction() as sess:
+                sess['current_team_id'] = team.id
+            url_for_team = url.format(team_id=team.id)
+        counts.append(count_queries(client, url_for_team))
+    assert counts[0] == counts[1]
@@ -0,0 +1,81 @@
+import secrets
+
+from app import app, db
+from conftest import login, assert_max_queries
+from models import User, Team, TeamMember, Message, Activity, ReadMarker
+
+
+def make_user():
+    user = User.create_user(f'user_{secrets.token_hex(4)}', 'password123')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def make_team(owner, *members):
+    team = Team(name='Reading Team', invite_code=secrets.token_urlsafe(8), created_by=owner.id)
+    db.session.add(team)
+    db.session.flush()
+    for user in (owner,) + members:
+        db.session.add(TeamMember(team_id=team.id, user_id=user.id, role='editor'))
+    db.session.commit()
+    return team
+
+
+def unread(user_id, team_id):
+    marker = db.session.get(ReadMarker, (user_id, team_id))
+    db.session.refresh(marker)
+    return marker.unread_messages, marker.unread_activities
+
+
+def test_counters_follow_messages_activities_and_markers(client):
+    with app.app_context():
+        alice, bob = make_user(), make_user()
+        team = make_team(alice, bob)
+        messages = [Message(content=f'hi {i}', team_id=team.id, sender_id=alice.id) for i in range(3)]
+        db.session.add_all(messages)
+        db.session.add(Activity(team_id=team.id, user_id=alice.id, action='upload_file'))
+        db.session.commit()
+        assert unread(bob.id, team.id) == (3, 1)
+        assert unread(alice.id, team.id) == (0, 0)
+
+        # Deleting an unread message takes it off the count
+        messages[2].is_deleted = True
+        db.session.commit()
+        assert unread(bob.id, team.id) == (2, 1)
+
+        # A late joiner starts with everything read
+        carol = make_user()
+        db.session.add(TeamMember(team_id=team.id, user_id=carol.id, role='viewer'))
+        db.session.commit()
+        assert unread(carol.id, team.id) == (0, 0)
+
+        team_id, first_id, bob_id = team.id, messages[0].id, bob.id
+        login(client, bob)
+
+    response = client.post(f'/api/teams/{team_id}/read', json={'message_id': first_id})
+    assert response.get_json()['unread']['messages'] == 1
+    assert response.get_json()['unread']['last_read_message_id'] == first_id
+    # Markers never move back
+    response = client.post(f'/api/teams/{team_id}/read', json={'message_id': first_id - 1})
+    assert response.get_json()['unread']['last_read_message_id'] == first_id
+    assert client.post(f'/api/teams/{team_id}/read', json={'message_id': 'x'}).status_code == 400
+
+    with app.app_context():
+        assert unread(bob_id, team_id) == (1, 1)
+
+
+def test_unread_counts_for_all_teams_in_one_query(client):
+    with app.app_context():
+        reader, writer = make_user(), make_user()
+        teams = [make_team(writer, reader) for _ in range(3)]
+        for i, team in enumerate(teams):
+            db.session.add_all(Message(content='hello', team_id=team.id, sender_id=writer.id) for _ in range(i))
+        db.session.commit()
+        expected = {str(team.id): i for i, team in enumerate(teams)}
+        login(client, reader)
+
+    with assert_max_queries(3) as statements:
+        data = client.get('/api/unread').get_json()
+    assert {team_id: counts['messages'] for team_id, counts in data['teams'].items()} == expected
+    assert sum('read_markers' in statement for statement in statements) == 1
@@ -0,0 +1,104 @@
+import secrets
+import time
+
+import pytest
+from flask import session
+from sqlalchemy import create_engine
+
+from app import app, db
+from models import User
+import migrations
+import replicas
+
+
+def replica_engine(tmp_path, schema=True):
+    """A SQLite file standing in for a replica, holding one user the primary lacks"""
+    engine = create_engine(f'sqlite:///{tmp_path / "replica.db"}')
+    if schema:
+        with app.app_context():
+            migrations.upgrade(engine)
+        user = User.create_user('replica_only', 'password123')
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert().values(
+                id=user.id, username=user.username, password_hash=user.password_hash,
+                verification_word=user.verification_word
+            ))
+    return engine
+
+
+@pytest.fixture
+def replica(tmp_path, client):
+    replica = replicas.Replica('replica_test', replica_engine(tmp_path))
+    replicas.router.reset([replica])
+    yield replica
+    replicas.router.reset(None)
+
+
+def on_replica():
+    return User.query.filter_by(username='replica_only').first() is not None
+
+
+def test_reads_in_get_requests_use_the_replica(replica):
+    with app.test_request_context(method='GET'):
+        assert on_replica()
+    with app.test_request_context(method='POST'):
+        assert not on_replica()
+
+
+def test_writes_pin_the_request_and_user_to_the_primary(replica):
+    with app.test_request_context(method='GET'):
+        db.session.add(User.create_user(f'user_{secrets.token_hex(4)}', 'password123'))
+        db.session.commit()
+        assert not on_replica()
+        window = session[replicas._RYW_KEY]
+
+    with app.test_request_context(method='GET'):
+        session[replicas._RYW_KEY] = window
+        assert not on_replica()
+
+
+def test_unhealthy_replica_falls_back_and_is_retried(tmp_path, client):
+    broken = replicas.Replica('broken', replica_engine(tmp_path, schema=False))
+    replicas.router.reset([broken])
+    try:
+        with app.test_request_context(method='GET'):
+            # SELECT 1 passes but the query fails: retried on the primary, replica parked
+            assert not on_replica()
+            assert broken.down_until > 0
+            assert replicas.router.choose(db) is None
+
+            broken.down_until = 0
+            migrations.upgrade(broken.engine)
+            assert replicas.router.choose(db) is broken
+    finally:
+        replicas.router.reset(None)
+
+
+def test_a_request_reads_from_one_replica(tmp_path, client):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    pair = [replicas.Replica(name, replica_engine(tmp_path / name)) for name in ('a', 'b')]
+    replicas.router.reset(pair)
+    try:
+        with app.test_request_context(method='GET'):
+            engines = {db.session.get_bind(clause=User.__table__.select()) for _ in range(4)}
+            assert len(engines) == 1 and on_replica()
+    finally:
+        replicas.router.reset(None)
+
+
+def test_a_hung_replica_fails_its_probe_quickly(client, monkeypatch):
+    class HungEngine:
+        def connect(self):
+            time.sleep(5)
+
+    hung = replicas.Replica('hung', HungEngine())
+    replicas.router.reset([hung])
+    monkeypatch.setitem(app.config, 'REPLICA_PROBE_TIMEOUT', 0.1)
+    try:
+        with app.test_request_context(method='GET'):
+            started = time.monotonic()
+            assert replicas.router.choose(db) is None
+            assert time.monotonic() - started < 1 and hung.down_until > 0
+    finally:
+        replicas.router.reset(None)
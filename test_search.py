@@ -0,0 +1,79 @@
+from app import app, db
+from conftest import login, team_with_admin
+from models import File, Message
+import search
+
+
+def make_team_with_files(names):
+    user, team = team_with_admin()
+    for name in names:
+        db.session.add(File(
+            filename=name, original_filename=name, file_path=f'uploads/{name}',
+            file_size=1, file_type='text', mime_type='text/plain',
+            team_id=team.id, uploaded_by=user.id
+        ))
+    db.session.commit()
+    return user, team
+
+
+def test_similarity_matches_pg_trgm():
+    assert search.similarity('word', 'word') == 1.0
+    assert search.similarity('word', 'two words') > 0.3
+    assert search.similarity('abc', 'xyz') == 0.0
+
+
+def test_autocomplete_ranks_fuzzy_matches(client):
+    with app.app_context():
+        user, team = make_team_with_files(
+            ['quarterly-report.pdf', 'report-draft.md', 'holiday.jpg']
+        )
+        results = search.autocomplete_files('reprot', team.id, user.id)
+        names = [file.original_filename for file, _ in results]
+        assert 'holiday.jpg' not in names
+        assert names[0] == 'report-draft.md'
+
+        # Renames are picked up by the index triggers
+        file = File.query.filter_by(original_filename='holiday.jpg').first()
+        file.original_filename = 'report-photo.jpg'
+        db.session.commit()
+        results = search.autocomplete_files('report', team.id, user.id)
+        assert len(results) == 3
+
+
+def test_autocomplete_endpoint(client):
+    with app.app_context():
+        user, team = make_team_with_files(['notes.txt', 'other.md'])
+        login(client, user)
+        with client.session_transaction() as sess:
+            sess['current_team_id'] = team.id
+
+    response = client.get('/api/files/autocomplete?q=note')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, max-age=30'
+    assert [r['name'] for r in response.get_json()['results']] == ['notes.txt']
+
+
+def test_message_search_and_context(client):
+    with app.app_context():
+        user, team = make_team_with_files([])
+        messages = [Message(content=f'message number {i}', team_id=team.id, sender_id=user.id)
+                    for i in range(30)]
+        messages[10].content = 'the <deploy> checklist is ready'
+        db.session.add_all(messages)
+        db.session.commit()
+
+        results = search.search_messages('deplo', team.id)
+        assert [message.id for message, _ in results] == [messages[10].id]
+        assert '<mark>' in results[0][1] and '&lt;' in results[0][1]
+
+        # Edits are re-indexed, soft deletes drop out
+        messages[10].content = 'nothing to see'
+        messages[11].content = 'deploy moved here'
+        messages[12].content = 'deploy again'
+        messages[12].is_deleted = True
+        db.session.commit()
+        assert [m.id for m, _ in search.search_messages('deploy', team.id)] == [messages[11].id]
+
+        window, more_before, more_after = search.message_context(messages[15], size=3)
+        assert [m.id for m in window] == [m.id for m in messages[11:19] if not m.is_deleted][:7]
+        assert more_before and more_after
@@ -6,11 +6,11 @@ try:
     print("✓ App imported successfully")
     
     print("Testing route registration...")
-    from register_routes import register_routes
-    print("✓ Route registration imported successfully")
+    import routes
+    print("✓ Routes imported successfully")
     
     print("Testing database...")
-    from database import db
+    from app import db
     print("✓ Database imported successfully")
     
     print("Testing models...")
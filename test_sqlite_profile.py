@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from app import app
+import sqlite_profile
+
+
+def profiled_engine(path):
+    url = f'sqlite:///{path}'
+    engine = create_engine(url, **sqlite_profile.engine_options(url))
+    sqlite_profile.install(engine)
+    return engine
+
+
+def test_pragmas_are_applied(tmp_path):
+    engine = profiled_engine(tmp_path / 'profile.db')
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == sqlite_profile.BUSY_TIMEOUT_MS
+        assert conn.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+
+
+def test_concurrent_read_then_write_transactions_do_not_fail(tmp_path):
+    # With deferred transactions this pattern fails fast with "database is locked"
+    engine = profiled_engine(tmp_path / 'writers.db')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE counter (n INTEGER)'))
+        conn.execute(text('INSERT INTO counter VALUES (0)'))
+
+    errors, barrier = [], threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(20):
+                with app.test_request_context(method='POST'), engine.begin() as conn:
+                    conn.execute(text('SELECT n FROM counter')).scalar()
+                    conn.execute(text('UPDATE counter SET n = n + 1'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT n FROM counter')).scalar() == 160
+
+
+def test_write_lock_is_taken_at_the_first_write(tmp_path):
+    path = tmp_path / 'lock.db'
+    engine = profiled_engine(path)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE files (name TEXT)'))
+    other = sqlite3.connect(path, timeout=0, isolation_level=None)
+
+    with app.test_request_context(method='POST'), engine.begin() as conn:
+        conn.execute(text('SELECT count(*) FROM files')).scalar()
+        # Reading (then saving an upload, say) leaves other writers free
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+
+        conn.execute(text("INSERT INTO files VALUES ('a.txt')"))
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute('BEGIN IMMEDIATE')
+    other.execute('BEGIN IMMEDIATE')
+    other.execute('ROLLBACK')
+    other.close()
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT count(*) FROM files')).scalar() == 1
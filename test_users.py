@@ -0,0 +1,51 @@
+import secrets
+
+import pytest
+
+from app import app, db
+from conftest import login, assert_max_queries
+from models import User
+import users
+
+
+def make_user():
+    user = User.create_user(f'user_{secrets.token_hex(4)}', 'password123', first_name='Ada')
+    user.mode_preference = 'single'
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_identity_is_served_from_cache(client):
+    with app.app_context():
+        login(client, make_user())
+
+    assert client.get('/help').status_code == 200
+    with assert_max_queries(0):
+        response = client.get('/help')
+    assert response.status_code == 200 and 'Ada' in response.get_data(as_text=True)
+    assert users.cache.stats()['hits'] >= 1
+
+
+def test_settings_update_invalidates_snapshot(client):
+    with app.app_context():
+        user = make_user()
+        user_id = user.id
+        login(client, user)
+
+    assert 'data-theme="light"' in client.get('/help').get_data(as_text=True)
+    client.post('/settings', data={'theme': 'dark'})
+    assert 'data-theme="dark"' in client.get('/help').get_data(as_text=True)
+    with app.app_context():
+        assert db.session.get(User, user_id).theme_preference == 'dark'
+
+    # Pages that need relationships load the full user on demand
+    assert client.get('/settings').status_code == 200
+
+
+def test_snapshot_is_read_only(client):
+    with app.app_context():
+        snapshot = users.load_user(make_user().id)
+        with pytest.raises(AttributeError):
+            snapshot.theme_preference = 'dark'
+        assert snapshot.load().username == snapshot.username
@@ -0,0 +1,45 @@
+"""
+Image thumbnails for File Drive
+Listings show a small preview of image files instead of an icon. Each one is
+made with Pillow on first request and kept on disk under a name carrying the
+file's content_tag, so an edited image gets a new thumbnail and browsers
+(and the service worker, see static/sw.js) can keep each one for good.
+"""
+import logging
+import os
+import uuid
+
+from app import app
+
+SIZE = (256, 256)
+
+
+def folder():
+    return os.path.join(app.config['UPLOAD_FOLDER'], 'thumbnails')
+
+
+def path_for(file):
+    """Path of the file's thumbnail, made if missing; None if it can't be made"""
+    path = os.path.join(folder(), f'{file.id}-{file.content_tag}.jpg')
+    if os.path.exists(path):
+        return path
+    # Written aside and renamed, so a concurrent request never reads half a file
+    partial = f'{path}.{uuid.uuid4().hex}.tmp'
+    from PIL import Image  # only needed once a listing shows an image
+    try:
+        with Image.open(file.file_path) as image:
+            image.thumbnail(SIZE)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            os.makedirs(folder(), exist_ok=True)
+            image.save(partial, 'JPEG', quality=80, optimize=True)
+        os.replace(partial, path)
+    # OSError includes images Pillow can't read, such as SVG; bombs are
+    # images whose pixel count (past MAX_IMAGE_PIXELS) would exhaust memory
+    except (OSError, Image.DecompressionBombError) as e:
+        logging.warning(f"No thumbnail for file {file.id}: {e}")
+        return None
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
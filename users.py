@@ -0,0 +1,92 @@
+"""
+Cached user loading for File Drive
+Flask-Login asks for the current user on every authenticated request.
+Instead of a SELECT each time, it gets a UserSnapshot built from a
+process-local TTL cache holding the fields pages actually show. Commits
+that touch a User row drop its entry.
+
+A snapshot is read-only. Handlers that change the user call
+``current_user.load()`` for the full ORM object; any attribute a snapshot
+does not carry (relationships, password hash) loads it the same way.
+"""
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import app, db
+from cache import TTLCache
+from models import User
+
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'profile_image_url',
+    'theme_preference', 'mode_preference', 'created_at',
+)
+
+cache = TTLCache(
+    'users',
+    maxsize=app.config.get('USER_CACHE_SIZE', 4096),
+    ttl=app.config.get('USER_CACHE_TTL', 60),
+)
+
+
+class UserSnapshot(UserMixin):
+    """Read-only stand-in for User with the fields templates render"""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+    display_name = User.display_name
+
+    def load(self):
+        """The full ORM User, loaded once per request"""
+        user = self.__dict__.get('_user')
+        if user is None:
+            user = self.__dict__['_user'] = db.session.get(User, self.id)
+        return user
+
+    def __getattr__(self, name):
+        # Only reached for attributes a snapshot does not carry
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'UserSnapshot is read-only; set {name} on current_user.load()')
+
+
+def snapshot(user):
+    return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+
+def load_user(user_id):
+    """Flask-Login user_loader: a UserSnapshot, or None for unknown ids"""
+    fields = cache.get(user_id)
+    if fields is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        fields = snapshot(user)
+        cache.set(user_id, fields)
+    return UserSnapshot(fields)
+
+
+def invalidate(user_id):
+    cache.delete(user_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_changes(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            session.info.setdefault('changed_users', set()).add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('changed_users', None)
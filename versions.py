@@ -0,0 +1,166 @@
+"""
+Change counters for File Drive
+A per-scope version number (scope name + id, e.g. ('folders', team_id)) that
+goes up in the same transaction as any change to the rows it covers. Clients
+cache responses under an ETag built from it, and the server can answer a
+revalidation with one primary-key lookup instead of rebuilding the response.
+
+Models opt in with track(); the bump happens in an after_flush hook, so
+route handlers never have to remember to do it.
+
+cached() answers from a short-lived process-local copy instead, for callers
+that would rather be a few seconds stale than query: commits in this worker
+drop the copies of the scopes they bumped, VERSION_CACHE_TTL bounds how
+long another worker's change goes unseen.
+"""
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import app, db
+from cache import TTLCache
+from models import (ChangeCounter, Folder, Team, TeamMember, UploadPermission, File, FileVersion,
+                    Message, Activity)
+
+# model class -> [(scope, attribute holding the scope id)]
+_tracked = {}
+
+cache = TTLCache(
+    'versions',
+    maxsize=app.config.get('VERSION_CACHE_SIZE', 4096),
+    ttl=app.config.get('VERSION_CACHE_TTL', 5),
+)
+
+
+def track(model, scope, key):
+    """Bump ``scope`` for ``getattr(obj, key)`` whenever a ``model`` row changes"""
+    _tracked.setdefault(model, []).append((scope, key))
+
+
+def _upsert(dialect_name):
+    dialect_insert = postgresql.insert if dialect_name == 'postgresql' else sqlite.insert
+    stmt = dialect_insert(ChangeCounter.__table__)
+    return stmt.on_conflict_do_update(
+        index_elements=['scope', 'scope_id'],
+        set_={'version': ChangeCounter.__table__.c.version + 1}
+    )
+
+
+def bump(connection, scope, scope_ids):
+    """Increment the counters of ``scope_ids``, creating them at version 1"""
+    if not scope_ids:
+        return
+    connection.execute(
+        _upsert(connection.dialect.name),
+        [{'scope': scope, 'scope_id': scope_id, 'version': 1} for scope_id in sorted(scope_ids)]
+    )
+
+
+def bump_in_session(session, scope, scope_ids):
+    """bump() in the session's transaction; cached copies go when it commits
+
+    Once per scope and transaction: a second bump would not give readers a
+    version they could tell apart from the first.
+    """
+    bumped = session.info.setdefault('bumped_scopes', set())
+    scope_ids = {scope_id for scope_id in scope_ids if (scope, scope_id) not in bumped}
+    if not scope_ids:
+        return
+    bump(session.connection(), scope, scope_ids)
+    bumped.update((scope, scope_id) for scope_id in scope_ids)
+
+
+def forget(scope, scope_ids):
+    """Drop cached copies of versions bumped outside a session"""
+    for scope_id in scope_ids:
+        cache.delete((scope, scope_id))
+
+
+def current(scope, scope_id):
+    """Current version of a scope; 0 if it never changed"""
+    version = db.session.execute(
+        select(ChangeCounter.version).where(
+            ChangeCounter.scope == scope, ChangeCounter.scope_id == scope_id
+        )
+    ).scalar()
+    return version or 0
+
+
+def cached(scope, scope_id):
+    """current(), served from the process cache while it is fresh"""
+    version = cache.get((scope, scope_id))
+    if version is None:
+        version = current(scope, scope_id)
+        cache.set((scope, scope_id), version)
+    return version
+
+
+def current_many(keys):
+    """current() of several (scope, scope_id) pairs in one query
+
+    Refreshes the process cache, so cached() later in the request agrees.
+    """
+    if not keys:
+        return []
+    rows = db.session.execute(
+        select(ChangeCounter.scope, ChangeCounter.scope_id, ChangeCounter.version).where(
+            tuple_(ChangeCounter.scope, ChangeCounter.scope_id).in_(keys)
+        )
+    ).all()
+    found = {(scope, scope_id): version for scope, scope_id, version in rows}
+    for key in keys:
+        cache.set(key, found.get(key, 0))
+    return [found.get(key, 0) for key in keys]
+
+
+def cached_many(keys):
+    """cached() of several (scope, scope_id) pairs, missing ones read in one query"""
+    found = {key: cache.get(key) for key in keys}
+    missing = [key for key, version in found.items() if version is None]
+    found.update(zip(missing, current_many(missing)))
+    return [found[key] for key in keys]
+
+
+def etag(scope, scope_id, *extra):
+    """Weak ETag value for a response derived from a scope"""
+    return '-'.join(str(part) for part in (scope, scope_id, current(scope, scope_id)) + extra)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_changed_scopes(session, flush_context):
+    changed = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        scopes = _tracked.get(type(obj))
+        if not scopes or (obj in session.dirty and not session.is_modified(obj)):
+            continue
+        for scope, key in scopes:
+            scope_id = getattr(obj, key)
+            if scope_id is not None:
+                changed.setdefault(scope, set()).add(scope_id)
+    for scope, scope_ids in changed.items():
+        bump_in_session(session, scope, scope_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_committed(session):
+    for scope, scope_id in session.info.pop('bumped_scopes', ()):
+        cache.delete((scope, scope_id))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('bumped_scopes', None)
+
+
+track(Folder, 'folders', 'team_id')
+# Everything the team dashboard shows (see panels.py)
+track(Team, 'team', 'id')
+track(TeamMember, 'team', 'team_id')
+track(File, 'team', 'team_id')
+track(Message, 'team', 'team_id')
+track(Activity, 'team', 'team_id')
+# ...and the team settings page
+track(UploadPermission, 'team', 'team_id')
+# A file's page: its row and its versions (see http_cache.py)
+track(File, 'file', 'id')
+track(FileVersion, 'file', 'file_id')